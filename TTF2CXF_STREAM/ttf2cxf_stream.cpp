@@ -11,8 +11,13 @@
     the CXF file data to another program through STDOUT
 
     ttf2cxf_stream
-    Version 0.4
+    Version 0.5
 	
+    V0.5
+    - Added '-r' command line option to keep running and convert the fonts
+      requested on STDIN, so one process can serve many fonts
+    - Free each glyph once it has been converted
+
     V0.4
 	- Changed fixed number of segments per arc to fixed arc angle limit
     - Removed '-n' command line option to set the number of points in an arc approximation
@@ -47,6 +52,8 @@
 */
 
 #include <iostream>
+#include <cstdio>
+#include <cstring>
 #include <math.h>
 #include <ft2build.h>
 #include FT_FREETYPE_H
@@ -71,6 +78,9 @@ std::string author;
 
 int STDOUT = 0; 
 
+// Line written after each font when serving requests (-r)
+const char* END_MARK = "#TTF2CXF END";
+
 int moveTo(FT_Vector* to, void* fp);
 int lineTo(FT_Vector* to, void* fp);
 int conicTo(FT_Vector* control, FT_Vector* to, void* fp);
@@ -217,7 +227,12 @@ FT_Error convertGlyph(FT_ULong charcode) {
         std::cout << "FT_Load_Glyph: error\n";
     }
 
-    FT_Get_Glyph(face->glyph, &glyph);
+    error = FT_Get_Glyph(face->glyph, &glyph);
+    if (error) {
+        // nothing to free, glyph was not made
+        std::cout << "FT_Get_Glyph: error\n";
+        return error;
+    }
     FT_OutlineGlyph og = (FT_OutlineGlyph)glyph;
     if (face->glyph->format != ft_glyph_format_outline) {
         std::cout << "not an outline font\n";
@@ -239,9 +254,105 @@ FT_Error convertGlyph(FT_ULong charcode) {
         std::cout << "FT_Outline_Decompose: error: " << error << "\n";
     }
 
+    FT_Done_Glyph(glyph);
     return error;
 }
 
+/**
+ * Writes the CXF header and all of the glyphs of the font in face.
+ */
+void writeCxf() {
+    // write font header
+    fprintf(fpCxf, "# Format:            QCad 2 Font\n");
+    fprintf(fpCxf, "# Creator:           ttf2cxf\n");
+    fprintf(fpCxf, "# Version:           1\n");
+    fprintf(fpCxf, "# Name:              %s\n", name.c_str());
+    fprintf(fpCxf, "# LetterSpacing:     %f\n", letterSpacing);
+    fprintf(fpCxf, "# WordSpacing:       %f\n", wordSpacing);
+    fprintf(fpCxf, "# LineSpacingFactor: %f\n", lineSpacingFactor);
+    fprintf(fpCxf, "# Author:            %s\n", author.c_str());
+    fprintf(fpCxf, "\n");
+
+    //uint 
+    FT_UInt first;
+    FT_Get_First_Char(face, &first);
+
+    FT_ULong  charcode;
+    FT_UInt   gindex;
+
+	// iterate through glyphs
+    charcode = FT_Get_First_Char( face, &gindex);
+    int skip_cnt=0;
+    while (gindex != 0) {
+      // Skipping codes greater than 255 unless specifically requested by "-e" command line option
+      if (charcode > 255  && extended_chars == 0)
+	{
+	  skip_cnt = skip_cnt+1;
+	}
+     else
+	{
+	  convertGlyph(charcode);
+	}
+
+      charcode = FT_Get_Next_Char(face, charcode, &gindex);
+    }
+    if (skip_cnt > 0) printf("Skipped %d characters...\n",skip_cnt);
+}
+
+/**
+ * Converts the fonts asked for on stdin until stdin is closed.  Each
+ * request is one line:
+ *     <seg_arc_limit> <extended chars (0 or 1)> <ttf file>
+ * and is answered on stdout with the CXF data followed by END_MARK.
+ */
+int serve() {
+    char request[4096];
+
+    STDOUT = 1;
+    std::cout << "TTF2CXF TEST MESSAGE SERVER\n" << std::flush;
+
+    if (FT_Init_FreeType(&library)) {
+        std::cerr << "Error: FT_Init_FreeType\n";
+        return 1;
+    }
+
+    while (fgets(request, sizeof(request), stdin) != NULL) {
+        double limit;
+        int extended;
+        int pos = 0;
+        if (sscanf(request, "%lf %d %n", &limit, &extended, &pos) >= 2 && pos > 0) {
+            std::string fTtf = request + pos;
+            while (!fTtf.empty() && (fTtf[fTtf.size()-1] == '\n' || fTtf[fTtf.size()-1] == '\r')) {
+                fTtf.erase(fTtf.size()-1);
+            }
+            seg_arc_limit = limit;
+            if (seg_arc_limit==0) seg_arc_limit = 45;
+            extended_chars = extended;
+
+            if (FT_New_Face(library, fTtf.c_str(), 0, &face) == 0) {
+                name = face->family_name ? face->family_name : "Unknown";
+
+                // find out height by tracing 'A'
+                fpCxf = NULL;
+                yMax = -1000;
+                convertGlyph(65);
+                factor = 1.0/(1.0/9.0*yMax);
+
+                fpCxf = stdout;
+                writeCxf();
+                FT_Done_Face(face);
+            } else {
+                std::cerr << "FT_New_Face: cannot open " << fTtf.c_str() << "\n";
+            }
+        }
+        fprintf(stdout, "%s\n", END_MARK);
+        fflush(stdout);
+    }
+
+    FT_Done_FreeType(library);
+    return 0;
+}
+
 /**
  * Main.
  */
@@ -259,6 +370,7 @@ int main(int argc, char* argv[]) {
     lineSpacingFactor = 1.0;
     author = "Unknown";
     extended_chars = 0;
+    int server = 0;
 
     // handle arguments:
     if (argc<2) {
@@ -272,6 +384,7 @@ int main(int argc, char* argv[]) {
         std::cout << "  -w word spacing                Word spacing (float)\n";
         std::cout << "  -f line spacing factor         Default is 1.0 (float)\n";
         std::cout << "  -e enable extended characters\n";
+        std::cout << "  -r convert the fonts requested on STDIN (use TEST STDOUT as the files)\n";
         exit(1);
     }
 
@@ -300,6 +413,9 @@ int main(int argc, char* argv[]) {
 		else if (!strcmp(argv[i], "-e")) {
                         extended_chars = 1;
 		}
+		else if (!strcmp(argv[i], "-r")) {
+			server = 1;
+		}
 
 	}
 
@@ -307,6 +423,11 @@ int main(int argc, char* argv[]) {
     fCxf = argv[argc-1];
 
 
+    if (server)
+	{
+		return serve();
+	}
+
     if (fTtf == "TEST")
 	{
 		std::cout << "TTF2CXF TEST MESSAGE";
@@ -362,41 +483,7 @@ int main(int argc, char* argv[]) {
       exit(2);
     }
 
-    // write font header
-    fprintf(fpCxf, "# Format:            QCad 2 Font\n");
-    fprintf(fpCxf, "# Creator:           ttf2cxf\n");
-    fprintf(fpCxf, "# Version:           1\n");
-    fprintf(fpCxf, "# Name:              %s\n", name.c_str());
-    fprintf(fpCxf, "# LetterSpacing:     %f\n", letterSpacing);
-    fprintf(fpCxf, "# WordSpacing:       %f\n", wordSpacing);
-    fprintf(fpCxf, "# LineSpacingFactor: %f\n", lineSpacingFactor);
-    fprintf(fpCxf, "# Author:            %s\n", author.c_str());
-    fprintf(fpCxf, "\n");
-
-    //uint 
-    FT_UInt first;
-    FT_Get_First_Char(face, &first);
-
-    FT_ULong  charcode;
-    FT_UInt   gindex;
-
-	// iterate through glyphs
-    charcode = FT_Get_First_Char( face, &gindex);
-    int skip_cnt=0;
-    while (gindex != 0) {
-      // Skipping codes greater than 255 unless specifically requested by "-e" command line option
-      if (charcode > 255  && extended_chars == 0)
-	{
-	  skip_cnt = skip_cnt+1;
-	}
-     else
-	{
-	  convertGlyph(charcode);
-	}
-
-      charcode = FT_Get_Next_Char(face, charcode, &gindex);
-    }
-    if (skip_cnt > 0) printf("Skipped %d characters...\n",skip_cnt);
+    writeCxf();
 
 	return 0;
 }
@@ -0,0 +1,180 @@
+import csv
+import json
+import multiprocessing
+import os
+from time import time
+
+# Manifest columns that describe the job.  Every other column is the name of
+# a setting (as saved in the "fengrave_set" lines of a g-code file) and its
+# value overrides the setting for that job.
+JOB_FIELDS = ("text", "output", "settings", "font")
+# Settings that are saved with their value in double quotes
+QUOTED_SETTINGS = ("fontdir", "fontfile", "imagefile", "NGC_DIR")
+# Timings reported for each job
+JOB_TIMES = ("load", "layout", "vcarve", "write")
+
+# Application used by the jobs run in a worker process
+worker_app = None
+
+
+###############################################################################
+# Read a job manifest.  Files ending in .jsonl or .json hold one JSON object  #
+# per line, anything else is read as CSV with a header row.  File names in    #
+# the manifest are relative to the folder holding the manifest.               #
+###############################################################################
+def read_manifest(filename):
+    fileName, fileExtension = os.path.splitext(filename)
+    fin = open(filename, "r")
+    try:
+        if fileExtension.upper() in (".JSONL", ".JSON"):
+            rows = [json.loads(line) for line in fin if line.strip() != ""]
+        else:
+            rows = list(csv.DictReader(fin))
+    finally:
+        fin.close()
+
+    folder = os.path.dirname(os.path.abspath(filename))
+    jobs = []
+    for row in rows:
+        job = make_job(row, len(jobs), folder)
+        if "output" not in job:
+            raise ValueError("Job %d has no output file" % (len(jobs) + 1))
+        jobs.append(job)
+    return jobs
+
+
+def make_job(row, index, folder, fields=JOB_FIELDS):
+    job = {"index": index, "overrides": []}
+    for key, value in row.items():
+        if key is None or value is None or value == "":
+            continue
+        if value is True or value is False:
+            value = int(value)
+        key = key.strip()
+        if key in fields:
+            job[key] = str(value)
+        else:
+            job["overrides"].append((key, str(value)))
+    for key in ("output", "settings", "font"):
+        if key in job:
+            job[key] = os.path.join(folder, job[key])
+    return job
+
+
+def settings_lines(overrides):
+    # Settings overrides as the lines the settings loader reads
+    lines = []
+    for key, value in overrides:
+        if key in QUOTED_SETTINGS:
+            value = "\042%s\042" % (value)
+        lines.append("(fengrave_set %s %s )" % (key, value))
+    return lines
+
+
+##########################################
+#        Running jobs                    #
+##########################################
+def init_worker(factory, argv, fonts):
+    global worker_app
+    worker_app = factory(argv)
+    worker_app.font_cache.update(fonts)
+
+
+def run_job(job, app=None):
+    if app is None:
+        app = worker_app
+    result = {
+        "index": job["index"],
+        "output": job["output"],
+        "pid": os.getpid(),
+    }
+    stamp = time()
+    try:
+        app.Batch_Job(job, result)
+        result["status"] = "ok"
+    except Exception as e:
+        result["status"] = "error: %s" % (e)
+    result["seconds"] = time() - stamp
+    return result
+
+
+###############################################################################
+# Run the jobs in a pool of worker processes.  Each worker builds its own     #
+# application with factory(argv) and starts with a copy of the fonts that    #
+# have already been read.  With a single process the jobs are run in app.     #
+###############################################################################
+def run_jobs(jobs, app, factory, argv, processes=None):
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(jobs)))
+    if processes == 1:
+        return [run_job(job, app) for job in jobs]
+
+    pool = start_pool(app, factory, argv, processes)
+    try:
+        results = list(pool.imap_unordered(run_job, jobs))
+    finally:
+        pool.close()
+        pool.join()
+    results.sort(key=lambda result: result["index"])
+    return results
+
+
+def start_pool(app, factory, argv, processes=None):
+    # Tk does not survive a fork, every worker starts a fresh interpreter
+    context = multiprocessing.get_context("spawn")
+    return context.Pool(
+        processes, init_worker, (factory, argv, dict(app.font_cache))
+    )
+
+
+##########################################
+#        Summary                         #
+##########################################
+def write_summary(results, filename):
+    fout = open(filename, "w")
+    try:
+        writer = csv.writer(fout)
+        writer.writerow(
+            ("job", "output", "status", "seconds") + JOB_TIMES + ("pid",)
+        )
+        for result in results:
+            row = [
+                result["index"] + 1,
+                result["output"],
+                result["status"],
+                "%.3f" % (result["seconds"]),
+            ]
+            for key in JOB_TIMES:
+                if key in result:
+                    row.append("%.3f" % (result[key]))
+                else:
+                    row.append("")
+            row.append(result["pid"])
+            writer.writerow(row)
+    finally:
+        fout.close()
+
+
+def summary_lines(results, elapsed):
+    lines = []
+    busy = 0.0
+    failed = 0
+    for result in results:
+        busy = busy + result["seconds"]
+        if result["status"] != "ok":
+            failed = failed + 1
+        lines.append(
+            "(Job %d: %s  %.2fs  %s)"
+            % (
+                result["index"] + 1,
+                os.path.basename(result["output"]),
+                result["seconds"],
+                result["status"],
+            )
+        )
+    lines.append(
+        "(%d jobs, %d failed, %.2fs job time, %.2fs elapsed)"
+        % (len(results), failed, busy, elapsed)
+    )
+    return lines
@@ -0,0 +1,539 @@
+#!/usr/bin/env python
+"""
+Time each stage of the toolpath pipeline on a fixed set of inputs.
+
+    python benchmarks/pipeline.py [options] [font.cxf ...]
+
+The inputs are text in each of the given fonts (every .cxf file in the
+benchmarks/fonts folder when none are given) at several text lengths, text set
+on a radius, a dense synthetic DXF drawing, a DXF drawing made of splines and
+a bitmap traced with potrace.  The drawings are generated each run, so every
+run sees the same inputs.  Each input is V-carved and cleaned up and written
+as g-code, SVG and DXF, and the time spent in each stage is recorded.  Stages
+nest: V_Carve_It includes sort_for_v_carve and the partition build,
+WriteGCode includes douglas and Sort_Paths, and Clean_Path_Calc also includes
+douglas.  The douglas stage is the time spent taking the moves from its
+generator, not just the time to make the generator.
+
+The results are written as JSON.  With --compare the results are checked
+against a baseline written by an earlier run, and the exit status is 1 when
+any stage has become slower than the threshold allows.
+
+The application runs as a batch worker, which makes no widgets and does not
+load Tk, so no display is needed.
+"""
+import fnmatch
+import getopt
+import glob
+import json
+import math
+import os
+import platform
+import runpy
+import shutil
+import sys
+import tempfile
+from time import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+FORMAT_VERSION = 1
+TEXT = "The quick brown fox jumps over the lazy dog 0123456789"
+LENGTHS = (8, 32)
+RADIUS_LENGTH = 24
+# Stages in the order they are reported
+STAGES = (
+    "font_parse",
+    "image_parse",
+    "DoIt",
+    "sort_for_v_carve",
+    "partition",
+    "V_Carve_It",
+    "Clean_Path_Calc",
+    "Find_Paths",
+    "douglas",
+    "Sort_Paths",
+    "WriteGCode",
+    "WRITE_CLEAN_UP",
+    "WriteSVG",
+    "WriteDXF",
+)
+# Settings used by every case
+OVERRIDES = [
+    ("cut_type", "v-carve"),
+    ("v_step_len", "0.01"),
+    ("clean_dia", "0.125"),
+    ("clean_step", "50"),
+    ("clean_paths", "1,1,1,1,1,1"),
+]
+# Default regression limits: a stage is flagged when it is more than
+# THRESHOLD slower than the baseline and by more than MIN_TIME seconds.
+THRESHOLD = 0.10
+MIN_TIME = 0.005
+
+
+def usage():
+    sys.stdout.write(__doc__)
+    sys.stdout.write(
+        "Options:\n"
+        "    -o, --output=FILE     write the JSON results to FILE "
+        "(default stdout)\n"
+        "    -c, --compare=FILE    compare the results with the baseline "
+        "FILE\n"
+        "    -r, --repeat=N        run each case N times and keep the "
+        "fastest (default 3)\n"
+        "    -k, --cases=PATTERN   only run the cases matching PATTERN\n"
+        "    -t, --text=TEXT       text to engrave (default a pangram)\n"
+        "    -l, --lengths=N,N     text lengths to use (default 8,32)\n"
+        "    -T, --threshold=F     slow down flagged as a regression "
+        "(default 0.10)\n"
+        "    -m, --min-time=S      ignore changes smaller than S seconds "
+        "(default 0.005)\n"
+    )
+
+
+##########################################
+#        Fixtures                        #
+##########################################
+def dxf_entities(entities):
+    code = ["0", "SECTION", "2", "ENTITIES"]
+    for entity in entities:
+        code.extend(entity)
+    code.extend(["0", "ENDSEC", "0", "EOF"])
+    return code
+
+
+def write_lines(filename, lines):
+    fout = open(filename, "w")
+    for line in lines:
+        fout.write("%s\n" % (line))
+    fout.close()
+
+
+def dense_dxf(filename, rows=12, sides=12):
+    # A rows x rows grid of rings, each made of two polygons of LINEs
+    entities = []
+    for row in range(rows):
+        for col in range(rows):
+            for radius in (0.4, 0.2 + 0.1 * ((row + col) % 2)):
+                for i in range(sides):
+                    a1 = 2 * math.pi * i / sides
+                    a2 = 2 * math.pi * (i + 1) / sides
+                    entities.append(
+                        [
+                            "0",
+                            "LINE",
+                            "8",
+                            "0",
+                            "10",
+                            "%.6f" % (col + radius * math.cos(a1)),
+                            "20",
+                            "%.6f" % (row + radius * math.sin(a1)),
+                            "11",
+                            "%.6f" % (col + radius * math.cos(a2)),
+                            "21",
+                            "%.6f" % (row + radius * math.sin(a2)),
+                        ]
+                    )
+    write_lines(filename, dxf_entities(entities))
+
+
+def spline_dxf(filename, rows=6, points=10):
+    # A rows x rows grid of closed cubic splines through wavy outlines
+    entities = []
+    for row in range(rows):
+        for col in range(rows):
+            lobes = 3 + (row + col) % 4
+            cpoints = []
+            for i in range(points):
+                a = 2 * math.pi * i / points
+                r = 0.35 + 0.08 * math.cos(lobes * a)
+                cpoints.append(
+                    (col + r * math.cos(a), row + r * math.sin(a))
+                )
+            # clamped knots, so the curve ends on the first control point
+            cpoints.append(cpoints[0])
+            inner = len(cpoints) - 4
+            knots = [0] * 4 + list(range(1, inner + 1)) + [inner + 1] * 4
+            entity = ["0", "SPLINE", "8", "0", "70", "8", "71", "3"]
+            for knot in knots:
+                entity.extend(["40", "%.1f" % (knot)])
+            for x, y in cpoints:
+                entity.extend(["10", "%.6f" % (x), "20", "%.6f" % (y)])
+            entities.append(entity)
+    write_lines(filename, dxf_entities(entities))
+
+
+def bitmap_pbm(filename, size=240):
+    # Rings and a cross on a plain bitmap for potrace to trace
+    lines = ["P1", "%d %d" % (size, size)]
+    c = size / 2.0
+    for y in range(size):
+        row = []
+        for x in range(size):
+            r = math.sqrt((x - c) * (x - c) + (y - c) * (y - c))
+            ring = int(r / (size / 12.0)) % 2 == 1 and r < size * 0.45
+            cross = abs(x - c) < size / 30.0 or abs(y - c) < size / 30.0
+            row.append("1" if ring != cross else "0")
+        lines.append(" ".join(row))
+    write_lines(filename, lines)
+
+
+def make_cases(fonts, text, lengths, folder):
+    cases = []
+    for font in fonts:
+        name = os.path.splitext(os.path.basename(font))[0]
+        for length in lengths:
+            cases.append(
+                (
+                    "text/%s/%d" % (name, length),
+                    {"font": font, "text": (text * length)[:length]},
+                    [],
+                )
+            )
+    if fonts:
+        cases.append(
+            (
+                "radius/%s/%d"
+                % (
+                    os.path.splitext(os.path.basename(fonts[0]))[0],
+                    RADIUS_LENGTH,
+                ),
+                {
+                    "font": fonts[0],
+                    "text": (text * RADIUS_LENGTH)[:RADIUS_LENGTH],
+                },
+                [("TRADIUS", "3.0")],
+            )
+        )
+
+    dense = os.path.join(folder, "dense.dxf")
+    dense_dxf(dense)
+    cases.append(("dxf/dense", {"font": dense}, []))
+    spline = os.path.join(folder, "spline.dxf")
+    spline_dxf(spline)
+    cases.append(("dxf/spline", {"font": spline}, []))
+    bitmap = os.path.join(folder, "rings.pbm")
+    bitmap_pbm(bitmap)
+    cases.append(("bitmap/rings", {"font": bitmap}, []))
+    return cases
+
+
+##########################################
+#        Stage timers                    #
+##########################################
+class Stages(object):
+    # Wrap the functions and methods of each stage so that the time spent in
+    # them is added up by stage name
+    def __init__(self):
+        self.times = {}
+
+    def wrap(self, owner, attr, stage):
+        times = self.times
+        func = lookup(owner, attr)
+
+        def timed(*args, **kwargs):
+            stamp = time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                times[stage] = times.get(stage, 0.0) + time() - stamp
+
+        replace(owner, attr, timed)
+
+    def wrap_generator(self, owners, attr, stage):
+        # Like wrap for a function that returns a generator, the time is
+        # spent taking the items, not making the generator.  Every owner
+        # that holds its own reference to the function gets the wrapper.
+        times = self.times
+        func = lookup(owners[0], attr)
+
+        def timed(*args, **kwargs):
+            stamp = time()
+            items = iter(func(*args, **kwargs))
+            times[stage] = times.get(stage, 0.0) + time() - stamp
+            while True:
+                stamp = time()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    times[stage] = times.get(stage, 0.0) + time() - stamp
+                yield item
+
+        for owner in owners:
+            replace(owner, attr, timed)
+
+    def reset(self):
+        self.times.clear()
+
+
+def lookup(owner, attr):
+    if isinstance(owner, dict):
+        return owner[attr]
+    return getattr(owner, attr)
+
+
+def replace(owner, attr, value):
+    if isinstance(owner, dict):
+        owner[attr] = value
+    else:
+        setattr(owner, attr, value)
+
+
+def load_application():
+    g = runpy.run_path(os.path.join(ROOT, "f-engrave.py"), run_name="bench")
+    app = g["batch_application"](["-b"])
+    # the module globals the application itself uses
+    ns = g["batch_application"].__globals__
+    stages = Stages()
+    stages.wrap(ns["font"], "parse_font_file", "font_parse")
+    stages.wrap(ns, "parse_dxf", "image_parse")
+    stages.wrap(ns, "sort_for_v_carve", "sort_for_v_carve")
+    stages.wrap(ns["VCarve"], "partition", "partition")
+    stages.wrap(ns, "Find_Paths", "Find_Paths")
+    # gcode and f-engrave import their own references to douglas
+    stages.wrap_generator(
+        [sys.modules["douglas"], sys.modules["gcode"], ns],
+        "douglas",
+        "douglas",
+    )
+    stages.wrap(ns, "Sort_Paths", "Sort_Paths")
+    stages.wrap(ns, "WriteDXF", "WriteDXF")
+    Application = ns["Application"]
+    for method in (
+        "DoIt",
+        "V_Carve_It",
+        "Clean_Path_Calc",
+        "WriteGCode",
+        "WRITE_CLEAN_UP",
+        "WriteSVG",
+    ):
+        stages.wrap(Application, method, method)
+    return app, ns, stages
+
+
+##########################################
+#        Running the cases               #
+##########################################
+def run_case(app, ns, job):
+    # One pass through the pipeline, returns the sizes of the results
+    app.font_cache.clear()
+    app.Batch_Settings(job)
+    if app.input_type.get() == "text":
+        app.Read_font_file()
+    else:
+        app.Read_image_file()
+    if not app.font:
+        return None
+
+    app.DoIt()
+    app.V_Carve_It()
+    gcode = app.WriteGCode()
+    svg = app.WriteSVG()
+    dxf = ns["WriteDXF"](app.coords)
+
+    app.V_Carve_It(clean_flag=1)
+    bit = ns["bit_from_shape"](
+        app.bit_shape.get(), app.v_bit_dia.get(), app.v_bit_angle.get()
+    )
+    app.Clean_Path_Calc(app.calc_vbit_dia(bit) / 2.0, "straight")
+    clean = app.WRITE_CLEAN_UP("straight")
+
+    return {
+        "segments": len(app.coords),
+        "vcoords": len(app.vcoords),
+        "gcode_lines": len(gcode),
+        "clean_lines": len(clean),
+        "svg_lines": len(svg),
+        "dxf_lines": len(dxf),
+    }
+
+
+def run_cases(cases, repeat):
+    app, ns, stages = load_application()
+    results = {}
+    for name, job, overrides in cases:
+        job = dict(job)
+        job["index"] = 0
+        job["overrides"] = OVERRIDES + overrides
+        sys.stderr.write("%s\n" % (name))
+        best = {}
+        counts = None
+        for run in range(repeat):
+            stages.reset()
+            stamp = time()
+            try:
+                counts = run_case(app, ns, job)
+            except Exception as e:
+                counts = None
+                results[name] = {"skipped": "%s" % (e)}
+                break
+            if counts is None:
+                results[name] = {"skipped": "unable to read the input"}
+                break
+            stages.times["total"] = time() - stamp
+            for stage, seconds in stages.times.items():
+                best[stage] = min(best.get(stage, seconds), seconds)
+        if counts is not None:
+            results[name] = {"stages": best, "counts": counts}
+    return results
+
+
+##########################################
+#        Baseline comparison             #
+##########################################
+def compare(baseline, results, threshold, min_time):
+    # Print the change in each stage, returns the number of regressions
+    regressions = 0
+    sys.stdout.write(
+        "%-28s %-17s %10s %10s %8s\n"
+        % ("case", "stage", "base(s)", "new(s)", "change")
+    )
+    for name in sorted(results):
+        new = results[name]
+        old = baseline.get(name)
+        if "stages" not in new or old is None or "stages" not in old:
+            sys.stdout.write("%-28s (not compared)\n" % (name[:28]))
+            continue
+        if new["counts"] != old["counts"]:
+            sys.stdout.write(
+                "%-28s (results differ from the baseline: %s)\n"
+                % (name[:28], json.dumps(old["counts"], sort_keys=True))
+            )
+        for stage in STAGES + ("total",):
+            if stage not in new["stages"] or stage not in old["stages"]:
+                continue
+            a = old["stages"][stage]
+            b = new["stages"][stage]
+            flag = ""
+            if b > a * (1.0 + threshold) and b - a > min_time:
+                flag = "  REGRESSION"
+                regressions = regressions + 1
+            sys.stdout.write(
+                "%-28s %-17s %10.4f %10.4f %+7.1f%%%s\n"
+                % (
+                    name[:28],
+                    stage,
+                    a,
+                    b,
+                    100.0 * (b - a) / max(a, 1e-9),
+                    flag,
+                )
+            )
+    sys.stdout.write("%d regressions\n" % (regressions))
+    return regressions
+
+
+def main(argv):
+    try:
+        opts, fonts = getopt.getopt(
+            argv,
+            "ho:c:r:k:t:l:T:m:",
+            [
+                "help",
+                "output=",
+                "compare=",
+                "repeat=",
+                "cases=",
+                "text=",
+                "lengths=",
+                "threshold=",
+                "min-time=",
+            ],
+        )
+    except getopt.GetoptError as e:
+        sys.stderr.write("%s\n" % (e))
+        usage()
+        return 2
+
+    output = None
+    baseline = None
+    repeat = 3
+    pattern = "*"
+    text = TEXT
+    lengths = LENGTHS
+    threshold = THRESHOLD
+    min_time = MIN_TIME
+    for option, value in opts:
+        if option in ("-h", "--help"):
+            usage()
+            return 0
+        elif option in ("-o", "--output"):
+            output = value
+        elif option in ("-c", "--compare"):
+            baseline = value
+        elif option in ("-r", "--repeat"):
+            repeat = max(int(value), 1)
+        elif option in ("-k", "--cases"):
+            pattern = value
+        elif option in ("-t", "--text"):
+            text = value
+        elif option in ("-l", "--lengths"):
+            lengths = [int(n) for n in value.split(",")]
+        elif option in ("-T", "--threshold"):
+            threshold = float(value)
+        elif option in ("-m", "--min-time"):
+            min_time = float(value)
+
+    if baseline is not None:
+        fin = open(baseline, "r")
+        baseline = json.load(fin)
+        fin.close()
+        if baseline.get("version") != FORMAT_VERSION:
+            sys.stderr.write("Unknown baseline format: %s\n" % (baseline))
+            return 2
+
+    if not fonts:
+        fonts = sorted(glob.glob(os.path.join(HERE, "fonts", "*.cxf")))
+        if not fonts:
+            sys.stderr.write(
+                "No .cxf fonts found in %s\n" % (os.path.join(HERE, "fonts"))
+            )
+            return 2
+    fonts = [os.path.abspath(font) for font in fonts]
+    for font in fonts:
+        if not os.path.isfile(font):
+            sys.stderr.write("Font file not found: %s\n" % (font))
+            return 2
+
+    folder = tempfile.mkdtemp(prefix="fengrave_bench")
+    try:
+        cases = [
+            case
+            for case in make_cases(fonts, text, lengths, folder)
+            if fnmatch.fnmatch(case[0], pattern)
+        ]
+        if not cases:
+            sys.stderr.write("No cases match: %s\n" % (pattern))
+            return 2
+        results = run_cases(cases, repeat)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    report = {
+        "version": FORMAT_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "cases": results,
+    }
+    if output is not None:
+        fout = open(output, "w")
+        json.dump(report, fout, indent=1, sort_keys=True)
+        fout.close()
+    elif baseline is None:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        sys.stdout.write("\n")
+
+    if baseline is not None:
+        if compare(baseline["cases"], results, threshold, min_time) > 0:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,5 +1,6 @@
 from constants import Plane, Zero
 from graphics import Get_Angle
+import instrument
 from math import hypot, sqrt
 import sys
 
@@ -27,6 +28,14 @@ else:
 # be distorted, so 'plane' should usually be specified only when there is only
 # movement on 2 axes
 def douglas(st, tolerance=.001, plane=None, _first=True):
+    moves = douglas_moves(st, tolerance, plane, _first)
+    if instrument.enabled:
+        moves = instrument.counted(moves, "douglas_in", len(st),
+                                   "douglas_out")
+    return moves
+
+
+def douglas_moves(st, tolerance=.001, plane=None, _first=True):
     if len(st) == 1:
         yield "G1", st[0], None
         return
@@ -121,10 +130,10 @@ def douglas(st, tolerance=.001, plane=None, _first=True):
     elif worst_dist > tolerance:
         if _first:
             yield "G1", st[0], None
-        for i in douglas(st[:worst + 1], tolerance, plane, False):
+        for i in douglas_moves(st[:worst + 1], tolerance, plane, False):
             yield i
         yield "G1", st[worst], None
-        for i in douglas(st[worst:], tolerance, plane, False):
+        for i in douglas_moves(st[worst:], tolerance, plane, False):
             yield i
         if _first:
             yield "G1", st[-1], None
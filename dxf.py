@@ -1,4 +1,4 @@
-from graphics import Character, Line, Get_Angle, Transform
+from graphics import Character, Font, Line, Get_Angle, Transform
 from math import sqrt, atan, sin, cos, acos, asin, ceil
 from math import degrees, atan2, floor, radians
 from constants import Zero
@@ -816,7 +816,7 @@ class DXF_CLASS:
 
 def parse_dxf(dxf_file, segarc, message, new_origin=True):
     # Initialize / reset
-    font = {}
+    font = Font()
     key = None
     stroke_list = []
     xmax, ymax = -1e10, -1e10
@@ -836,8 +836,7 @@ def parse_dxf(dxf_file, segarc, message, new_origin=True):
         xmin = min(xmin, XY[0], XY[2])
         ymin = min(ymin, XY[1], XY[3])
 
-    font[key] = Character(key)
-    font[key].stroke_list = stroke_list
+    font[key] = Character(key, stroke_list)
     font[key].xmax = xmax
     font[key].ymax = ymax
     font[key].xmin = xmin
@@ -1128,8 +1127,90 @@ class BSplineClass:
         return ders
 
 
-def WriteDXF(coords):
-    dxf_code = []
+###############################################################################
+# DXF output.  Segments that join end to start are written as one POLYLINE   #
+# (closed when close_loops is set and the path returns to its start).  The   #
+# toolpaths, if given, are (layer, points) pairs where each point is         #
+# [x, y, r, loop] and each loop is written as a POLYLINE on that layer.      #
+# The lines are written to fout when it is given.                             #
+###############################################################################
+class DXF_CODE(list):
+    def __init__(self, fout=None):
+        list.__init__(self)
+        self.fout = fout
+
+    def append(self, line):
+        if self.fout is None:
+            list.append(self, line)
+        else:
+            self.fout.write(line + "\n")
+
+
+def dxf_polyline(dxf_code, points, layer, closed=False):
+    # An R12 POLYLINE: the header has no $ACADVER so readers take the file
+    # as R12, which has no LWPOLYLINE
+    dxf_code.append("POLYLINE")
+    dxf_code.append("  8")  # layer Code
+    dxf_code.append(layer)
+    dxf_code.append(" 62")  # color code
+    dxf_code.append("150")
+    dxf_code.append(" 66")  # vertices follow
+    dxf_code.append("1")
+    dxf_code.append(" 10")
+    dxf_code.append("0.0")
+    dxf_code.append(" 20")
+    dxf_code.append("0.0")
+    dxf_code.append(" 30")
+    dxf_code.append("0.0")
+    dxf_code.append(" 70")  # 1 = closed
+    dxf_code.append("%d" % (closed))
+    for x, y in points:
+        dxf_code.append("  0")
+        dxf_code.append("VERTEX")
+        dxf_code.append("  8")
+        dxf_code.append(layer)
+        dxf_code.append(" 10")
+        dxf_code.append("%.4f" % (x))
+        dxf_code.append(" 20")
+        dxf_code.append("%.4f" % (y))
+        dxf_code.append(" 30")
+        dxf_code.append("0.0")
+    dxf_code.append("  0")
+    dxf_code.append("SEQEND")
+    dxf_code.append("  8")
+    dxf_code.append(layer)
+    dxf_code.append("  0")
+
+
+def dxf_paths(coords, close_loops=False):
+    # Join the segments into (points, closed) paths
+    paths = []
+    points = []
+    for line in coords:
+        if (points
+                and abs(line[0] - points[-1][0]) < Zero
+                and abs(line[1] - points[-1][1]) < Zero):
+            points.append((line[2], line[3]))
+            continue
+        if points:
+            paths.append(points)
+        points = [(line[0], line[1]), (line[2], line[3])]
+    if points:
+        paths.append(points)
+
+    out = []
+    for points in paths:
+        if (close_loops and len(points) > 2
+                and abs(points[0][0] - points[-1][0]) < Zero
+                and abs(points[0][1] - points[-1][1]) < Zero):
+            out.append((points[:-1], True))
+        else:
+            out.append((points, False))
+    return out
+
+
+def WriteDXF(coords, fout=None, close_loops=False, toolpaths=()):
+    dxf_code = DXF_CODE(fout)
     # Create a header section just in case the reading software needs it
     dxf_code.append("999")
     dxf_code.append(
@@ -1186,7 +1267,7 @@ def WriteDXF(coords):
     dxf_code.append("2")
     dxf_code.append("LAYER")
     dxf_code.append("70")
-    dxf_code.append("6")
+    dxf_code.append("%d" % (6 + len(toolpaths)))
     dxf_code.append("0")
     dxf_code.append("LAYER")
     dxf_code.append("2")
@@ -1207,6 +1288,17 @@ def WriteDXF(coords):
     dxf_code.append("7")
     dxf_code.append("6")
     dxf_code.append("CONTINUOUS")
+    for layer, points in toolpaths:
+        dxf_code.append("0")
+        dxf_code.append("LAYER")
+        dxf_code.append("2")
+        dxf_code.append(layer)
+        dxf_code.append("70")
+        dxf_code.append("64")
+        dxf_code.append("62")
+        dxf_code.append("7")
+        dxf_code.append("6")
+        dxf_code.append("CONTINUOUS")
     dxf_code.append("0")
     dxf_code.append("ENDTAB")
     dxf_code.append("0")
@@ -1237,33 +1329,21 @@ def WriteDXF(coords):
     dxf_code.append("  0")
 
     # GCODE WRITING for Dxf_Write
-    for line in coords:
-        dxf_code.append("LINE")
-        dxf_code.append("  5")
-        dxf_code.append("30")
-        dxf_code.append("100")
-        dxf_code.append("AcDbEntity")
-        dxf_code.append("  8")  # layer Code #dxf_code.append("0")
-
-        dxf_code.append("1")
-        dxf_code.append(" 62")  # color code
-        dxf_code.append("150")
-
-        dxf_code.append("100")
-        dxf_code.append("AcDbLine")
-        dxf_code.append(" 10")
-        dxf_code.append("%.4f" % (line[0]))  # x1 coord
-        dxf_code.append(" 20")
-        dxf_code.append("%.4f" % (line[1]))  # y1 coord
-        dxf_code.append(" 30")
-        dxf_code.append("%.4f" % (0))        # z1 coord
-        dxf_code.append(" 11")
-        dxf_code.append("%.4f" % (line[2]))  # x2 coord
-        dxf_code.append(" 21")
-        dxf_code.append("%.4f" % (line[3]))  # y2 coord
-        dxf_code.append(" 31")
-        dxf_code.append("%.4f" % (0))        # z2 coord
-        dxf_code.append("  0")
+    for points, closed in dxf_paths(coords, close_loops):
+        dxf_polyline(dxf_code, points, "1", closed)
+
+    for layer, points in toolpaths:
+        loop_old = None
+        loop = []
+        for XY in points:
+            if XY[3] != loop_old:
+                if len(loop) > 1:
+                    dxf_polyline(dxf_code, loop, layer)
+                loop = []
+            loop.append((XY[0], XY[1]))
+            loop_old = XY[3]
+        if len(loop) > 1:
+            dxf_polyline(dxf_code, loop, layer)
 
     dxf_code.append("ENDSEC")
     dxf_code.append("0")
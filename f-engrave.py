@@ -425,6 +425,8 @@ if VERSION == 3:
     from tkinter import ALL, FLAT, Event, BOTTOM, OptionMenu
     from tkinter.filedialog import askdirectory, askopenfilename
     from tkinter.filedialog import asksaveasfilename
+    import queue
+    import tkinter
 else:
     from Tkinter import END, RIGHT, LEFT, CENTER, Tk, Button, Checkbutton
     from Tkinter import Label, PhotoImage, X, Y, W, E, SW, BOTH, Entry, SUNKEN
@@ -433,6 +435,8 @@ else:
     from Tkinter import ALL, FLAT, Event, BOTTOM, OptionMenu
     from tkFileDialog import askdirectory, askopenfilename
     from tkFileDialog import asksaveasfilename
+    import Queue as queue
+    import Tkinter as tkinter
 
 if VERSION < 3 and sys.version_info[1] < 6:
 
@@ -459,6 +463,7 @@ if PIL:
         sys.stdout.write("PIL Not loaded.\n")
 
 
+import batch
 from bit import bit_from_shape
 from constants import Zero, IN_AXIS, Plane, NumberCheck
 from constants import MIN_METRIC_STEP_LEN, MIN_IMP_STEP_LEN
@@ -466,21 +471,29 @@ from douglas import douglas
 from dxf import parse_dxf, WriteDXF
 from gcode import Gcode
 import getopt
-from graphics import Get_Angle, Transform, Rotn, CoordScale, DetectIntersect
+from graphics import Transform, Rotn, CoordScale, DetectIntersect
 from graphics import Clean_coords_to_Path_coords
-from graphics import Find_Paths, record_v_carve_data, find_max_circle
+from graphics import Find_Paths, Font
 from graphics import sort_for_v_carve, Sort_Paths
 import font
-from math import sqrt, radians, tan, acos, sin, cos, fabs, floor, ceil
+import instrument
+from math import sqrt, tan, acos, sin, ceil
 from math import degrees
 from messages import Message
 import os
+from preview import PreviewLayer, decimate
+from preview import PPLOT_BATCH, PPLOT_BACKLOG, PPLOT_ENV_PIXELS
+from preview import PPLOT_FRAME_TIME, PPLOT_REFRESH
 import re
+import service
+import settings
 import struct
 from subprocess import Popen, PIPE
-from svg import SVG
+import svg
+import threading
 from time import time
 from tkinter_extras import ToolTip
+from vcarve import VCarve, run_engines
 import webbrowser
 from icon import temp_icon
 
@@ -489,32 +502,42 @@ try:
 except NameError:
     unichr = chr
 
+if settings.COUNT_TK_READS:
+    settings.count_tk_reads(StringVar, BooleanVar)
+
 message = Message(quiet=QUIET or IN_AXIS, debug=DEBUG)
 
 
 ############################################################################
 class Application(Frame):
-    def __init__(self, master):
-        Frame.__init__(self, master)
+    def __init__(self, master, argv=None, worker=False):
         self.w = 780
         self.h = 490
-        Frame(master, width=self.w, height=self.h)
+        if not worker:
+            # a batch worker has no widgets, so it can run without Tk
+            Frame.__init__(self, master)
+            Frame(master, width=self.w, height=self.h)
         self.master = master
         self.x = -1
         self.y = -1
         self.initComplete = 0
         self.delay_calc = 0
         self.STOP_CALC = False
+        self.stop_event = threading.Event()
+        if argv is None:
+            argv = sys.argv[1:]
+        self.argv = argv
+        self.worker = worker
+        self.font_cache = {}
+        self.settings_cache = {}
+        # output file of the current batch job, V-carve checkpoints are
+        # kept next to it
+        self.checkpoint_base = None
 
         # if PIL == False:
         #    fmessage("Python Imaging Library (PIL) was not found...Bummer")
         #    fmessage("    PIL enables more image file formats.")
 
-        if not font.TTF_is_supported():
-            message.fmessage(
-                "ttf2cxf_stream executable is not present/working...Bummer"
-            )
-
         cmd = ["potrace", "-v"]
         try:
             p = Popen(cmd, stdout=PIPE, stderr=PIPE)
@@ -544,7 +567,7 @@ class Application(Frame):
         self.delay_calc = 0
         self.menu_Mode_Change()
 
-    def createWidgets(self):
+    def Bind_Keys(self):
         self.master.bind("<Configure>", self.Master_Configure)
         self.master.bind("<Escape>", self.KEY_ESC)
         self.master.bind("<F1>", self.KEY_F1)
@@ -559,6 +582,10 @@ class Application(Frame):
         self.master.bind("<Control-g>", self.KEY_CTRL_G)
         self.master.bind("<Control-s>", self.KEY_CTRL_S)
 
+    def createWidgets(self):
+        if not self.worker:
+            self.Bind_Keys()
+
         self.batch = BooleanVar()
         self.show_axis = BooleanVar()
         self.show_box = BooleanVar()
@@ -572,6 +599,8 @@ class Application(Frame):
         self.fontdex = BooleanVar()
         self.v_flop = BooleanVar()
         self.v_pplot = BooleanVar()
+        self.v_pplot_env = BooleanVar()
+        self.v_adaptive = BooleanVar()
         self.inlay = BooleanVar()
         self.no_comments = BooleanVar()
         self.ext_char = BooleanVar()
@@ -665,6 +694,8 @@ class Application(Frame):
 
         self.v_flop.set(0)
         self.v_pplot.set(0)
+        self.v_pplot_env.set(0)
+        self.v_adaptive.set(0)
         self.inlay.set(0)
         self.no_comments.set(1)
         self.ext_char.set(0)
@@ -730,13 +761,15 @@ class Application(Frame):
         self.segarc.set("5.0")
         self.accuracy.set("0.001")
 
-        self.segID = []
         self.coords = []
         self.vcoords = []
         self.clean_coords = []
         self.clean_segment = []
         self.clean_coords_sort = []
         self.v_clean_coords_sort = []
+        # loop order of each set of clean up paths, with the paths it was
+        # found for
+        self.clean_order = {}
 
         self.clean_v.set("0.05")
         self.clean_dia.set(".25")  # Diameter of clean-up bit
@@ -745,7 +778,7 @@ class Application(Frame):
         )  # Clean-up step-over as percent of clean-up bit diameter
         self.clean_name.set("_clean")
 
-        self.font = {}
+        self.font = Font()
         self.RADIUS_PLOT = 0
         self.MAXX = 0
         self.MINX = 0
@@ -797,6 +830,7 @@ class Application(Frame):
         # M2 ; End Program
         self.gpost.set("M5|M2")
 
+        self.settings = settings.snapshot(self)
         # END INITIALIZING VARIABLES
 
         config_file = "config.ngc"
@@ -811,10 +845,16 @@ class Application(Frame):
             self.Open_G_Code_File(home_config2)
 
         opts, args = None, None
+        manifest = None
+        serve = None
+        inlay_pair = None
+        jobs = None
+        # options passed on to the batch worker processes
+        self.worker_argv = ["-b"]
         try:
             opts, args = getopt.getopt(
-                sys.argv[1:],
-                "hbg:f:d:t:",
+                self.argv,
+                "hbg:f:d:t:m:j:s:i:",
                 [
                     "help",
                     "batch",
@@ -822,6 +862,11 @@ class Application(Frame):
                     "fontdir=",
                     "defdir=",
                     "text=",
+                    "manifest=",
+                    "jobs=",
+                    "serve=",
+                    "inlay_pair=",
+                    "instrument=",
                 ],
             )
         except:
@@ -832,7 +877,8 @@ class Application(Frame):
                 message.fmessage(" ")
                 message.fmessage(
                     "Usage: python f-engrave.py [-g file | -f fontdir | "
-                    "-d directory | -t text | -b ]"
+                    "-d directory | -t text | -b | -m manifest | -j jobs | "
+                    "-s address | -i file | --instrument json|log ]"
                 )
                 message.fmessage(
                     "-g    : f-engrave gcode output file to read "
@@ -845,29 +891,32 @@ class Application(Frame):
                 message.fmessage("-d    : default directory (also --defdir)")
                 message.fmessage("-t    : engrave text (also --text)")
                 message.fmessage("-b    : batch mode (also --batch)")
+                message.fmessage(
+                    "-m    : batch mode job manifest, CSV or JSON lines "
+                    "(also --manifest)"
+                )
+                message.fmessage(
+                    "-j    : number of batch jobs run at once (also --jobs)"
+                )
+                message.fmessage(
+                    "-s    : serve engraving requests on a unix socket, "
+                    "- for stdin/stdout (also --serve)"
+                )
+                message.fmessage(
+                    "-i    : write inlay pocket and plug g-code to "
+                    "file_female and file_male (also --inlay_pair)"
+                )
+                message.fmessage(
+                    "--instrument : write stage timings and counts to stderr "
+                    "as json or log lines"
+                )
                 message.fmessage("-h    : print this help (also --help)\n")
                 sys.exit()
             if option in ("-g", "--gcode_file"):
                 self.Open_G_Code_File(value)
                 self.NGC_FILE = value
             if option in ("-f", "--fontdir"):
-                if os.path.isdir(value):
-                    self.fontdir.set(value)
-                elif os.path.isfile(value):
-                    dirname = os.path.dirname(value)
-                    fileName, fileExtension = os.path.splitext(value)
-                    TYPE = fileExtension.upper()
-                    if TYPE == ".CXF" or TYPE == ".TTF":
-                        self.input_type.set("text")
-                        self.fontdir.set(dirname)
-                        self.fontfile.set(
-                            os.path.basename(fileName) + fileExtension
-                        )
-                    else:
-                        self.input_type.set("image")
-                        self.IMAGE_FILE = value
-                else:
-                    message.fmessage("File/Directory Not Found:\t%s" % (value))
+                self.Set_Input_Path(value)
 
             if option in ("-d", "--defdir"):
                 self.HOME_DIR = value
@@ -875,21 +924,58 @@ class Application(Frame):
                     self.NGC_FILE = self.HOME_DIR + "/None"
                 if str.find(self.IMAGE_FILE, "/None") != -1:
                     self.IMAGE_FILE = self.HOME_DIR + "/None"
+            if option == "--instrument":
+                instrument.enable(value)
             if option in ("-t", "--text"):
                 value = value.replace("|", "\n")
 
                 self.default_text = value
             if option in ("-b", "--batch"):
                 self.batch.set(1)
+            elif option in ("-m", "--manifest"):
+                manifest = value
+                self.batch.set(1)
+            elif option in ("-s", "--serve"):
+                serve = value
+                self.batch.set(1)
+            elif option in ("-i", "--inlay_pair"):
+                inlay_pair = value
+                self.batch.set(1)
+            elif option in ("-j", "--jobs"):
+                try:
+                    jobs = max(int(value), 1)
+                except:
+                    message.fmessage("Invalid number of jobs: %s" % (value))
+            elif option == "--gcode_file":
+                self.worker_argv.append(option)
+            else:
+                self.worker_argv.extend([option, value])
 
         if self.batch.get():
+            self.batch_state = self.Batch_State()
+            if self.worker:
+                return
+            if serve is not None:
+                service.serve(
+                    serve, self, batch_application, self.worker_argv, jobs
+                )
+                sys.exit()
             message.fmessage("(F-Engrave Batch Mode)")
 
+            if manifest is not None:
+                self.Batch_Manifest(manifest, jobs)
+                sys.exit()
+
             if self.input_type.get() == "text":
                 self.Read_font_file()
             else:
                 self.Read_image_file()
 
+            if inlay_pair is not None:
+                for filename in self.Save_Inlay_Pair(inlay_pair, jobs):
+                    message.fmessage("(File Saved: %s)" % (filename))
+                sys.exit()
+
             self.DoIt()
             if self.cut_type.get() == "v-carve":
                 self.V_Carve_It()
@@ -931,6 +1017,7 @@ class Application(Frame):
         )
         self.PreviewCanvas.pack(side=LEFT, fill=BOTH, expand=1)
         self.PreviewCanvas_frame.place(x=230, y=10)
+        self.preview = PreviewLayer(self.PreviewCanvas)
 
         self.PreviewCanvas.bind("<Button-4>", self._mouseZoomIn)
         self.PreviewCanvas.bind("<Button-5>", self._mouseZoomOut)
@@ -1256,6 +1343,9 @@ class Application(Frame):
         self.Listbox_1.bind("<ButtonRelease-1>", self.Listbox_1_Click)
         self.Listbox_1.bind("<Up>", self.Listbox_Key_Up)
         self.Listbox_1.bind("<Down>", self.Listbox_Key_Down)
+        self.Listbox_1_ToolTip = ToolTip(
+            self.Listbox_1, text="", state="disabled", follow_mouse=1
+        )
 
         for name in font.available_font_files(self.fontdir.get()):
             self.Listbox_1.insert(END, name)
@@ -1358,6 +1448,11 @@ class Application(Frame):
             label="Save G-Code",
             command=self.menu_File_Save_G_Code_File,
         )
+        top_File.add(
+            "command",
+            label="Save Inlay Pair G-Code",
+            command=self.menu_File_Save_Inlay_Pair,
+        )
         top_File.add_separator()
         top_File.add(
             "command", label="Export SVG", command=self.menu_File_Save_SVG_File
@@ -1370,6 +1465,11 @@ class Application(Frame):
             label="Export DXF (close loops)",
             command=self.menu_File_Save_DXF_File_close_loops,
         )
+        top_File.add(
+            "command",
+            label="Export DXF (with toolpaths)",
+            command=self.menu_File_Save_DXF_File_toolpaths,
+        )
         if IN_AXIS:
             top_File.add(
                 "command",
@@ -1418,27 +1518,27 @@ class Application(Frame):
         top_View.add_checkbutton(
             label="Show Thickness",
             variable=self.show_thick,
-            command=self.menu_View_Refresh,
+            command=self.Plot_Data,
         )
         top_View.add_checkbutton(
             label="Show Origin Axis",
             variable=self.show_axis,
-            command=self.menu_View_Refresh,
+            command=self.Plot_Data,
         )
         top_View.add_checkbutton(
             label="Show Bounding Box",
             variable=self.show_box,
-            command=self.menu_View_Refresh,
+            command=self.Plot_Data,
         )
         top_View.add_checkbutton(
             label="Show V-Carve ToolPath",
             variable=self.show_v_path,
-            command=self.menu_View_Refresh,
+            command=self.Plot_Data,
         )
         top_View.add_checkbutton(
             label="Show V-Carve Area",
             variable=self.show_v_area,
-            command=self.menu_View_Refresh,
+            command=self.Plot_Data,
         )
         self.menuBar.add("cascade", label="View", menu=top_View)
 
@@ -1656,6 +1756,9 @@ class Application(Frame):
         gcode.append_comment(
             "fengrave_set v_pplot     %s " % (int(self.v_pplot.get()))
         )
+        gcode.append_comment(
+            "fengrave_set plot_env    %s " % (int(self.v_pplot_env.get()))
+        )
         gcode.append_comment(
             "fengrave_set inlay       %s " % (int(self.inlay.get()))
         )
@@ -1773,6 +1876,9 @@ class Application(Frame):
         gcode.append_comment(
             "fengrave_set v_step_len  %s " % (self.v_step_len.get())
         )
+        gcode.append_comment(
+            "fengrave_set v_adaptive  %s " % (int(self.v_adaptive.get()))
+        )
         gcode.append_comment(
             "fengrave_set allowance   %s " % (self.allowance.get())
         )
@@ -1863,16 +1969,18 @@ class Application(Frame):
             "#########################################################"
         )
 
+    @instrument.timed("WriteGCode")
     def WriteGCode(self, config_file=False):
+        cfg = self.Calc_Settings()
         bit = bit_from_shape(
-            self.bit_shape.get(), self.v_bit_dia.get(), self.v_bit_angle.get()
+            cfg.bit_shape, cfg.v_bit_dia, cfg.v_bit_angle
         )
 
-        SafeZ = float(self.ZSAFE.get())
-        Acc = float(self.accuracy.get())
-        Depth = float(self.ZCUT.get())
+        SafeZ = cfg.ZSAFE
+        Acc = cfg.accuracy
+        Depth = cfg.ZCUT
 
-        if self.batch.get():
+        if cfg.batch:
             String = self.default_text
         else:
             String = self.Input.get(1.0, END)
@@ -1881,12 +1989,12 @@ class Application(Frame):
             message,
             safetyheight=SafeZ,
             tolerance=Acc,
-            arc_fit=self.arc_fit.get(),
-            metric=self.units.get() != "in",
-            enable_variables=not self.var_dis.get(),
+            arc_fit=cfg.arc_fit,
+            metric=cfg.units != "in",
+            enable_variables=not cfg.var_dis,
         )
 
-        if config_file or not self.no_comments.get():
+        if config_file or not cfg.no_comments:
             self.append_author_to_gcode(g)
             self.append_settings_to_gcode(g, String)
 
@@ -1900,27 +2008,26 @@ class Application(Frame):
         g.append_units()
 
         # Output preamble
-        g.append_preamble(self.gpre.get())
+        g.append_preamble(cfg.gpre)
 
         # Set Feed rate
-        g.set_feed(self.FEED.get(), write_it=True)
-        g.set_z_feed(self.PLUNGE.get())
+        g.set_feed(cfg.FEED, write_it=True)
+        g.set_z_feed(cfg.PLUNGE)
+        reads = settings.tk_read_mark()
 
         oldx = oldy = -99990.0
         first_stroke = True
         # Set up variables for multipass cutting
-        maxDZ = float(self.v_max_cut.get())
-        rough_stock = float(self.v_rough_stk.get())
+        maxDZ = cfg.v_max_cut
+        rough_stock = cfg.v_rough_stk
         zmin = 0.0
         roughing = True
         rough_again = False
 
-        if self.cut_type.get() == "engrave" or self.bit_shape.get() == "FLAT":
+        if cfg.cut_type == "engrave" or cfg.bit_shape == "FLAT":
             ecoords = []
-            if (self.bit_shape.get() == "FLAT") and (
-                self.cut_type.get() != "engrave"
-            ):
-                Acc = float(self.v_step_len.get()) * 1.5  # fudge factor
+            if (cfg.bit_shape == "FLAT") and (cfg.cut_type != "engrave"):
+                Acc = cfg.v_step_len * 1.5  # fudge factor
                 ###################################
                 ###   Create Flat Cut ECOORDS   ###
                 ###################################
@@ -1992,8 +2099,8 @@ class Application(Frame):
                 zmax = zmin - maxDZ
 
                 if (
-                    self.bit_shape.get() == "FLAT"
-                    and self.cut_type.get() != "engrave"
+                    cfg.bit_shape == "FLAT"
+                    and cfg.cut_type != "engrave"
                 ):
                     g.set_depth(z1)
 
@@ -2043,7 +2150,7 @@ class Application(Frame):
         # END engraving
         else:
             # V-carve stuff
-            g.set_z_feed(self.FEED.get())
+            g.set_z_feed(cfg.FEED)
 
             ##########################
             ###   find loop ends   ###
@@ -2096,6 +2203,36 @@ class Application(Frame):
                 half_angle = bit.half_angle
                 bit_radius = bit.radius
 
+                ##########################################
+                # Depth at each point, computed once for all of the passes.
+                # The point after the last one is taken to have zero radius.
+                ##########################################
+                radii = [coord[2] for coord in new_coords] + [0]
+                if cfg.bit_shape == "VBIT":
+                    tan_half = tan(half_angle)
+                    zbase = [-r / tan_half for r in radii]
+                    if cfg.inlay:
+                        inlay_depth = self.calc_r_inlay_depth()
+                        zbase = [z + inlay_depth for z in zbase]
+                elif cfg.bit_shape == "BALL":
+                    zbase = [
+                        -bit_radius * (1 - sin(acos(r / bit_radius)))
+                        for r in radii
+                    ]
+                else:
+                    # FLAT is handled in the engraving section above
+                    zbase = [0.0] * len(radii)
+                zend = zbase.pop()
+                zlow = min(zbase + [zend])
+
+                # A point is only cut in a roughing pass when it, or the
+                # point after it, is below the top of the pass.  Sorting the
+                # points by the shallower of the two lets each pass pick out
+                # its points without looking at the rest.
+                zpair = [min(z1, nextz) for z1, nextz in zip(zbase, zbase[1:])]
+                zpair.append(min(zbase[-1], zend))
+                order = sorted(range(len(zbase)), key=zpair.__getitem__)
+
                 ################################
                 # V-carve stuff
                 # maxDZ       =  float(self.v_max_cut.get())
@@ -2114,82 +2251,56 @@ class Application(Frame):
                         maxDZ = -99999
                     rough_again = False
                     zmin = zmin + maxDZ
+                    zmax = zmin - maxDZ  # + rough_stock
 
-                    loop_old = -1
-
-                    v_index = -1
+                    if roughing:
+                        if zlow + rough_stock < zmin:
+                            rough_again = True
+                        count = 0
+                        while (
+                            count < len(order)
+                            and zpair[order[count]] + rough_stock <= zmax
+                        ):
+                            count = count + 1
+                        points = sorted(order[:count])
+                    else:
+                        if zlow < zmin:
+                            rough_again = True
+                        points = range(len(zbase))
 
-                    while v_index < len(new_coords) - 1:
-                        v_index = v_index + 1
+                    loop_old = -1
+                    i_old = -1
+                    for v_index in points:
                         x1 = new_coords[v_index][0]
                         y1 = new_coords[v_index][1]
-                        r1 = new_coords[v_index][2]
                         loop = new_coords[v_index][3]
 
-                        if v_index + 1 < len(new_coords):
-                            nextr = new_coords[v_index + 1][2]
-                        else:
-                            nextr = 0
-
-                        if self.bit_shape.get() == "VBIT":
-                            z1 = -r1 / tan(half_angle)
-                            nextz = -nextr / tan(half_angle)
-                            if self.inlay.get():
-                                inlay_depth = self.calc_r_inlay_depth()
-                                z1 = z1 + inlay_depth
-                                nextz = nextz + inlay_depth
-
-                        elif self.bit_shape.get() == "BALL":
-                            theta = acos(r1 / bit_radius)
-                            z1 = -bit_radius * (1 - sin(theta))
-
-                            next_theta = acos(nextr / bit_radius)
-                            nextz = -bit_radius * (1 - sin(next_theta))
-                        elif self.bit_shape.get() == "FLAT":
-                            # This case should have been caught in the
-                            # engraving section above
-                            pass
-                        else:
-                            pass
-
+                        z1 = zbase[v_index]
                         if roughing:
                             z1 = z1 + rough_stock
-                            nextz = nextz + rough_stock
                         if z1 < zmin:
                             z1 = zmin
-                            rough_again = True
-                        if nextz < zmin:
-                            nextz = zmin
-                            rough_again = True
 
-                        zmax = zmin - maxDZ  # + rough_stock
-                        if ((z1 > zmax) and (nextz > zmax)) and (roughing):
-                            loop_old = -1
-                            continue
                         # check and see if we need to move to a new
                         # discontinuous start point
-                        if loop != loop_old:
+                        if loop != loop_old or v_index != i_old + 1:
                             g.safety()
                             g.rapid(x=x1, y=y1)
                             g.plunge_z(z1)
-
-                            lastx = x1
-                            lasty = y1
                             g.cut(x1, y1, z1)
                         else:
                             g.cut(x1, y1, z1)
-                            lastx = x1
-                            lasty = y1
                         loop_old = loop
+                        i_old = v_index
                     g.flush()
                 g.flush()
             g.flush()
             # End V-carve stuff
         # Make Circle
-        XOrigin = float(self.xorigin.get())
-        YOrigin = float(self.yorigin.get())
+        XOrigin = cfg.xorigin
+        YOrigin = cfg.yorigin
         Radius_plot = float(self.RADIUS_PLOT)
-        if Radius_plot != 0 and self.cut_type.get() == "engrave":
+        if Radius_plot != 0 and cfg.cut_type == "engrave":
             g.safety()
             g.rapid(
                 x=-Radius_plot - self.Xzero + XOrigin, y=YOrigin - self.Yzero
@@ -2202,7 +2313,9 @@ class Application(Frame):
         g.safety()
 
         # Postamble
-        g.append_postamble(self.gpost.get())
+        g.append_postamble(cfg.gpost)
+        settings.report_tk_reads("WriteGCode", reads)
+        instrument.count("gcode_lines", len(g))
 
         return g
 
@@ -2210,9 +2323,10 @@ class Application(Frame):
     # Write Cleanup G-code File #
     #############################
     def WRITE_CLEAN_UP(self, bit_type="straight"):
-        SafeZ = float(self.ZSAFE.get())
+        cfg = self.Calc_Settings()
+        SafeZ = cfg.ZSAFE
         bit = bit_from_shape(
-            self.bit_shape.get(), self.v_bit_dia.get(), self.v_bit_angle.get()
+            cfg.bit_shape, cfg.v_bit_dia, cfg.v_bit_angle
         )
 
         self.calc_depth_limit(bit)
@@ -2220,26 +2334,26 @@ class Application(Frame):
             Depth = float(self.maxcut.get())
         except:
             Depth = 0.0
-        if self.inlay.get():
-            Depth = Depth + float(self.allowance.get())
+        if cfg.inlay:
+            Depth = Depth + cfg.allowance
 
         g = Gcode(
             message,
             safetyheight=SafeZ,
-            tolerance=float(self.accuracy.get()),
-            arc_fit=self.arc_fit.get(),
-            metric=self.units.get() != "in",
-            enable_variables=not self.var_dis.get(),
+            tolerance=cfg.accuracy,
+            arc_fit=cfg.arc_fit,
+            metric=cfg.units != "in",
+            enable_variables=not cfg.var_dis,
         )
 
-        if not self.no_comments.get():
+        if not cfg.no_comments:
             self.append_author_to_gcode(g)
             self.append_cleanup_comments_to_gcode(
                 g,
                 bit_type,
-                float(self.clean_dia.get()),
+                cfg.clean_dia,
                 bit.angle,
-                self.units.get(),
+                cfg.units,
             )
 
         g.set_depth(Depth)
@@ -2247,22 +2361,24 @@ class Application(Frame):
         g.append_units()
 
         # Output preamble
-        g.append_preamble(self.gpre.get())
+        g.append_preamble(cfg.gpre)
 
         # Set Feed rate
-        g.set_feed(self.FEED.get(), write_it=True)
-        g.set_z_feed(self.PLUNGE.get())
+        g.set_feed(cfg.FEED, write_it=True)
+        g.set_z_feed(cfg.PLUNGE)
+        reads = settings.tk_read_mark()
 
         if bit_type == "straight":
             coords_out = self.clean_coords_sort
         else:
             coords_out = self.v_clean_coords_sort
+        order_out = self.Clean_Order(coords_out, bit_type)
 
         # Multipass stuff
         ################################
         # Cleanup
-        maxDZ = float(self.v_max_cut.get())
-        rough_stock = float(self.v_rough_stk.get())
+        maxDZ = cfg.v_max_cut
+        rough_stock = cfg.v_rough_stk
         zmin = 0.0
         roughing = True
         rough_again = False
@@ -2278,26 +2394,14 @@ class Application(Frame):
             rough_again = False
             zmin = zmin + maxDZ
 
-            # The clean coords have already been sorted so we can just write
-            # them
-
-            order_out = Sort_Paths(coords_out, 3)
-            new_coords = []
-            for line in order_out:
-                temp = line
-                if temp[0] < temp[1]:
+            # Every pass follows the loop order found once above
+            loop_old = -1
+            for start, end in order_out:
+                if start < end:
                     step = 1
                 else:
                     step = -1
-                for i in range(temp[0], temp[1] + step, step):
-                    new_coords.append(coords_out[i])
-            coords_out = new_coords
-
-            if len(coords_out) > 0:
-                loop_old = -1
-                v_index = -1
-                while v_index < len(coords_out) - 1:
-                    v_index = v_index + 1
+                for v_index in range(start, end + step, step):
                     x1 = coords_out[v_index][0]
                     y1 = coords_out[v_index][1]
                     loop = coords_out[v_index][3]
@@ -2327,13 +2431,29 @@ class Application(Frame):
         g.safety()
 
         # Postamble
-        g.append_postamble(self.gpost.get())
+        g.append_postamble(cfg.gpost)
+        settings.report_tk_reads("WRITE_CLEAN_UP", reads)
 
         return g
 
         ###################################
 
-    def WriteSVG(self):
+    def Clean_Order(self, coords, bit_type="straight"):
+        # Loop order of the clean up paths.  It is kept until Clean_Path_Calc
+        # replaces the paths, so saving the same clean up paths again does
+        # not sort them again.
+        try:
+            found, order = self.clean_order[bit_type]
+            if found is coords:
+                return order
+        except KeyError:
+            pass
+        order = Sort_Paths(coords, 3)
+        self.clean_order[bit_type] = (coords, order)
+        return order
+
+    def WriteSVG(self, fout=None, precision=svg.PRECISION):
+        # SVG of the paths, written to fout when it is given
         if self.cut_type.get() == "v-carve":
             Thick = 0.001
         else:
@@ -2371,27 +2491,55 @@ class Application(Frame):
         width = (maxx - minx) * dpi
         height = (maxy - miny) * dpi
 
-        svg = SVG(self.units.get(), width_in, height_in, width, height, dpi)
+        code = svg.SVG(
+            self.units.get(),
+            width_in,
+            height_in,
+            width,
+            height,
+            dpi,
+            Thick,
+            fout,
+            precision,
+        )
 
         # Make Circle
         if Radius_plot != 0 and self.cut_type.get() == "engrave":
-            svg.circle(
+            code.circle(
                 XOrigin - self.Xzero - minx,
                 -YOrigin + self.Yzero + maxy,
                 Radius_plot,
-                Thick,
             )
         # End Circle
 
-        for line in self.coords:
-            XY = line
-            svg.line(
-                XY[0] - minx, -XY[1] + maxy, XY[2] - minx, -XY[3] + maxy, Thick
-            )
+        # Segments that join end to start are written as one path
+        points = []
+        for XY in self.coords:
+            x1 = XY[0] - minx
+            y1 = -XY[1] + maxy
+            if (
+                points
+                and abs(x1 - points[-1][0]) < Zero
+                and abs(y1 - points[-1][1]) < Zero
+            ):
+                points.append((XY[2] - minx, -XY[3] + maxy))
+                continue
+            self.SVG_Path(code, points)
+            points = [(x1, y1), (XY[2] - minx, -XY[3] + maxy)]
+        self.SVG_Path(code, points)
+
+        code.close()
 
-        svg.close()
+        return code
 
-        return svg
+    def SVG_Path(self, code, points):
+        if len(points) > 2 and (
+            abs(points[0][0] - points[-1][0]) < Zero
+            and abs(points[0][1] - points[-1][1]) < Zero
+        ):
+            code.polyline(points[:-1], closed=True)
+        elif points:
+            code.polyline(points)
 
     def CopyClipboard_GCode(self):
         self.clipboard_clear()
@@ -2404,8 +2552,7 @@ class Application(Frame):
     def CopyClipboard_SVG(self):
         self.clipboard_clear()
         svgcode = self.WriteSVG()
-        for line in svgcode:
-            self.clipboard_append(line + "\n")
+        self.clipboard_append("\n".join(svgcode) + "\n")
 
     def WriteToAxis(self):
         if self.Check_All_Variables() > 0:
@@ -2423,22 +2570,13 @@ class Application(Frame):
         root.destroy()
 
     def ZOOM_ITEMS(self, x0, y0, z_factor):
-        all = self.PreviewCanvas.find_all()
-        for i in all:
-            self.PreviewCanvas.scale(i, x0, y0, z_factor, z_factor)
-            w = self.PreviewCanvas.itemcget(i, "width")
-            self.PreviewCanvas.itemconfig(i, width=float(w) * z_factor)
+        self.preview.zoom(x0, y0, z_factor)
         self.PreviewCanvas.update_idletasks()
 
     def ZOOM(self, z_inc):
-        all = self.PreviewCanvas.find_all()
         x = int(self.PreviewCanvas.cget("width")) / 2.0
         y = int(self.PreviewCanvas.cget("height")) / 2.0
-        for i in all:
-            self.PreviewCanvas.scale(i, x, y, z_inc, z_inc)
-            w = self.PreviewCanvas.itemcget(i, "width")
-            self.PreviewCanvas.itemconfig(i, width=float(w) * z_inc)
-        self.PreviewCanvas.update_idletasks()
+        self.ZOOM_ITEMS(x, y, z_inc)
 
     def menu_View_Zoom_in(self):
         x = int(self.PreviewCanvas.cget("width")) / 2.0
@@ -2475,11 +2613,9 @@ class Application(Frame):
         self.pany = event.y
 
     def mousePan(self, event):
-        all = self.PreviewCanvas.find_all()
         dx = event.x - self.panx
         dy = event.y - self.pany
-        for i in all:
-            self.PreviewCanvas.move(i, dx, dy)
+        self.preview.pan(dx, dy)
         self.lastx = self.lastx + dx
         self.lasty = self.lasty + dy
         self.panx = event.x
@@ -2599,6 +2735,7 @@ class Application(Frame):
 
     def Stop_Click(self, event):
         self.STOP_CALC = True
+        self.stop_event.set()
 
     def calc_vbit_dia(self, bit):
         bit_dia = bit.diameter(
@@ -3215,7 +3352,14 @@ class Application(Frame):
 
     ##########################################################################
     ##########################################################################
+    def Calc_Settings(self):
+        # Read the settings once for a calculation, the calculation loops
+        # use this snapshot rather than the Tk variables.
+        self.settings = settings.snapshot(self)
+        return self.settings
+
     def Check_All_Variables(self):
+        self.Calc_Settings()
         if self.batch.get():
             return 0
         MAIN_error_cnt = (
@@ -3374,7 +3518,7 @@ class Application(Frame):
                 pass
 
         self.V_Carve_It()
-        self.menu_View_Refresh()
+        self.Plot_Data()
         vcalc_status.grab_release()
         try:
             vcalc_status.destroy()
@@ -3488,8 +3632,8 @@ class Application(Frame):
         if self.input_type.get() != "text":
             self.Read_image_file()
         try:
-            ymx = max(self.font[key].get_ymax() for key in self.font)
-            ymn = min(self.font[key].get_ymin() for key in self.font)
+            ymx = self.font.get_ymax()
+            ymn = self.font.get_ymin()
             image_height = ymx - ymn
         except:
             if self.units.get() == "in":
@@ -3640,253 +3784,43 @@ class Application(Frame):
             self.DoIt()
 
     def Open_G_Code_File(self, filename):
-        self.delay_calc = 1
-        boxsize = "0"
         try:
             fin = open(filename, "r")
         except:
             message.fmessage("Unable to open file: %s" % (filename))
             return
-        text_codes = []
-        ident = "fengrave_set"
-        for line in fin:
-            if ident in line:
-
-                input_code = line.split(ident)[1].split()[0]
-
-                if "TCODE" in input_code:
-                    code_list = line[line.find("TCODE") :].split()
-                    for char in code_list:
-                        try:
-                            text_codes.append(int(char))
-                        except:
-                            pass
-                # BOOL
-                elif "show_axis" in input_code:
-                    self.show_axis.set(
-                        line[line.find("show_axis") :].split()[1]
-                    )
-                elif "show_box" in input_code:
-                    self.show_box.set(line[line.find("show_box") :].split()[1])
-                elif "show_thick" in input_code:
-                    self.show_thick.set(
-                        line[line.find("show_thick") :].split()[1]
-                    )
-                elif "flip" in input_code:
-                    self.flip.set(line[line.find("flip") :].split()[1])
-                elif "mirror" in input_code:
-                    self.mirror.set(line[line.find("mirror") :].split()[1])
-                elif "outer" in input_code:
-                    self.outer.set(line[line.find("outer") :].split()[1])
-                elif "upper" in input_code:
-                    self.upper.set(line[line.find("upper") :].split()[1])
-                elif "v_flop" in input_code:
-                    self.v_flop.set(line[line.find("v_flop") :].split()[1])
-                elif "v_pplot" in input_code:
-                    self.v_pplot.set(line[line.find("v_pplot") :].split()[1])
-                elif "inlay" in input_code:
-                    self.inlay.set(line[line.find("inlay") :].split()[1])
-                elif "bmp_long" in input_code:
-                    self.bmp_longcurve.set(
-                        line[line.find("bmp_long") :].split()[1]
-                    )
-                elif "ext_char" in input_code:
-                    self.ext_char.set(line[line.find("ext_char") :].split()[1])
-                elif "useIMGsize" in input_code:
-                    self.useIMGsize.set(
-                        line[line.find("useIMGsize") :].split()[1]
-                    )
-                elif "no_comments" in input_code:
-                    self.no_comments.set(
-                        line[line.find("no_comments") :].split()[1]
-                    )
-                elif "show_v_path" in input_code:
-                    self.show_v_path.set(
-                        line[line.find("show_v_path") :].split()[1]
-                    )
-                elif "show_v_area" in input_code:
-                    self.show_v_area.set(
-                        line[line.find("show_v_area") :].split()[1]
-                    )
+        self.Load_Settings(fin, filename)
+        fin.close()
 
-                elif "plotbox" in input_code:
-                    if line[line.find("plotbox") :].split()[1] == "box":
-                        self.plotbox.set(1)
-                    elif line[line.find("plotbox") :].split()[1] == "no_box":
-                        self.plotbox.set(0)
-                    else:
-                        self.plotbox.set(
-                            line[line.find("plotbox") :].split()[1]
-                        )
+    def Load_Settings(self, lines, filename=None):
+        self.Apply_Settings(settings.saved_values(lines), filename)
 
-                # STRING
-                elif "fontdir" in input_code:
-                    self.fontdir.set(
-                        line[line.find("fontdir") :].split("\042")[1]
-                    )
-                elif "gpre" in input_code:
-                    gpre_tmp = ""
-                    for word in line[line.find("gpre") :].split():
-                        if word != ")" and word != "gpre":
-                            gpre_tmp = gpre_tmp + word + " "
-                    self.gpre.set(gpre_tmp)
-                elif "gpost" in input_code:
-                    gpost_tmp = ""
-                    for word in line[line.find("gpost") :].split():
-                        if word != ")" and word != "gpost":
-                            gpost_tmp = gpost_tmp + word + " "
-                    self.gpost.set(gpost_tmp)
-
-                # STRING.set()
-                elif "arc_fit" in input_code:
-                    self.arc_fit.set(line[line.find("arc_fit") :].split()[1])
-                elif "YSCALE" in input_code:
-                    self.YSCALE.set(line[line.find("YSCALE") :].split()[1])
-                elif "XSCALE" in input_code:
-                    self.XSCALE.set(line[line.find("XSCALE") :].split()[1])
-                elif "LSPACE" in input_code:
-                    self.LSPACE.set(line[line.find("LSPACE") :].split()[1])
-                elif "CSPACE" in input_code:
-                    self.CSPACE.set(line[line.find("CSPACE") :].split()[1])
-                elif "WSPACE" in input_code:
-                    self.WSPACE.set(line[line.find("WSPACE") :].split()[1])
-                elif "TANGLE" in input_code:
-                    self.TANGLE.set(line[line.find("TANGLE") :].split()[1])
-                elif "TRADIUS" in input_code:
-                    self.TRADIUS.set(line[line.find("TRADIUS") :].split()[1])
-                elif "ZSAFE" in input_code:
-                    self.ZSAFE.set(line[line.find("ZSAFE") :].split()[1])
-                elif "ZCUT" in input_code:
-                    self.ZCUT.set(line[line.find("ZCUT") :].split()[1])
-                elif "STHICK" in input_code:
-                    self.STHICK.set(line[line.find("STHICK") :].split()[1])
-
-                elif "xorigin" in input_code:
-                    self.xorigin.set(line[line.find("xorigin") :].split()[1])
-                elif "yorigin" in input_code:
-                    self.yorigin.set(line[line.find("yorigin") :].split()[1])
-                elif "segarc" in input_code:
-                    self.segarc.set(line[line.find("segarc") :].split()[1])
-                elif "accuracy" in input_code:
-                    self.accuracy.set(line[line.find("accuracy") :].split()[1])
-
-                elif "origin" in input_code:
-                    self.origin.set(line[line.find("origin") :].split()[1])
-                elif "justify" in input_code:
-                    self.justify.set(line[line.find("justify") :].split()[1])
-                elif "units" in input_code:
-                    self.units.set(line[line.find("units") :].split()[1])
-                elif "FEED" in input_code:
-                    self.FEED.set(line[line.find("FEED") :].split()[1])
-                elif "PLUNGE" in input_code:
-                    self.PLUNGE.set(line[line.find("PLUNGE") :].split()[1])
-                elif "fontfile" in input_code:
-                    self.fontfile.set(
-                        line[line.find("fontfile") :].split("\042")[1]
-                    )
-                elif "H_CALC" in input_code:
-                    self.H_CALC.set(line[line.find("H_CALC") :].split()[1])
-                elif "boxgap" in input_code:
-                    self.boxgap.set(line[line.find("boxgap") :].split()[1])
-                elif "boxsize" in input_code:
-                    boxsize = line[line.find("boxsize") :].split()[1]
-                elif "cut_type" in input_code:
-                    self.cut_type.set(line[line.find("cut_type") :].split()[1])
-                elif "bit_shape" in input_code:
-                    self.bit_shape.set(
-                        line[line.find("bit_shape") :].split()[1]
-                    )
-                elif "v_bit_angle" in input_code:
-                    self.v_bit_angle.set(
-                        line[line.find("v_bit_angle") :].split()[1]
-                    )
-                elif "v_bit_dia" in input_code:
-                    self.v_bit_dia.set(
-                        line[line.find("v_bit_dia") :].split()[1]
-                    )
-                elif "v_drv_crner" in input_code:
-                    self.v_drv_crner.set(
-                        line[line.find("v_drv_crner") :].split()[1]
-                    )
-                elif "v_stp_crner" in input_code:
-                    self.v_stp_crner.set(
-                        line[line.find("v_stp_crner") :].split()[1]
-                    )
-                elif "v_step_len" in input_code:
-                    self.v_step_len.set(
-                        line[line.find("v_step_len") :].split()[1]
-                    )
-                elif "allowance" in input_code:
-                    self.allowance.set(
-                        line[line.find("allowance") :].split()[1]
-                    )
-                elif "v_max_cut" in input_code:
-                    self.v_max_cut.set(
-                        line[line.find("v_max_cut") :].split()[1]
-                    )
-                elif "v_rough_stk" in input_code:
-                    self.v_rough_stk.set(
-                        line[line.find("v_rough_stk") :].split()[1]
-                    )
-                elif "var_dis" in input_code:
-                    self.var_dis.set(line[line.find("var_dis") :].split()[1])
-                elif "v_depth_lim" in input_code:
-                    self.v_depth_lim.set(
-                        line[line.find("v_depth_lim") :].split()[1]
-                    )
-                elif "v_check_all" in input_code:
-                    self.v_check_all.set(
-                        line[line.find("v_check_all") :].split()[1]
-                    )
-                elif "bmp_turnp" in input_code:
-                    self.bmp_turnpol.set(
-                        line[line.find("bmp_turnp") :].split()[1]
-                    )
-                elif "bmp_turds" in input_code:
-                    self.bmp_turdsize.set(
-                        line[line.find("bmp_turds") :].split()[1]
-                    )
-                elif "bmp_alpha" in input_code:
-                    self.bmp_alphamax.set(
-                        line[line.find("bmp_alpha") :].split()[1]
-                    )
-                elif "bmp_optto" in input_code:
-                    self.bmp_opttolerance.set(
-                        line[line.find("bmp_optto") :].split()[1]
-                    )
-                elif "imagefile" in input_code:
-                    self.IMAGE_FILE = line[line.find("imagefile") :].split(
-                        "\042"
-                    )[1]
-                elif "input_type" in input_code:
-                    self.input_type.set(
-                        line[line.find("input_type") :].split()[1]
-                    )
-                elif "clean_dia" in input_code:
-                    self.clean_dia.set(
-                        line[line.find("clean_dia") :].split()[1]
-                    )
-                elif "clean_step" in input_code:
-                    self.clean_step.set(
-                        line[line.find("clean_step") :].split()[1]
-                    )
-                elif "clean_v" in input_code:
-                    self.clean_v.set(line[line.find("clean_v") :].split()[1])
-                elif "clean_paths" in input_code:
-                    clean_paths = line[line.find("clean_paths") :].split()[1]
-                    clean_split = [float(n) for n in clean_paths.split(",")]
-                    if len(clean_split) > 5:
-                        self.clean_P.set(bool(clean_split[0]))
-                        self.clean_X.set(bool(clean_split[1]))
-                        self.clean_Y.set(bool(clean_split[2]))
-                        self.v_clean_P.set(bool(clean_split[3]))
-                        self.v_clean_Y.set(bool(clean_split[4]))
-                        self.v_clean_X.set(bool(clean_split[5]))
-                elif "NGC_DIR" in input_code:
-                    NGC_DIR = line[line.find("NGC_DIR") :].split("\042")[1]
-                    self.NGC_FILE = NGC_DIR + "/None"
-
-        fin.close()
+    def Apply_Settings(self, values, filename=None):
+        # values are the (name, value) pairs read by settings.saved_values()
+        self.delay_calc = 1
+        boxsize = "0"
+        text_codes = []
+        for name, value in values:
+            if name == "text_codes":
+                text_codes.extend(value)
+            elif name == "boxsize":
+                boxsize = value
+            elif name == "IMAGE_FILE":
+                self.IMAGE_FILE = value
+            elif name == "NGC_DIR":
+                self.NGC_FILE = value + "/None"
+            elif name == "instrument":
+                instrument.enable(value)
+            elif name == "clean_paths":
+                if len(value) > 5:
+                    self.clean_P.set(bool(value[0]))
+                    self.clean_X.set(bool(value[1]))
+                    self.clean_Y.set(bool(value[2]))
+                    self.v_clean_P.set(bool(value[3]))
+                    self.v_clean_Y.set(bool(value[4]))
+                    self.v_clean_X.set(bool(value[5]))
+            else:
+                getattr(self, name).set(value)
 
         file_full = self.fontdir.get() + "/" + self.fontfile.get()
         fileName, fileExtension = os.path.splitext(file_full)
@@ -3945,9 +3879,165 @@ class Application(Frame):
 
         self.delay_calc = 0
         if self.initComplete == 1:
-            self.NGC_FILE = filename
+            if filename is not None:
+                self.NGC_FILE = filename
             self.menu_Mode_Change()
 
+    def Set_Input_Path(self, value):
+        if os.path.isdir(value):
+            self.fontdir.set(value)
+        elif os.path.isfile(value):
+            dirname = os.path.dirname(value)
+            fileName, fileExtension = os.path.splitext(value)
+            TYPE = fileExtension.upper()
+            if TYPE == ".CXF" or TYPE == ".TTF":
+                self.input_type.set("text")
+                self.fontdir.set(dirname)
+                self.fontfile.set(os.path.basename(fileName) + fileExtension)
+            else:
+                self.input_type.set("image")
+                self.IMAGE_FILE = value
+        else:
+            message.fmessage("File/Directory Not Found:\t%s" % (value))
+
+    ##########################################
+    #        Batch Jobs                      #
+    ##########################################
+    def Batch_State(self):
+        state = {}
+        for name, var in self.__dict__.items():
+            if isinstance(var, (StringVar, BooleanVar)):
+                state[name] = var.get()
+        for name in ("NGC_FILE", "IMAGE_FILE", "HOME_DIR", "default_text"):
+            state[name] = getattr(self, name)
+        # a job's "instrument" setting only lasts for that job
+        state["instrument"] = instrument.mode
+        return state
+
+    def Batch_Restore(self, state):
+        for name, value in state.items():
+            if name == "instrument":
+                instrument.enable(value)
+                continue
+            var = getattr(self, name)
+            if isinstance(var, (StringVar, BooleanVar)):
+                var.set(value)
+            else:
+                setattr(self, name, value)
+
+    def Batch_Settings(self, job):
+        # Every job starts from the settings given on the command line
+        self.Batch_Restore(self.batch_state)
+        settings = job.get("settings")
+        if settings is not None:
+            self.Apply_Settings(self.Settings_Template(settings))
+        if job["overrides"]:
+            self.Load_Settings(batch.settings_lines(job["overrides"]))
+        path = job.get("font")
+        if path is not None:
+            if not os.path.exists(path) and not os.path.dirname(path):
+                # a font name, looked up in the font directory
+                name = font.find_font_file(self.fontdir.get(), path)
+                if name is not None:
+                    path = os.path.join(self.fontdir.get(), name)
+            if not os.path.exists(path):
+                raise IOError("Font/Image file not found: %s" % (path))
+            self.Set_Input_Path(path)
+        if "text" in job:
+            self.default_text = job["text"].replace("|", "\n")
+
+    def Settings_Template(self, filename):
+        # Settings read from a g-code file, kept until the file changes
+        if not os.path.isfile(filename):
+            raise IOError("Settings file not found: %s" % (filename))
+        key = (filename, os.path.getmtime(filename))
+        try:
+            return self.settings_cache[key]
+        except KeyError:
+            pass
+        fin = open(filename, "r")
+        values = list(settings.saved_values(fin))
+        fin.close()
+        self.settings_cache[key] = values
+        return values
+
+    def Batch_Code(self, job, times):
+        stamp = time()
+        self.checkpoint_base = job.get("output")
+        self.Batch_Settings(job)
+        if self.input_type.get() == "text":
+            self.Read_font_file()
+        else:
+            self.Read_image_file()
+        if not self.font:
+            raise IOError("Unable to read font or image file")
+        times["load"] = time() - stamp
+
+        stamp = time()
+        self.DoIt()
+        times["layout"] = time() - stamp
+
+        if self.cut_type.get() == "v-carve":
+            stamp = time()
+            self.V_Carve_It()
+            times["vcarve"] = time() - stamp
+
+        TYPE = job.get("format", "").upper()
+        if TYPE == "":
+            fileName, fileExtension = os.path.splitext(job.get("output", ""))
+            TYPE = fileExtension[1:].upper()
+        stamp = time()
+        if TYPE == "SVG":
+            code = self.WriteSVG()
+        elif TYPE == "DXF":
+            code = WriteDXF(self.coords)
+        else:
+            code = self.WriteGCode()
+        times["write"] = time() - stamp
+        instrument.report(job.get("output"))
+        return code
+
+    def Batch_Job(self, job, times):
+        code = self.Batch_Code(job, times)
+        stamp = time()
+        fout = open(job["output"], "w")
+        for line in code:
+            try:
+                fout.write(line + "\n")
+            except:
+                fout.write("(skipping line)\n")
+        fout.close()
+        times["write"] = times["write"] + time() - stamp
+
+    def Batch_Manifest(self, manifest, processes):
+        stamp = time()
+        try:
+            jobs = batch.read_manifest(manifest)
+        except Exception as e:
+            message.fmessage("Unable to read manifest %s: %s" % (manifest, e))
+            return
+
+        # Read the fonts here so that each one is only read once, the
+        # worker processes are started with a copy of them.
+        for job in jobs:
+            try:
+                self.Batch_Settings(job)
+                if self.input_type.get() == "text":
+                    self.Read_font_file()
+            except:
+                pass
+
+        results = batch.run_jobs(
+            jobs, self, batch_application, self.worker_argv, processes
+        )
+        summary = os.path.splitext(manifest)[0] + "_summary.csv"
+        try:
+            batch.write_summary(results, summary)
+        except:
+            message.fmessage("Unable to write summary file: %s" % (summary))
+        for line in batch.summary_lines(results, time() - stamp):
+            message.fmessage(line)
+
     def menu_File_Save_Settings_File(self):
         gcode = self.WriteGCode(config_file=True)
         init_dir = os.path.dirname(self.NGC_FILE)
@@ -4044,6 +4134,49 @@ class Application(Frame):
             self.statusMessage.set("File Saved: %s" % (filename))
             self.statusbar.configure(bg="white")
 
+    def menu_File_Save_Inlay_Pair(self):
+        if self.Check_All_Variables() > 0:
+            return
+
+        init_dir = os.path.dirname(self.NGC_FILE)
+        if not os.path.isdir(init_dir):
+            init_dir = self.HOME_DIR
+
+        if self.input_type.get() == "image":
+            fileName, fileExtension = os.path.splitext(self.IMAGE_FILE)
+            init_file = os.path.basename(fileName)
+        else:
+            init_file = "text"
+
+        filename = asksaveasfilename(
+            defaultextension=".ngc",
+            filetypes=[
+                ("G-Code File", "*.ngc"),
+                ("TAP File", "*.tap"),
+                ("All Files", "*"),
+            ],
+            initialdir=init_dir,
+            initialfile=init_file,
+        )
+
+        if filename != "" and filename != ():
+            self.statusbar.configure(bg="yellow")
+            self.statusMessage.set("Calculating Inlay Pocket and Plug")
+            self.master.update()
+            try:
+                filenames = self.Save_Inlay_Pair(filename)
+            except IOError:
+                self.statusMessage.set(
+                    "Unable to open file for writing: %s" % (filename)
+                )
+                self.statusbar.configure(bg="red")
+                return
+            self.statusMessage.set(
+                "Files Saved: %s"
+                % (", ".join([os.path.basename(f) for f in filenames]))
+            )
+            self.statusbar.configure(bg="white")
+
     def menu_File_Save_clean_G_Code_File(self, bit_type="straight"):
         if self.Check_All_Variables() > 0:
             return
@@ -4100,8 +4233,6 @@ class Application(Frame):
             self.statusbar.configure(bg="white")
 
     def menu_File_Save_SVG_File(self):
-        svgcode = self.WriteSVG()
-
         init_dir = os.path.dirname(self.NGC_FILE)
         if not os.path.isdir(init_dir):
             init_dir = self.HOME_DIR
@@ -4130,11 +4261,7 @@ class Application(Frame):
                 )
                 self.statusbar.configure(bg="red")
                 return
-            for line in svgcode:
-                try:
-                    fout.write(line + "\n")
-                except:
-                    pass
+            self.WriteSVG(fout)
             fout.close()
 
             self.statusMessage.set("File Saved: %s" % (filename))
@@ -4143,11 +4270,25 @@ class Application(Frame):
     def menu_File_Save_DXF_File_close_loops(self):
         self.menu_File_Save_DXF_File(close_loops=True)
 
-    def menu_File_Save_DXF_File(self, close_loops=False):
+    def menu_File_Save_DXF_File_toolpaths(self):
+        self.menu_File_Save_DXF_File(toolpaths=True)
+
+    def DXF_Toolpaths(self):
+        # V-carve and clean up toolpaths, each on its own DXF layer
+        toolpaths = []
+        for layer, points in (
+            ("VCARVE", self.vcoords),
+            ("CLEANUP", self.clean_coords_sort),
+            ("V_CLEANUP", self.v_clean_coords_sort),
+        ):
+            if points:
+                toolpaths.append((layer, points))
+        return toolpaths
+
+    def menu_File_Save_DXF_File(self, close_loops=False, toolpaths=False):
         if close_loops:
             self.V_Carve_It(clean_flag=0, DXF_FLAG=close_loops)
 
-        DXF_CODE = WriteDXF(self.coords)
         init_dir = os.path.dirname(self.NGC_FILE)
         if not os.path.isdir(init_dir):
             init_dir = self.HOME_DIR
@@ -4176,11 +4317,10 @@ class Application(Frame):
                 )
                 self.statusbar.configure(bg="red")
                 return
-            for line in DXF_CODE:
-                try:
-                    fout.write(line + "\n")
-                except:
-                    pass
+            if toolpaths:
+                WriteDXF(self.coords, fout, close_loops, self.DXF_Toolpaths())
+            else:
+                WriteDXF(self.coords, fout, close_loops)
             fout.close()
 
             self.statusMessage.set("File Saved: %s" % (filename))
@@ -4873,55 +5013,34 @@ class Application(Frame):
             else:
                 pass
             ###########################################################
-            self.Plot_Data()
+            self.Plot_Fit()
 
-    def Plot_Line(
-        self,
-        XX1,
-        YY1,
-        XX2,
-        YY2,
-        midx,
-        midy,
-        cszw,
-        cszh,
-        PlotScale,
-        col,
-        radius=0,
-    ):
-        x1 = cszw / 2 + (XX1 - midx) / PlotScale
-        x2 = cszw / 2 + (XX2 - midx) / PlotScale
-        y1 = cszh / 2 - (YY1 - midy) / PlotScale
-        y2 = cszh / 2 - (YY2 - midy) / PlotScale
+    # Preview geometry is given in world coordinates; self.preview keeps it
+    # in a tile index and only draws what is in view.
+    def Plot_Line(self, XX1, YY1, XX2, YY2, col, radius=0):
         if radius == 0:
             thick = 0
         else:
-            thick = radius * 2 / PlotScale
-        self.segID.append(
-            self.PreviewCanvas.create_line(
-                x1, y1, x2, y2, fill=col, capstyle="round", width=thick
-            )
+            thick = radius * 2 / self.pscale
+        self.preview.line(
+            XX1, YY1, XX2, YY2, thick, fill=col, capstyle="round"
         )
 
-    def Plot_Circ(
-        self, XX1, YY1, midx, midy, cszw, cszh, PlotScale, color, Rad, fill
-    ):
+    def Plot_Circ(self, XX1, YY1, color, Rad, fill):
         dd = Rad
-        x1 = cszw / 2 + (XX1 - dd - midx) / PlotScale
-        x2 = cszw / 2 + (XX1 + dd - midx) / PlotScale
-        y1 = cszh / 2 - (YY1 - dd - midy) / PlotScale
-        y2 = cszh / 2 - (YY1 + dd - midy) / PlotScale
         if fill == 0:
-            self.segID.append(
-                self.PreviewCanvas.create_oval(
-                    x1, y1, x2, y2, outline=color, fill=None, width=1
-                )
+            return self.preview.oval(
+                XX1 - dd, YY1 - dd, XX1 + dd, YY1 + dd, 1, outline=color
             )
         else:
-            self.segID.append(
-                self.PreviewCanvas.create_oval(
-                    x1, y1, x2, y2, outline=color, fill=color, width=0
-                )
+            return self.preview.oval(
+                XX1 - dd,
+                YY1 - dd,
+                XX1 + dd,
+                YY1 + dd,
+                0,
+                outline=color,
+                fill=color,
             )
 
     def Recalculate_RQD_Nocalc(self, event):
@@ -4942,11 +5061,12 @@ class Application(Frame):
     ##########################################
     #          Read Font File                #
     ##########################################
+    @instrument.timed("Read_font_file")
     def Read_font_file(self):
         if self.delay_calc == 1:
             return
 
-        self.font = {}
+        self.font = Font()
         file_full = self.fontdir.get() + "/" + self.fontfile.get()
         if not os.path.isfile(file_full):
             return
@@ -4957,30 +5077,81 @@ class Application(Frame):
 
         self.current_input_file.set(os.path.basename(file_full))
 
-        self.font = font.parse_font_file(
-            file_full, self.segarc.get(), self.ext_char.get()
+        # Batch jobs that share a font only read it once
+        key = (
+            file_full,
+            self.segarc.get(),
+            self.ext_char.get(),
+            os.path.getmtime(file_full),
         )
+        try:
+            self.font = self.font_cache[key]
+        except KeyError:
+            self.font = font.parse_font_file(
+                file_full, self.segarc.get(), self.ext_char.get()
+            )
+            if self.font:
+                font.record_font(
+                    file_full,
+                    self.font,
+                    self.segarc.get(),
+                    self.ext_char.get(),
+                )
+            if self.font and self.batch.get():
+                self.font_cache[key] = self.font
 
         if self.font:
             self.input_type.set("text")
         else:
+            # ttf2cxf_stream is only tried once a TTF font is read
+            if (
+                file_full.upper().endswith(".TTF")
+                and not font.TTF_is_supported()
+            ):
+                message.fmessage(
+                    "ttf2cxf_stream executable is not present/working"
+                    "...Bummer"
+                )
             self.statusMessage.set(
                 "Unable to open font file: %s" % (file_full)
             )
             self.statusbar.configure(bg="red")
 
         if not self.batch.get():
+            self.Font_Details_ToolTip(file_full)
             self.entry_set(self.Entry_ArcAngle, self.Entry_ArcAngle_Check(), 1)
             self.menu_View_Refresh()
 
+    def Font_Details_ToolTip(self, file_full):
+        # Show the details kept in the font index for the selected font
+        details = font.font_details(
+            file_full, self.segarc.get(), self.ext_char.get()
+        )
+        if details is None:
+            self.Listbox_1_ToolTip.configure(state="disabled")
+            return
+        ranges = details["ranges"]
+        self.Listbox_1_ToolTip.configure(
+            text="%s\n%d glyphs, U+%04X to U+%04X\nLine height %.4g"
+            % (
+                os.path.basename(file_full),
+                details["glyphs"],
+                ranges[0][0],
+                ranges[-1][1],
+                details["line_height"],
+            ),
+            state="normal",
+        )
+
     ##########################################
     #          Read Font File                #
     ##########################################
+    @instrument.timed("Read_image_file")
     def Read_image_file(self):
         if self.delay_calc == 1:
             return
 
-        self.font = {}
+        self.font = Font()
         file_full = self.IMAGE_FILE
         file_name = os.path.basename(file_full)
         if not os.path.isfile(file_full):
@@ -5179,27 +5350,57 @@ class Application(Frame):
     ##########################################
     #        CANVAS PLOTTING STUFF           #
     ##########################################
+    def Plot_Fit_Transform(self):
+        # Plot scale (design units per pixel) and canvas offsets that fit the
+        # design in the preview canvas
+        cszw = int(self.PreviewCanvas.cget("width"))
+        cszh = int(self.PreviewCanvas.cget("height"))
+        buff = 10
+
+        maxx = self.MAXX
+        minx = self.MINX
+        maxy = self.MAXY
+        miny = self.MINY
+        midx = (maxx + minx) / 2
+        midy = (maxy + miny) / 2
+
+        if self.cut_type.get() == "v-carve":
+            Thick = 0.0
+        else:
+            Thick = float(self.STHICK.get())
+
+        PlotScale = max(
+            (maxx - minx + Thick) / (cszw - buff),
+            (maxy - miny + Thick) / (cszh - buff),
+        )
+        if PlotScale <= 0:
+            PlotScale = 1.0
+        return (
+            PlotScale,
+            cszw / 2 - midx / PlotScale,
+            cszh / 2 + midy / PlotScale,
+        )
+
+    def Plot_Fit(self):
+        # Fit the plotted design to the canvas again (after a resize or for
+        # Zoom Fit) without plotting it again
+        if self.delay_calc == 1:
+            return
+        PlotScale, xoff, yoff = self.Plot_Fit_Transform()
+        self.preview.fit(1.0 / PlotScale, xoff, yoff)
+
     def Plot_Data(self):
         if (self.delay_calc == 1) or (self.delay_calc == 1):
             return
         self.master.update_idletasks()
-        # erase old segs/display objects
-        self.PreviewCanvas.delete(ALL)
-        self.segID = []
         bit = bit_from_shape(
             self.bit_shape.get(), self.v_bit_dia.get(), self.v_bit_angle.get()
         )
 
-        cszw = int(self.PreviewCanvas.cget("width"))
-        cszh = int(self.PreviewCanvas.cget("height"))
-        buff = 10
-
         maxx = self.MAXX
         minx = self.MINX
         maxy = self.MAXY
         miny = self.MINY
-        midx = (maxx + minx) / 2
-        midy = (maxy + miny) / 2
 
         if self.cut_type.get() == "v-carve":
             Thick = 0.0
@@ -5211,52 +5412,32 @@ class Application(Frame):
         else:
             Radius_in = 0.0
 
-        PlotScale = max(
-            (maxx - minx + Thick) / (cszw - buff),
-            (maxy - miny + Thick) / (cszh - buff),
-        )
-        if PlotScale <= 0:
-            PlotScale = 1.0
+        PlotScale, xoff, yoff = self.Plot_Fit_Transform()
         self.pscale = PlotScale
+        # erase old segs/display objects
+        self.preview.reset(
+            1.0 / PlotScale, xoff, yoff, minx, miny, maxx, maxy
+        )
 
         Radius_plot = 0
         if self.plotbox.get() and self.cut_type.get() == "engrave":
             if Radius_in != 0:
                 Radius_plot = float(self.RADIUS_PLOT)
 
-        x_lft = cszw / 2 + (minx - midx) / PlotScale
-        x_rgt = cszw / 2 + (maxx - midx) / PlotScale
-        y_bot = cszh / 2 + (maxy - midy) / PlotScale
-        y_top = cszh / 2 + (miny - midy) / PlotScale
-
         if self.show_box.get():
-            self.segID.append(
-                self.PreviewCanvas.create_rectangle(
-                    x_lft,
-                    y_bot,
-                    x_rgt,
-                    y_top,
-                    fill="gray80",
-                    outline="gray80",
-                    width=0,
-                )
+            self.preview.rectangle(
+                minx, miny, maxx, maxy, 0, fill="gray80", outline="gray80"
             )
 
         if Radius_in != 0:
-            Rx_lft = cszw / 2 + (-Radius_in - midx) / PlotScale
-            Rx_rgt = cszw / 2 + (Radius_in - midx) / PlotScale
-            Ry_bot = cszh / 2 + (Radius_in + midy) / PlotScale
-            Ry_top = cszh / 2 + (-Radius_in + midy) / PlotScale
-            self.segID.append(
-                self.PreviewCanvas.create_oval(
-                    Rx_lft,
-                    Ry_bot,
-                    Rx_rgt,
-                    Ry_top,
-                    outline="gray90",
-                    width=0,
-                    dash=3,
-                )
+            self.preview.oval(
+                -Radius_in,
+                -Radius_in,
+                Radius_in,
+                Radius_in,
+                0,
+                outline="gray90",
+                dash=3,
             )
 
         if self.show_thick.get():
@@ -5269,45 +5450,29 @@ class Application(Frame):
 
         # Plot circle radius with radius equal to Radius_plot
         if Radius_plot != 0:
-            Rpx_lft = cszw / 2 + (-Radius_plot - midx - x_zero) / PlotScale
-            Rpx_rgt = cszw / 2 + (Radius_plot - midx - x_zero) / PlotScale
-            Rpy_bot = cszh / 2 + (Radius_plot + midy + y_zero) / PlotScale
-            Rpy_top = cszh / 2 + (-Radius_plot + midy + y_zero) / PlotScale
-            self.segID.append(
-                self.PreviewCanvas.create_oval(
-                    Rpx_lft,
-                    Rpy_bot,
-                    Rpx_rgt,
-                    Rpy_top,
-                    outline="black",
-                    width=plot_width,
-                )
+            self.preview.oval(
+                -Radius_plot - x_zero,
+                -Radius_plot - y_zero,
+                Radius_plot - x_zero,
+                Radius_plot - y_zero,
+                plot_width,
+                outline="black",
             )
 
         for line in self.coords:
             XY = line
-            x1 = cszw / 2 + (XY[0] - midx) / PlotScale
-            x2 = cszw / 2 + (XY[2] - midx) / PlotScale
-            y1 = cszh / 2 - (XY[1] - midy) / PlotScale
-            y2 = cszh / 2 - (XY[3] - midy) / PlotScale
-            self.segID.append(
-                self.PreviewCanvas.create_line(
-                    x1,
-                    y1,
-                    x2,
-                    y2,
-                    fill="black",
-                    width=plot_width,
-                    capstyle="round",
-                )
+            self.preview.line(
+                XY[0],
+                XY[1],
+                XY[2],
+                XY[3],
+                plot_width,
+                fill="black",
+                capstyle="round",
             )
         XOrigin = float(self.xorigin.get())
         YOrigin = float(self.yorigin.get())
         axis_length = (maxx - minx) / 4
-        axis_x1 = cszw / 2 + (-midx + XOrigin) / PlotScale
-        axis_x2 = cszw / 2 + (axis_length - midx + XOrigin) / PlotScale
-        axis_y1 = cszh / 2 - (-midy + YOrigin) / PlotScale
-        axis_y2 = cszh / 2 - (axis_length - midy + YOrigin) / PlotScale
 
         #########################################
         # V-carve Plotting Stuff
@@ -5330,11 +5495,6 @@ class Application(Frame):
                             self.Plot_Circ(
                                 x1,
                                 y1,
-                                midx,
-                                midy,
-                                cszw,
-                                cszh,
-                                PlotScale,
                                 color,
                                 r,
                                 1,
@@ -5344,11 +5504,6 @@ class Application(Frame):
                             self.Plot_Circ(
                                 x1,
                                 y1,
-                                midx,
-                                midy,
-                                cszw,
-                                cszh,
-                                PlotScale,
                                 color,
                                 r - r_inlay_top,
                                 1,
@@ -5357,11 +5512,6 @@ class Application(Frame):
                             self.Plot_Circ(
                                 x1,
                                 y1,
-                                midx,
-                                midy,
-                                cszw,
-                                cszh,
-                                PlotScale,
                                 color,
                                 r,
                                 1,
@@ -5398,11 +5548,6 @@ class Application(Frame):
                             yold,
                             x1,
                             y1,
-                            midx,
-                            midy,
-                            cszw,
-                            cszh,
-                            PlotScale,
                             color,
                         )
                     loop_old = loop
@@ -5432,11 +5577,6 @@ class Application(Frame):
                         yold,
                         x1,
                         y1,
-                        midx,
-                        midy,
-                        cszw,
-                        cszh,
-                        PlotScale,
                         color,
                         r,
                     )
@@ -5463,11 +5603,6 @@ class Application(Frame):
                         yold,
                         x1,
                         y1,
-                        midx,
-                        midy,
-                        cszw,
-                        cszh,
-                        PlotScale,
                         color,
                     )
                 loop_old = loop
@@ -5492,11 +5627,6 @@ class Application(Frame):
                         yold,
                         x1,
                         y1,
-                        midx,
-                        midy,
-                        cszw,
-                        cszh,
-                        PlotScale,
                         color,
                     )
                 loop_old = loop
@@ -5509,18 +5639,27 @@ class Application(Frame):
 
         if self.show_axis.get():
             # Plot coordinate system origin
-            self.segID.append(
-                self.PreviewCanvas.create_line(
-                    axis_x1, axis_y1, axis_x2, axis_y1, fill="red", width=0
-                )
+            self.preview.line(
+                XOrigin,
+                YOrigin,
+                axis_length + XOrigin,
+                YOrigin,
+                0,
+                fill="red",
             )
-            self.segID.append(
-                self.PreviewCanvas.create_line(
-                    axis_x1, axis_y1, axis_x1, axis_y2, fill="green", width=0
-                )
+            self.preview.line(
+                XOrigin,
+                YOrigin,
+                XOrigin,
+                axis_length + YOrigin,
+                0,
+                fill="green",
             )
 
+        self.preview.draw()
+
     # Perform  Calculations
+    @instrument.timed("DoIt")
     def DoIt(self):
         if (self.delay_calc == 1) or (self.delay_calc == 1):
             return
@@ -5540,10 +5679,9 @@ class Application(Frame):
             self.statusbar.configure(bg="yellow")
             self.statusMessage.set(" Calculating.........")
             self.master.update_idletasks()
-            self.PreviewCanvas.delete(ALL)
+            self.preview.delete_all()
 
         # erase old data
-        self.segID = []
         self.coords = []
         self.vcoords = []
         self.clean_coords = []
@@ -5660,12 +5798,8 @@ class Application(Frame):
                 pass
 
         if self.H_CALC.get() == "max_all":
-            font_line_height = max(
-                self.font[key].get_ymax() for key in self.font
-            )
-            font_line_depth = min(
-                self.font[key].get_ymin() for key in self.font
-            )
+            font_line_height = self.font.get_ymax()
+            font_line_depth = self.font.get_ymin()
         elif self.H_CALC.get() == "max_use":
             font_line_height = font_used_height
             font_line_depth = font_used_depth
@@ -5706,7 +5840,7 @@ class Application(Frame):
                 else:
                     message.fmessage("(" + error_text + ")")
             return
-        font_char_width = max(self.font[key].get_xmax() for key in self.font)
+        font_char_width = self.font.get_xmax()
         font_word_space = font_char_width * (WSpaceP / 100.0)
 
         XScale = float(self.XSCALE.get()) * YScale / 100
@@ -5884,9 +6018,10 @@ class Application(Frame):
             #        TEXT RIGHT JUSTIFY STUFF        #
             ##########################################
             if self.justify.get() == "Right":
+                upper = self.upper.get()
                 for line in self.coords:
                     XY = line
-                    if self.upper.get():
+                    if upper:
                         XY[0], XY[1] = Transform(XY[0], XY[1], maxa)
                         XY[2], XY[3] = Transform(XY[2], XY[3], maxa)
                     else:
@@ -6196,6 +6331,8 @@ class Application(Frame):
                 message.fmessage("%s," % (entry), False)
             message.fmessage(")")
 
+        instrument.count("segments", len(self.coords))
+
         if not self.batch.get():
             self.Plot_Data()
         ################
@@ -6215,10 +6352,12 @@ class Application(Frame):
                 v_flop = not (v_flop)
         return v_flop
 
+    @instrument.timed("V_Carve_It")
     def V_Carve_It(self, clean_flag=0, DXF_FLAG=False):
-        timestamp = 0
-        self.master.unbind("<Configure>")
+        if not self.worker:
+            self.master.unbind("<Configure>")
         self.STOP_CALC = False
+        self.stop_event.clear()
         bit = bit_from_shape(
             self.bit_shape.get(), self.v_bit_dia.get(), self.v_bit_angle.get()
         )
@@ -6232,6 +6371,7 @@ class Application(Frame):
 
         if self.Check_All_Variables() > 0:
             return
+        cfg = self.settings
         if clean_flag != 1:
             self.DoIt()
             self.clean_coords = []
@@ -6246,7 +6386,7 @@ class Application(Frame):
             self.v_clean_coords_sort = []
             self.Plot_Data()
 
-        if not self.batch.get():
+        if not cfg.batch:
             self.statusbar.configure(bg="yellow")
             self.statusMessage.set("Preparing for V-Carve Calculations")
             self.master.update()
@@ -6254,658 +6394,57 @@ class Application(Frame):
         #########################################
         # V-Carve Stuff
         #########################################
-        if self.cut_type.get() == "v-carve" and not self.fontdex.get():
+        if cfg.cut_type == "v-carve" and not cfg.fontdex:
 
-            v_flop = self.get_flop_staus()
-            if not self.batch.get():
-                cszw = int(self.PreviewCanvas.cget("width"))
-                cszh = int(self.PreviewCanvas.cget("height"))
-                if self.v_pplot.get() == 1:
+            if not cfg.batch:
+                if cfg.v_pplot == 1:
                     self.Plot_Data()
 
-            PlotScale = self.pscale
-            maxx = self.MAXX
-            minx = self.MINX
-            maxy = self.MAXY
-            miny = self.MINY
-            midx = (maxx + minx) / 2
-            midy = (maxy + miny) / 2
-
-            dline = float(self.v_step_len.get())
-            ###############################################################
-            rbit = self.calc_vbit_dia(bit) / 2.0
-            clean_dia = float(self.clean_dia.get())
-
-            if clean_flag != 1:
-                rmax = rbit
-            else:
-                rmax = rbit + clean_dia / 2
-            ###############################################################
-            v_stp_crner = float(self.v_stp_crner.get())
-            if self.inlay.get():
-                v_drv_crner = 360 - v_stp_crner
-            else:
-                v_drv_crner = float(self.v_drv_crner.get())
-
-            CHK_STRING = str(self.v_check_all.get())
-            not_b_carve = not bool(self.bit_shape.get() == "BALL")
-
-            if self.input_type.get() != "text":
-                CHK_STRING = "all"
-
-            BIT_ANGLE = bit.angle
-
-            dangle = degrees(dline / rbit)
-            if dangle < 2.0:
-                dangle = 2.0
-
-            if (self.input_type.get() == "image") and (clean_flag == 0):
+            if (cfg.input_type == "image") and (clean_flag == 0):
                 self.coords = sort_for_v_carve(
                     self.coords,
-                    float(self.accuracy.get()),
+                    cfg.accuracy,
                     self.sort_for_v_carve_status_callback,
                 )
 
             if DXF_FLAG:
                 return
 
-            # set variable for first point in loop
-            xa = 9999
-            ya = 9999
-            xb = 9999
-            yb = 9999
-            # set variable for the point previously calculated in a loop
-            x0 = 9999
-            y0 = 9999
-            seg_sin0 = 2
-            seg_cos0 = 2
-            char_num0 = -1
-            theta = 9999.0
-            loop_cnt = 0
-            if not v_flop:
-                v_inc = 1
-                v_index = -1
-                i_x1 = 0
-                i_y1 = 1
-                i_x2 = 2
-                i_y2 = 3
-            else:
-                v_inc = -1
-                v_index = len(self.coords)
-                i_x1 = 2
-                i_y1 = 3
-                i_x2 = 0
-                i_y2 = 1
-
-            coord_radius = []
-            #########################
-            # Setup Grid Partitions #
-            #########################
-            xLength = self.MAXX - self.MINX
-            yLength = self.MAXY - self.MINY
-
-            xN = 0
-            yN = 0
-
-            xN_minus_1 = max(int(xLength / ((2 * rmax + dline) * 1.1)), 1)
-            yN_minus_1 = max(int(yLength / ((2 * rmax + dline) * 1.1)), 1)
-
-            xPartitionLength = xLength / xN_minus_1
-            yPartitionLength = yLength / yN_minus_1
-
-            xN = xN_minus_1 + 1
-            yN = yN_minus_1 + 1
-
-            if xPartitionLength < Zero:
-                xPartitionLength = 1
-            if yPartitionLength < Zero:
-                yPartitionLength = 1
-
-            partitionList = []
-
-            for xCount in range(0, xN):
-                partitionList.append([])
-                for yCount in range(0, yN):
-                    partitionList[xCount].append([])
-
-            ###############################
-            # End Setup Grid Partitions   #
-            ###############################
-
-            CUR_CNT = -1
-            while len(self.coords) > CUR_CNT + 1:
-                CUR_CNT = CUR_CNT + 1
-                XY_R = self.coords[CUR_CNT][:]
-                x1_R = XY_R[0]
-                y1_R = XY_R[1]
-                x2_R = XY_R[2]
-                y2_R = XY_R[3]
-                LENGTH = sqrt(
-                    (x2_R - x1_R) * (x2_R - x1_R)
-                    + (y2_R - y1_R) * (y2_R - y1_R)
-                )
-
-                R_R = LENGTH / 2 + rmax
-                X_R = (x1_R + x2_R) / 2
-                Y_R = (y1_R + y2_R) / 2
-                coord_radius.append([X_R, Y_R, R_R])
-
-                #####################################################
-                # Determine active partitions for each line segment #
-                #####################################################
-                coded_index = []
-                # Find the local coordinates of the line segment ends
-                x1_G = XY_R[0] - self.MINX
-                y1_G = XY_R[1] - self.MINY
-                x2_G = XY_R[2] - self.MINX
-                y2_G = XY_R[3] - self.MINY
-
-                # Find the grid box index for each line segment end
-                X1i = int(x1_G / xPartitionLength)
-                X2i = int(x2_G / xPartitionLength)
-                Y1i = int(y1_G / yPartitionLength)
-                Y2i = int(y2_G / yPartitionLength)
-
-                # Find the max/min grid box locations
-                Xindex_min = min(X1i, X2i)
-                Xindex_max = max(X1i, X2i)
-                Yindex_min = min(Y1i, Y2i)
-                Yindex_max = max(Y1i, Y2i)
-
-                check_points = []
-                if (Xindex_max > Xindex_min) and (abs(x2_G - x1_G) > Zero):
-                    if (Yindex_max > Yindex_min) and (abs(y2_G - y1_G) > Zero):
-                        check_points.append([X1i, Y1i])
-                        check_points.append([X2i, Y2i])
-                        # Establish line equation variables: y=m*x+b
-                        m_G = (y2_G - y1_G) / (x2_G - x1_G)
-                        b_G = y1_G - m_G * x1_G
-                        # Add check point in each partition in the range of X
-                        # values
-                        x_ind_check = Xindex_min + 1
-                        while x_ind_check <= Xindex_max - 1:
-                            x_val = x_ind_check * xPartitionLength
-                            y_val = m_G * x_val + b_G
-                            y_ind_check = int(y_val / yPartitionLength)
-                            check_points.append([x_ind_check, y_ind_check])
-                            x_ind_check = x_ind_check + 1
-                        # Add check point in each partition in the range of Y
-                        # values
-                        y_ind_check = Yindex_min + 1
-                        while y_ind_check <= Yindex_max - 1:
-                            y_val = y_ind_check * yPartitionLength
-                            x_val = (y_val - b_G) / m_G
-                            x_ind_check = int(x_val / xPartitionLength)
-                            check_points.append([x_ind_check, y_ind_check])
-                            y_ind_check = y_ind_check + 1
-                    else:
-                        x_ind_check = Xindex_min
-                        y_ind_check = Yindex_min
-                        while x_ind_check <= Xindex_max:
-                            check_points.append([x_ind_check, y_ind_check])
-                            x_ind_check = x_ind_check + 1
-                else:
-                    x_ind_check = Xindex_min
-                    y_ind_check = Yindex_min
-                    while y_ind_check <= Yindex_max:
-                        check_points.append([x_ind_check, y_ind_check])
-                        y_ind_check = y_ind_check + 1
-
-                # For each grid box in check_points add the grid box and all
-                # adjacent grid boxes to the list of boxes for this line
-                # segment
-                for xy_point in check_points:
-                    xy_p = xy_point
-                    xIndex = xy_p[0]
-                    yIndex = xy_p[1]
-                    for i in range(max(xIndex - 1, 0), min(xN, xIndex + 2)):
-                        for j in range(
-                            max(yIndex - 1, 0), min(yN, yIndex + 2)
-                        ):
-                            coded_index.append(int(i + j * xN))
-
-                codedIndexSet = set(coded_index)
-
-                for thisCode in codedIndexSet:
-                    thisIndex = thisCode
-                    line_R_appended = XY_R
-                    line_R_appended.append(X_R)
-                    line_R_appended.append(Y_R)
-                    line_R_appended.append(R_R)
-                    partitionList[int(thisIndex % xN)][
-                        int(thisIndex / xN)
-                    ].append(line_R_appended)
-            #########################################################
-            # End Determine active partitions for each line segment #
-            #########################################################
-            # Loop through again just to determine the total length of segments
-            # For the percent complete calculation
-            if v_index >= len(self.coords):
-                v_index = len(self.coords)
-            v_ind = v_index
-
-            CUR_CNT = -1
-            TOT_LENGTH = 0.0
-
-            for line in range(len(self.coords)):
-                CUR_CNT = CUR_CNT + 1
-                v_ind = v_ind + v_inc
-                x1 = self.coords[v_ind][i_x1]
-                y1 = self.coords[v_ind][i_y1]
-                x2 = self.coords[v_ind][i_x2]
-                y2 = self.coords[v_ind][i_y2]
-                LENGTH = sqrt((x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1))
-                if clean_flag == 1:
-                    if self.clean_segment[CUR_CNT] != 0:
-                        TOT_LENGTH = TOT_LENGTH + LENGTH
-                else:
-                    TOT_LENGTH = TOT_LENGTH + LENGTH
+            if clean_flag == 1 and len(self.clean_segment) != len(
+                self.coords
+            ):
+                message.fmessage("Need to Recalculate V-Carve Path")
+                if not self.worker:
+                    self.master.bind("<Configure>", self.Master_Configure)
+                return
 
-            CUR_LENGTH = 0.0
-            MAX_CNT = len(self.coords)
-            CUR_CNT = -1
-            START_TIME = time()
+            engine = self.V_Carve_Engine(
+                cfg, bit, clean_flag, self.Checkpoint_File(clean_flag)
+            )
+            engine.partition()
 
             # Update canvas with modified paths
-            if not self.batch.get():
+            if not cfg.batch:
                 self.Plot_Data()
 
-            if TOT_LENGTH > 0.0:
-                calc_flag = 1
-                for line in range(len(self.coords)):
-                    CUR_CNT = CUR_CNT + 1
-
-                    if clean_flag == 0:
-                        self.clean_segment.append(0)
-                    elif len(self.clean_segment) != len(self.coords):
-                        message.fmessage("Need to Recalculate V-Carve Path")
-                        break
-                    else:
-                        calc_flag = self.clean_segment[CUR_CNT]
-
-                    if not self.batch.get():
-                        stamp = int(3 * time())  # update every 1/3 of a second
-                        if stamp != timestamp:
-                            timestamp = stamp  # interlock
-
-                            CUR_PCT = float(CUR_LENGTH) / TOT_LENGTH * 100.0
-                            if CUR_PCT > 0.0:
-                                MIN_REMAIN = (
-                                    (time() - START_TIME)
-                                    / 60
-                                    * (100 - CUR_PCT)
-                                    / CUR_PCT
-                                )
-                                MIN_TOTAL = (
-                                    100.0
-                                    / CUR_PCT
-                                    * (time() - START_TIME)
-                                    / 60
-                                )
-                            else:
-                                MIN_REMAIN = -1
-                                MIN_TOTAL = -1
-
-                            self.statusMessage.set(
-                                "%.1f %% ( %.1f Minutes Remaining "
-                                "| %.1f Minutes Total )"
-                                % (CUR_PCT, MIN_REMAIN, MIN_TOTAL)
-                            )
-                            self.statusbar.configure(bg="yellow")
-                            self.PreviewCanvas.update()
-
-                    if self.STOP_CALC:
-                        self.STOP_CALC = False
-
-                        if clean_flag != 1:
-                            self.vcoords = []
-                        else:
-                            self.clean_coords = []
-                            calc_flag = 0
-                        break
-
-                    v_index = v_index + v_inc
-                    New_Loop = 0
-                    x1 = self.coords[v_index][i_x1]
-                    y1 = self.coords[v_index][i_y1]
-                    x2 = self.coords[v_index][i_x2]
-                    y2 = self.coords[v_index][i_y2]
-                    char_num = int(self.coords[v_index][5])
-                    dx = x2 - x1
-                    dy = y2 - y1
-                    Lseg = sqrt(dx * dx + dy * dy)
-
-                    if Lseg < Zero:  # was Acc
-                        continue
-
-                    # calculate the sin and cos of the coord transformation
-                    # needed for the distance calculations
-                    seg_sin = dy / Lseg
-                    seg_cos = -dx / Lseg
-                    phi = Get_Angle(seg_sin, seg_cos)
-
-                    if calc_flag != 0:
-                        CUR_LENGTH = CUR_LENGTH + Lseg
-                    else:
-                        theta = (
-                            phi  # commented out in V1.62 brought back in V1.72
-                        )
-                        x0 = x2  # commented out in V1.62 brought back in V1.72
-                        y0 = y2  # commented out in V1.62 brought back in V1.72
-                        seg_sin0 = seg_sin  # commented out in V1.62 brought
-                                            # back in V1.72
-                        seg_cos0 = seg_cos  # commented out in V1.62 brought
-                                            # back in V1.72
-                        char_num0 = char_num  # commented out in V1.62 brought
-                                              # back in V1.72
-                        # Brought back because...
-                        continue
-
-                    if (
-                        (fabs(x1 - x0) > Zero)
-                        or (fabs(y1 - y0) > Zero)
-                        or (char_num != char_num0)
-                    ):
-                        New_Loop = 1
-                        loop_cnt = loop_cnt + 1
-                        xa = float(x1)
-                        ya = float(y1)
-                        xb = float(x2)
-                        yb = float(y2)
-                        theta = 9999.0
-                        seg_sin0 = 2
-                        seg_cos0 = 2
-
-                    if seg_cos0 > 1.0:
-                        delta = 180
-                    else:
-                        xtmp1 = (x2 - x1) * seg_cos0 - (y2 - y1) * seg_sin0
-                        ytmp1 = (x2 - x1) * seg_sin0 + (y2 - y1) * seg_cos0
-                        Ltmp = sqrt(xtmp1 * xtmp1 + ytmp1 * ytmp1)
-                        d_seg_sin = ytmp1 / Ltmp
-                        d_seg_cos = xtmp1 / Ltmp
-                        delta = Get_Angle(d_seg_sin, d_seg_cos)
-                    if (
-                        delta < float(v_drv_crner)
-                        and BIT_ANGLE != 0
-                        and not_b_carve
-                        and clean_flag != 1
-                    ):
-                        # drive to corner
-                        self.vcoords.append([x1, y1, 0.0, loop_cnt])
-
-                    if delta > float(v_stp_crner):
-                        # add sub-steps around corner
-                        ###########################
-                        phisteps = max(floor((delta - 180) / dangle), 2)
-                        step_phi = (delta - 180) / phisteps
-                        pcnt = 0
-                        while pcnt < phisteps - 1:
-                            pcnt = pcnt + 1
-                            sub_phi = radians(-pcnt * step_phi + theta)
-                            sub_seg_cos = cos(sub_phi)
-                            sub_seg_sin = sin(sub_phi)
-
-                            rout = find_max_circle(
-                                x1,
-                                y1,
-                                rmax,
-                                char_num,
-                                sub_seg_sin,
-                                sub_seg_cos,
-                                1,
-                                CHK_STRING,
-                                self.MINX,
-                                self.MINY,
-                                xPartitionLength,
-                                yPartitionLength,
-                                partitionList,
-                            )
-                            if clean_flag != 1:
-                                coords_destination = self.vcoords
-                            else:
-                                coords_destination = self.clean_coords
-                            xv, yv, rv, clean_seg = record_v_carve_data(
-                                x1,
-                                y1,
-                                sub_phi,
-                                rout,
-                                loop_cnt,
-                                clean_flag,
-                                rbit,
-                                coords_destination,
-                            )
-                            self.clean_segment[CUR_CNT] = bool(
-                                self.clean_segment[CUR_CNT]
-                            ) or bool(clean_seg)
-                            if (
-                                self.v_pplot.get() == 1
-                                and (not self.batch.get())
-                                and (clean_flag != 1)
-                            ):
-                                self.Plot_Circ(
-                                    xv,
-                                    yv,
-                                    midx,
-                                    midy,
-                                    cszw,
-                                    cszh,
-                                    PlotScale,
-                                    "blue",
-                                    rv,
-                                    0,
-                                )
-                    #############################
-                    ### end for linec in self.coords
-                    theta = phi
-                    x0 = x2
-                    y0 = y2
-                    seg_sin0 = seg_sin
-                    seg_cos0 = seg_cos
-                    char_num0 = char_num
-
-                    # Calculate the number of steps then the dx and dy for each
-                    # step.
-                    # Don't calculate at the joints.
-                    nsteps = max(floor(Lseg / dline), 2)
-                    dxpt = dx / nsteps
-                    dypt = dy / nsteps
-
-                    # This makes sure the first cut start at the beginning of
-                    # the first segment
-                    cnt = 0
-                    if New_Loop == 1 and BIT_ANGLE != 0 and not_b_carve:
-                        cnt = -1
-
-                    seg_sin = dy / Lseg
-                    seg_cos = -dx / Lseg
-                    phi2 = radians(Get_Angle(seg_sin, seg_cos))
-                    while cnt < nsteps - 1:
-                        cnt = cnt + 1
-                        # determine location of next step along outline
-                        # (xpt, ypt)
-                        xpt = x1 + dxpt * cnt
-                        ypt = y1 + dypt * cnt
-
-                        rout = find_max_circle(
-                            xpt,
-                            ypt,
-                            rmax,
-                            char_num,
-                            seg_sin,
-                            seg_cos,
-                            0,
-                            CHK_STRING,
-                            self.MINX,
-                            self.MINY,
-                            xPartitionLength,
-                            yPartitionLength,
-                            partitionList,
-                        )
-                        # Make the first cut drive down at an angle instead of
-                        # straight down plunge
-                        if cnt == 0 and not_b_carve:
-                            rout = 0.0
-                        if clean_flag != 1:
-                            coords_destination = self.vcoords
-                        else:
-                            coords_destination = self.clean_coords
-                        xv, yv, rv, clean_seg = record_v_carve_data(
-                            xpt,
-                            ypt,
-                            phi2,
-                            rout,
-                            loop_cnt,
-                            clean_flag,
-                            rbit,
-                            coords_destination,
-                        )
-
-                        self.clean_segment[CUR_CNT] = bool(
-                            self.clean_segment[CUR_CNT]
-                        ) or bool(clean_seg)
-                        if (
-                            self.v_pplot.get() == 1
-                            and (not self.batch.get())
-                            and (clean_flag != 1)
-                        ):
-                            self.master.update_idletasks()
-                            self.Plot_Circ(
-                                xv,
-                                yv,
-                                midx,
-                                midy,
-                                cszw,
-                                cszh,
-                                PlotScale,
-                                "blue",
-                                rv,
-                                0,
-                            )
-
-                        if New_Loop == 1 and cnt == 1:
-                            xpta = xpt
-                            ypta = ypt
-                            phi2a = phi2
-                            routa = rout
-
-                    #################################################
-                    # Check to see if we need to close an open loop #
-                    #################################################
-                    if abs(x2 - xa) < Zero and abs(y2 - ya) < Zero:
-                        xtmp1 = (xb - xa) * seg_cos0 - (yb - ya) * seg_sin0
-                        ytmp1 = (xb - xa) * seg_sin0 + (yb - ya) * seg_cos0
-                        Ltmp = sqrt(xtmp1 * xtmp1 + ytmp1 * ytmp1)
-                        d_seg_sin = ytmp1 / Ltmp
-                        d_seg_cos = xtmp1 / Ltmp
-                        delta = Get_Angle(d_seg_sin, d_seg_cos)
-                        if delta < v_drv_crner and clean_flag != 1:
-                            # Drive to corner
-                            self.vcoords.append([xa, ya, 0.0, loop_cnt])
-
-                        elif delta > v_stp_crner:
-                            # Add sub-steps around corner
-                            phisteps = max(floor((delta - 180) / dangle), 2)
-                            step_phi = (delta - 180) / phisteps
-                            pcnt = 0
-
-                            while pcnt < phisteps - 1:
-                                pcnt = pcnt + 1
-                                sub_phi = radians(-pcnt * step_phi + theta)
-                                sub_seg_cos = cos(sub_phi)
-                                sub_seg_sin = sin(sub_phi)
-
-                                rout = find_max_circle(
-                                    xa,
-                                    ya,
-                                    rmax,
-                                    char_num,
-                                    sub_seg_sin,
-                                    sub_seg_cos,
-                                    1,
-                                    CHK_STRING,
-                                    self.MINX,
-                                    self.MINY,
-                                    xPartitionLength,
-                                    yPartitionLength,
-                                    partitionList,
-                                )
-                                if clean_flag != 1:
-                                    coords_destination = self.vcoords
-                                else:
-                                    coords_destination = self.clean_coords
-                                xv, yv, rv, clean_seg = record_v_carve_data(
-                                    xa,
-                                    ya,
-                                    sub_phi,
-                                    rout,
-                                    loop_cnt,
-                                    clean_flag,
-                                    rbit,
-                                    coords_destination,
-                                )
-                                self.clean_segment[CUR_CNT] = bool(
-                                    self.clean_segment[CUR_CNT]
-                                ) or bool(clean_seg)
-                                if (
-                                    (self.v_pplot.get() == 1)
-                                    and (not self.batch.get())
-                                    and (clean_flag != 1)
-                                ):
-                                    self.Plot_Circ(
-                                        xv,
-                                        yv,
-                                        midx,
-                                        midy,
-                                        cszw,
-                                        cszh,
-                                        PlotScale,
-                                        "blue",
-                                        rv,
-                                        0,
-                                    )
-
-                            if clean_flag != 1:
-                                coords_destination = self.vcoords
-                            else:
-                                coords_destination = self.clean_coords
-                            xv, yv, rv, clean_seg = record_v_carve_data(
-                                xpta,
-                                ypta,
-                                phi2a,
-                                routa,
-                                loop_cnt,
-                                clean_flag,
-                                rbit,
-                                coords_destination,
-                            )
-                            self.clean_segment[CUR_CNT] = bool(
-                                self.clean_segment[CUR_CNT]
-                            ) or bool(clean_seg)
-                        else:
-                            # Add closing segment
-                            if clean_flag != 1:
-                                coords_destination = self.vcoords
-                            else:
-                                coords_destination = self.clean_coords
-                            xv, yv, rv, clean_seg = record_v_carve_data(
-                                xpta,
-                                ypta,
-                                phi2a,
-                                routa,
-                                loop_cnt,
-                                clean_flag,
-                                rbit,
-                                coords_destination,
-                            )
-                            self.clean_segment[CUR_CNT] = bool(
-                                self.clean_segment[CUR_CNT]
-                            ) or bool(clean_seg)
+            reads = settings.tk_read_mark()
+            if cfg.batch:
+                engine.run()
+            else:
+                self.V_Carve_Thread(engine)
+            settings.report_tk_reads("V_Carve_It", reads)
+            if engine.grid is not None:
+                engine.grid.report("V_Carve_It")
+                engine.grid.add_counts()
 
-                # end for line in self coords
+            if clean_flag != 1:
+                self.vcoords = engine.vcoords
+            else:
+                self.clean_coords = engine.clean_coords
 
+            if engine.total_length > 0.0:
                 # Reset Entry Fields in V-Carve Settings
-                if not self.batch.get():
+                if not cfg.batch:
                     self.entry_set(
                         self.Entry_Vbitangle, self.Entry_Vbitangle_Check(), 1
                     )
@@ -6946,19 +6485,269 @@ class Application(Frame):
                         self.Entry_V_CLEAN, self.Entry_V_CLEAN_Check(), 1
                     )
 
-            if CUR_CNT == MAX_CNT - 1 and (not self.batch.get()):
-                self.statusMessage.set("Done -- " + self.bounding_box.get())
+            if engine.resumed is not None and cfg.batch:
+                sys.stderr.write(
+                    "(V-Carve: resumed from checkpoint at %.1f%%)\n"
+                    % (engine.resumed)
+                )
+            if engine.saved > 0:
+                saved = "%d of %d circle evaluations saved" % (
+                    engine.saved,
+                    engine.saved + engine.evaluations,
+                )
+                if cfg.batch:
+                    sys.stderr.write("(V-Carve: %s)\n" % (saved))
+            if engine.complete and (not cfg.batch):
+                status = "Done -- " + self.bounding_box.get()
+                if engine.saved > 0:
+                    status = status + " -- " + saved
+                if engine.resumed is not None:
+                    status = status + (
+                        " -- resumed from checkpoint at %.1f%%"
+                        % (engine.resumed)
+                    )
+                self.statusMessage.set(status)
                 self.statusbar.configure(bg="white")
 
-        self.master.bind("<Configure>", self.Master_Configure)
+        if not self.worker:
+            self.master.bind("<Configure>", self.Master_Configure)
         #########################################
         # End V-Carve Stuff
         #########################################
 
+    def Checkpoint_File(self, clean_flag=0):
+        # Checkpoint file for the V-carve calculation, next to the g-code
+        # file (or the output of the batch job).  There is none for a batch
+        # run that writes to stdout.
+        if self.batch.get():
+            base = self.checkpoint_base
+            if base is None:
+                return None
+        else:
+            base = self.NGC_FILE
+        fileName, fileExtension = os.path.splitext(base)
+        if os.path.basename(fileName) == "None":
+            fileName = os.path.join(os.path.dirname(fileName), "f-engrave")
+        if clean_flag == 1:
+            return fileName + ".clean.ckpt"
+        return fileName + ".vcarve.ckpt"
+
+    def V_Carve_Engine(self, cfg, bit, clean_flag=0, checkpoint=None):
+        # V-carve engine for the current paths in self.coords
+        v_flop = self.get_flop_staus()
+        dline = cfg.v_step_len
+        ###############################################################
+        rbit = self.calc_vbit_dia(bit) / 2.0
+        clean_dia = cfg.clean_dia
+
+        if clean_flag != 1:
+            rmax = rbit
+        else:
+            rmax = rbit + clean_dia / 2
+        ###############################################################
+        v_stp_crner = cfg.v_stp_crner
+        if cfg.inlay:
+            v_drv_crner = 360 - v_stp_crner
+        else:
+            v_drv_crner = cfg.v_drv_crner
+
+        CHK_STRING = str(cfg.v_check_all)
+        not_b_carve = not bool(cfg.bit_shape == "BALL")
+
+        if cfg.input_type != "text":
+            CHK_STRING = "all"
+
+        BIT_ANGLE = bit.angle
+
+        dangle = degrees(dline / rbit)
+        if dangle < 2.0:
+            dangle = 2.0
+
+        # Adaptive steps interpolate the radii that are within the
+        # accuracy setting of a straight line
+        tolerance = 0.0
+        if cfg.v_adaptive:
+            tolerance = cfg.accuracy
+
+        return VCarve(
+            self.coords,
+            self.MINX,
+            self.MINY,
+            self.MAXX,
+            self.MAXY,
+            rmax,
+            rbit,
+            dline,
+            dangle,
+            v_drv_crner,
+            v_stp_crner,
+            CHK_STRING,
+            not_b_carve,
+            BIT_ANGLE,
+            v_flop,
+            clean_flag,
+            self.clean_segment,
+            tolerance,
+            checkpoint,
+        )
+
+    ##########################################
+    #        Inlay Pair                      #
+    ##########################################
+    def Inlay_Pair(self, processes=None):
+        # Calculate the pocket (female) and plug (male) of an inlay and
+        # return the g-code for each.  The plug is a prismatic inlay cut
+        # with the box around it and mirrored relative to the pocket.
+        state = self.Batch_State()
+        mirror = bool(self.mirror.get())
+        sides = (
+            {"inlay": False, "plotbox": False, "mirror": mirror},
+            {"inlay": True, "plotbox": True, "mirror": not mirror},
+        )
+
+        engines = []
+        for side in sides:
+            self.Inlay_Side(state, side)
+            cfg = self.Calc_Settings()
+            bit = bit_from_shape(cfg.bit_shape, cfg.v_bit_dia, cfg.v_bit_angle)
+            if cfg.input_type == "image":
+                self.coords = sort_for_v_carve(
+                    self.coords,
+                    cfg.accuracy,
+                    self.sort_for_v_carve_status_callback,
+                )
+            self.clean_segment = []
+            engines.append(self.V_Carve_Engine(cfg, bit))
+
+        # The two sides do not depend on each other
+        run_engines(engines, processes)
+
+        gcode = []
+        for side, engine in zip(sides, engines):
+            self.Inlay_Side(state, side)
+            self.vcoords = engine.vcoords
+            gcode.append(self.WriteGCode())
+
+        self.Batch_Restore(state)
+        self.DoIt()
+        return gcode
+
+    def Save_Inlay_Pair(self, filename, processes=None):
+        fileName, fileExtension = os.path.splitext(filename)
+        if fileExtension == "":
+            fileExtension = ".ngc"
+        filenames = []
+        gcode_pair = self.Inlay_Pair(processes)
+        for side, gcode in zip(("_female", "_male"), gcode_pair):
+            filenames.append(fileName + side + fileExtension)
+            fout = open(filenames[-1], "w")
+            for line in gcode:
+                try:
+                    fout.write(line + "\n")
+                except:
+                    fout.write("(skipping line)\n")
+            fout.close()
+        return filenames
+
+    def Inlay_Side(self, state, side):
+        self.Batch_Restore(state)
+        self.cut_type.set("v-carve")
+        for name, value in side.items():
+            getattr(self, name).set(value)
+        self.DoIt()
+
+    ##########################################################################
+    # Run the V-carve engine in a worker thread.  Progress and circles for  #
+    # the live plot are passed back through a queue that is drained from    #
+    # the Tk event loop; Stop_Click cancels the calculation through         #
+    # self.stop_event.  Returns once the calculation has finished.          #
+    # Circles are queued in batches and each refresh only spends            #
+    # PPLOT_FRAME_TIME seconds drawing them, so plotting does not hold back #
+    # the calculation.  With v_pplot_env set, circles that would land       #
+    # within a pixel or two of the previous one are not drawn at all.       #
+    ##########################################################################
+    def V_Carve_Thread(self, engine):
+        updates = queue.Queue()
+        errors = []
+        circles = []
+
+        def status(CUR_PCT, MIN_REMAIN, MIN_TOTAL):
+            if circles:
+                updates.put(("circles", circles[:]))
+                del circles[:]
+            updates.put(("status", CUR_PCT, MIN_REMAIN, MIN_TOTAL))
+
+        def plot(xv, yv, rv):
+            circles.append((xv, yv, rv))
+            if len(circles) >= PPLOT_BATCH:
+                updates.put(("circles", circles[:]))
+                del circles[:]
+
+        def work():
+            try:
+                engine.run(status, plot, self.stop_event)
+            except Exception:
+                errors.append(sys.exc_info()[1])
+
+        pending = []
+
+        def drain():
+            alive = worker.is_alive()
+            try:
+                while True:
+                    item = updates.get_nowait()
+                    if item[0] == "status":
+                        self.statusMessage.set(
+                            "%.1f %% ( %.1f Minutes Remaining "
+                            "| %.1f Minutes Total )" % item[1:]
+                        )
+                        self.statusbar.configure(bg="yellow")
+                    elif self.v_pplot.get() == 1:
+                        pending.extend(item[1])
+            except queue.Empty:
+                pass
+
+            if not alive:
+                # The preview is redrawn once the calculation is done
+                done.set(True)
+                return
+
+            if pending and self.v_pplot.get() == 1:
+                batch = pending[:]
+                del pending[:]
+                if self.v_pplot_env.get():
+                    batch = decimate(
+                        batch, PPLOT_ENV_PIXELS / self.preview.scale
+                    )
+                stamp = time() + PPLOT_FRAME_TIME
+                for i, circle in enumerate(batch):
+                    if time() > stamp:
+                        # Out of time for this refresh, keep an evenly
+                        # thinned backlog for the next one.
+                        rest = batch[i:]
+                        step = len(rest) // PPLOT_BACKLOG + 1
+                        pending.extend(rest[::step])
+                        break
+                    xv, yv, rv = circle
+                    self.preview.show(self.Plot_Circ(xv, yv, "blue", rv, 0))
+            else:
+                del pending[:]
+            self.after(PPLOT_REFRESH, drain)
+
+        done = BooleanVar()
+        done.set(False)
+        worker = threading.Thread(target=work)
+        worker.daemon = True
+        worker.start()
+        self.after(PPLOT_REFRESH, drain)
+        self.wait_variable(done)
+        if errors:
+            raise errors[0]
+
     def sort_for_v_carve_status_callback(
         self, status=None, initialize=False, check_for_timeout=False
     ):
-        if not self.batch.get():
+        if not self.settings.batch:
             if initialize:
                 self.timestamp = time() - 1.0
                 self.STOP_CALC = False
@@ -6980,7 +6769,9 @@ class Application(Frame):
                         return False
         return True
 
+    @instrument.timed("Clean_Path_Calc")
     def Clean_Path_Calc(self, bit_radius, bit_type="straight"):
+        cfg = self.Calc_Settings()
         v_flop = self.get_flop_staus(CLEAN_FLAG=True)
         if v_flop:
             edge = 1
@@ -6993,55 +6784,57 @@ class Application(Frame):
         #######################################
         if bit_type == "straight":
             test_clean = (
-                self.clean_P.get() + self.clean_X.get() + self.clean_Y.get()
+                cfg.clean_P + cfg.clean_X + cfg.clean_Y
             )
         else:
             test_clean = (
-                self.v_clean_P.get()
-                + self.v_clean_Y.get()
-                + self.v_clean_X.get()
+                cfg.v_clean_P
+                + cfg.v_clean_Y
+                + cfg.v_clean_X
             )
 
         check_coords = []
 
-        self.statusbar.configure(bg="yellow")
+        if not cfg.batch:
+            self.statusbar.configure(bg="yellow")
         if bit_type == "straight":
-            self.statusMessage.set("Calculating Cleanup Cut Paths")
-            self.master.update()
+            if not cfg.batch:
+                self.statusMessage.set("Calculating Cleanup Cut Paths")
+                self.master.update()
             self.clean_coords_sort = []
-            clean_dia = float(self.clean_dia.get())  # diameter of cleanup bit
-            step_over = float(self.clean_step.get())  # percent of cut DIA
+            clean_dia = cfg.clean_dia  # diameter of cleanup bit
+            step_over = cfg.clean_step  # percent of cut DIA
             clean_step = step_over / 100.0
             Radjust = clean_dia / 2.0 + bit_radius
             check_coords = self.clean_coords
 
         elif bit_type == "v-bit":
-            self.statusMessage.set("Calculating V-Bit Cleanup Cut Paths")
             skip = 1
             clean_step = 1.0
 
-            self.master.update()
+            if not cfg.batch:
+                self.statusMessage.set("Calculating V-Bit Cleanup Cut Paths")
+                self.master.update()
             self.v_clean_coords_sort = []
 
-            clean_dia = float(
-                self.clean_v.get()
-            )  # effective diameter of clean-up v-bit
+            clean_dia = cfg.clean_v  # effective diameter of clean-up v-bit
             if float(clean_dia) < Zero:
                 return
             # The next line allows the cutter to get within 1/4 of the
             # v-clean step of the v-carved surface.
             offset = clean_dia / 4.0
             Radjust = bit_radius + offset
-            flat_clean_r = float(self.clean_dia.get()) / 2.0
+            flat_clean_r = cfg.clean_dia / 2.0
             for line in self.clean_coords:
                 XY = line
                 R = XY[2] - Radjust
                 if (R > 0.0) and (R < flat_clean_r - offset - Zero):
                     check_coords.append(XY)
 
+        reads = settings.tk_read_mark()
         clean_coords_out = []
         if (
-            self.cut_type.get() == "v-carve"
+            cfg.cut_type == "v-carve"
             and len(self.clean_coords) > 1
             and test_clean > 0
         ):
@@ -7060,10 +6853,8 @@ class Application(Frame):
             ## NEW STUFF FOR STRAIGHT BIT ##
             if bit_type == "straight":
                 MaxLoop = 0
-                clean_dia = float(
-                    self.clean_dia.get()
-                )  # diameter of cleanup bit
-                step_over = float(self.clean_step.get())  # percent of cut DIA
+                clean_dia = cfg.clean_dia  # diameter of cleanup bit
+                step_over = cfg.clean_step  # percent of cut DIA
                 clean_step = step_over / 100.0
                 Rperimeter = bit_radius + (clean_dia / 2.0)
 
@@ -7088,7 +6879,7 @@ class Application(Frame):
                 loop_coords = Clean_coords_to_Path_coords(check_coords)
                 loop_coords = sort_for_v_carve(
                     loop_coords,
-                    float(self.accuracy.get()),
+                    cfg.accuracy,
                     self.sort_for_v_carve_status_callback,
                 )
 
@@ -7130,11 +6921,11 @@ class Application(Frame):
                     y_pmax = max(y_pmax, P_coords[i][1])
                 loop_cnt_out = loop_cnt_out + MaxLoop
 
-                if self.clean_P.get() == 1:
+                if cfg.clean_P == 1:
                     clean_coords_out = P_coords
 
                 offset = DX / 2.0
-                if self.clean_X.get() == 1:
+                if cfg.clean_X == 1:
                     y_pmax = y_pmax - offset
                     y_pmin = y_pmin + offset
                     Ysize = y_pmax - y_pmin
@@ -7164,7 +6955,7 @@ class Application(Frame):
                                         [x2 - offset, y2, loop_cnt]
                                     )
 
-                if self.clean_Y.get() == 1:
+                if cfg.clean_Y == 1:
                     x_pmax = x_pmax - offset
                     x_pmin = x_pmin + offset
                     Xsize = x_pmax - x_pmin
@@ -7211,7 +7002,7 @@ class Application(Frame):
                 #######################################################
                 # Find new order based on distance                    #
                 #######################################################
-                if self.v_clean_P.get() == 1:
+                if cfg.v_clean_P == 1:
                     ########################################
                     ecoords = []
                     for line in Xclean_perimeter:
@@ -7293,8 +7084,8 @@ class Application(Frame):
             ###########################################################
             # Now deal with the horizontal line cuts
             ###########################################################
-            if (self.clean_X.get() == 1 and bit_type != "v-bit") or (
-                self.v_clean_X.get() == 1 and bit_type == "v-bit"
+            if (cfg.clean_X == 1 and bit_type != "v-bit") or (
+                cfg.v_clean_X == 1 and bit_type == "v-bit"
             ):
                 x_old = -999
                 y_old = -999
@@ -7325,8 +7116,8 @@ class Application(Frame):
             ###########################################################
             # Now deal with the vertical line cuts
             ###########################################################
-            if (self.clean_Y.get() == 1 and bit_type != "v-bit") or (
-                self.v_clean_Y.get() == 1 and bit_type == "v-bit"
+            if (cfg.clean_Y == 1 and bit_type != "v-bit") or (
+                cfg.v_clean_Y == 1 and bit_type == "v-bit"
             ):
                 x_old = -999
                 y_old = -999
@@ -7353,22 +7144,27 @@ class Application(Frame):
                         x_old = x1
                         y_old = y1
                         loop_old = loop
+            settings.report_tk_reads("Clean_Path_Calc", reads)
 
-            self.entry_set(
-                self.Entry_CLEAN_DIA, self.Entry_CLEAN_DIA_Check(), 1
-            )
-            self.entry_set(
-                self.Entry_STEP_OVER, self.Entry_STEP_OVER_Check(), 1
-            )
-            self.entry_set(self.Entry_V_CLEAN, self.Entry_V_CLEAN_Check(), 1)
+            if not cfg.batch:
+                self.entry_set(
+                    self.Entry_CLEAN_DIA, self.Entry_CLEAN_DIA_Check(), 1
+                )
+                self.entry_set(
+                    self.Entry_STEP_OVER, self.Entry_STEP_OVER_Check(), 1
+                )
+                self.entry_set(
+                    self.Entry_V_CLEAN, self.Entry_V_CLEAN_Check(), 1
+                )
 
             if bit_type == "v-bit":
                 self.v_clean_coords_sort = clean_coords_out
             else:
                 self.clean_coords_sort = clean_coords_out
-        self.statusMessage.set("Done Calculating Cleanup Cut Paths")
-        self.statusbar.configure(bg="white")
-        self.master.update_idletasks()
+        if not cfg.batch:
+            self.statusMessage.set("Done Calculating Cleanup Cut Paths")
+            self.statusbar.configure(bg="white")
+            self.master.update_idletasks()
 
     #######################################
     # End Reorganize                       #
@@ -7855,6 +7651,13 @@ class Application(Frame):
             x=xd_entry_L, y=D_Yloc, width=75, height=23
         )
         self.Checkbutton_v_pplot.configure(variable=self.v_pplot)
+        self.Checkbutton_v_pplot_env = Checkbutton(
+            gen_settings, text="Envelope Only", anchor=W
+        )
+        self.Checkbutton_v_pplot_env.place(
+            x=xd_entry_L + 75, y=D_Yloc, width=150, height=23
+        )
+        self.Checkbutton_v_pplot_env.configure(variable=self.v_pplot_env)
 
         D_Yloc = D_Yloc + D_dY + 10
         self.Label_SaveConfig = Label(gen_settings, text="Configuration File")
@@ -8059,6 +7862,13 @@ class Application(Frame):
         self.Entry_StepSize.configure(textvariable=self.v_step_len)
         self.v_step_len.trace_variable("w", self.Entry_StepSize_Callback)
         self.entry_set(self.Entry_StepSize, self.Entry_StepSize_Check(), 2)
+        self.Checkbutton_v_adaptive = Checkbutton(
+            vcarve_settings, text="Adaptive Steps", anchor=W
+        )
+        self.Checkbutton_v_adaptive.place(
+            x=xd_units_L + w_units + 10, y=D_Yloc, width=150, height=23
+        )
+        self.Checkbutton_v_adaptive.configure(variable=self.v_adaptive)
 
         D_Yloc = D_Yloc + D_dY + 12
         self.vcarve_separator00 = Frame(
@@ -8503,41 +8313,51 @@ class Application(Frame):
         )
 
 
+def batch_application(argv):
+    # Application used by a batch worker process.  A worker never makes a
+    # widget, so it runs on a Tcl interpreter without Tk and needs no
+    # display.  The interpreter is the default root for the option variables.
+    master = Tk(useTk=False)
+    tkinter._default_root = master
+    return Application(master, argv, worker=True)
+
+
 # Start Application
-root = Tk()
-app = Application(root)
-app.master.title("F-Engrave V" + version)
-app.master.iconname("F-Engrave")
-app.master.minsize(780, 540)
-try:
+if __name__ == "__main__":
+    root = Tk()
+    app = Application(root)
+    app.master.title("F-Engrave V" + version)
+    app.master.iconname("F-Engrave")
+    app.master.minsize(780, 540)
     try:
-        import tkFont
+        try:
+            import tkFont
 
-        default_font = tkFont.nametofont("TkDefaultFont")
-    except:
-        import tkinter.font
+            default_font = tkFont.nametofont("TkDefaultFont")
+        except:
+            import tkinter.font
 
-        default_font = tkinter.font.nametofont("TkDefaultFont")
+            default_font = tkinter.font.nametofont("TkDefaultFont")
 
-    default_font.configure(size=9)
-    default_font.configure(family="arial")
-    # print(default_font.cget("size"))
-    # print(default_font.cget("family"))
-except:
-    message.debug_message("Font Set Failed.")
+        default_font.configure(size=9)
+        default_font.configure(family="arial")
+        # print(default_font.cget("size"))
+        # print(default_font.cget("family"))
+    except:
+        message.debug_message("Font Set Failed.")
 
-try:
     try:
-        app.master.iconbitmap(r"emblem")
-    except:
-        app.master.iconbitmap(bitmap="@emblem64")
-except:
-    try:  # Attempt to create temporary icon bitmap file
-        temp_icon("f_engrave_icon")
-        app.master.iconbitmap(bitmap="@f_engrave_icon")
-        os.remove("f_engrave_icon")
+        try:
+            app.master.iconbitmap(r"emblem")
+        except:
+            app.master.iconbitmap(bitmap="@emblem64")
     except:
-        message.fmessage("Unable to create temporary icon file.")
+        try:  # Attempt to create temporary icon bitmap file
+            temp_icon("f_engrave_icon")
+            app.master.iconbitmap(bitmap="@f_engrave_icon")
+            os.remove("f_engrave_icon")
+        except:
+            message.fmessage("Unable to create temporary icon file.")
 
-app.f_engrave_init()
-root.mainloop()
+    app.f_engrave_init()
+    root.mainloop()
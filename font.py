@@ -2,40 +2,158 @@ from math import cos, sin, radians
 import os
 import re
 import sys
-from graphics import Character, Line
+import fontindex
+from graphics import Character, Font, Line
 from subprocess import Popen, PIPE
 
+try:
+    from subprocess import DEVNULL
+except ImportError:
+    DEVNULL = open(os.devnull, "w")
+
 VERSION = sys.version_info[0]
 
-test_cmd = ["ttf2cxf_stream", "TEST", "STDOUT"]
-try:
-    p = Popen(test_cmd, stdout=PIPE, stderr=PIPE)
-    stdout, stderr = p.communicate()
-    if VERSION == 3:
-        stdout = bytes.decode(stdout)
-    ttf_is_supported = str.find(stdout.upper(), 'TTF2CXF') != -1
-except:
-    ttf_is_supported = False
+# Line ttf2cxf_stream writes after each font it is asked for
+TTF_END = "#TTF2CXF END"
+
+
+###############################################################################
+# ttf2cxf_stream is started once with "-r" and kept running.  Each TTF font  #
+# is asked for on its stdin and the CXF lines it sends back are parsed as    #
+# they arrive.  Older versions of ttf2cxf_stream only answer the TEST        #
+# request, so for those one process is still started for each font.  It is  #
+# not started until the first TTF font is read.                              #
+###############################################################################
+class TTFWorker(object):
+    def __init__(self):
+        self.process = None
+        self.supported = None
+        self.server = False
+
+    def start(self):
+        cmd = ["ttf2cxf_stream", "-r", "TEST", "STDOUT"]
+        try:
+            p = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=DEVNULL,
+                      universal_newlines=True)
+            banner = p.stdout.readline()
+        except:
+            self.supported = False
+            return
+        self.supported = str.find(banner.upper(), 'TTF2CXF') != -1
+        self.server = str.find(banner.upper(), 'SERVER') != -1
+        if self.server:
+            self.process = p
+        else:
+            p.communicate()
+
+    def stop(self):
+        if self.process is not None:
+            try:
+                self.process.kill()
+                self.process.wait()
+            except:
+                pass
+            self.process = None
+
+    def is_supported(self):
+        if self.supported is None:
+            self.start()
+        return self.supported
+
+    def may_be_supported(self):
+        # False only once ttf2cxf_stream has been tried and did not work,
+        # it is not started just to find out
+        return self.supported is not False
+
+    def lines(self, filename, segarc, supports_extended_chars):
+        # The CXF lines for a TTF font, read as ttf2cxf_stream writes them
+        if self.process is not None and self.process.poll() is not None:
+            self.stop()  # it has stopped, start another one
+        if self.supported is None or (self.server and self.process is None):
+            self.start()
+        if self.process is None:
+            return self.command_lines(filename, segarc,
+                                      supports_extended_chars)
+        return self.server_lines(filename, segarc, supports_extended_chars)
+
+    def server_lines(self, filename, segarc, supports_extended_chars):
+        request = "%s %d %s\n" % (segarc, bool(supports_extended_chars),
+                                  os.path.abspath(filename))
+        try:
+            self.process.stdin.write(request)
+            self.process.stdin.flush()
+            while True:
+                line = self.process.stdout.readline()
+                if not line:
+                    raise IOError("ttf2cxf_stream stopped")
+                if line.rstrip() == TTF_END:
+                    break
+                yield line
+        except:
+            # the rest of this font would be read as the start of the next
+            self.stop()
+            raise
+
+    def command_lines(self, filename, segarc, supports_extended_chars):
+        option = ""
+        if supports_extended_chars:
+            option = "-e"
+
+        cmd = ["ttf2cxf_stream",
+               option,
+               "-s",
+               segarc,
+               filename, "STDOUT"]
+        p = Popen(cmd, stdout=PIPE, stderr=DEVNULL, universal_newlines=True)
+        try:
+            for line in p.stdout:
+                yield line
+        finally:
+            p.stdout.close()
+            p.wait()
+
+
+ttf_worker = TTFWorker()
 
 
 def TTF_is_supported():
-    return ttf_is_supported
+    return ttf_worker.is_supported()
 
 
 def available_font_files(font_directory):
-    try:
-        candidates = os.listdir(font_directory)
-        candidates.sort()
-    except FileNotFoundError:
-        candidates = list()
+    # The directory is only listed again when it has changed
+    candidates = fontindex.font_index(font_directory).names()
 
     for name in candidates:
         if str.find(name.upper(), '.CXF') != -1 \
                 or (str.find(name.upper(), '.TTF') != -1
-                    and TTF_is_supported()):
+                    and ttf_worker.may_be_supported()):
             yield name
 
 
+# The "[x]" line that starts each character
+CXF_CHAR = re.compile(r'^\[(.*)\]\s')
+
+
+def find_font_file(font_directory, name):
+    # File name in font_directory of the font called name (the extension may
+    # be left out), or None
+    return fontindex.font_index(font_directory).find(name)
+
+
+def record_font(filename, font, segarc, ext_char):
+    # Add the details of a font that has been read to its directory index
+    directory, name = os.path.split(os.path.abspath(filename))
+    fontindex.font_index(directory).record(name, font, segarc, ext_char)
+
+
+def font_details(filename, segarc, ext_char):
+    # Details kept in the directory index for a font read with these
+    # settings, or None
+    directory, name = os.path.split(os.path.abspath(filename))
+    return fontindex.font_index(directory).details(name, segarc, ext_char)
+
+
 ###############################################################################
 # This routine parses the .cxf font file and builds a font dictionary of      #
 # line segment strokes required to cut each character.                        #
@@ -43,15 +161,21 @@ def available_font_files(font_directory):
 # segments based on the angular length of the arc. Since the idea of          #
 # this font description is to make it support independent x and y scaling,    #
 # we do not use native arcs in the g-code.                                    #
+# Each line is dispatched on its first characters and each Character is       #
+# made once.  The points around an arc only depend on its angles, so they     #
+# are worked out once for each pair of angles and then scaled and moved.      #
 ###############################################################################
 def parse_cxf_font_file(file, segarc):
     segarc = float(segarc)
-    font = {}
+    font = Font()
     key = None
     stroke_list = []
-    xmax, ymax = 0, 0
+    xmax = 0
+    last_xmax = None
+    arcs = {}
     for text_in in file:
         text = text_in+" "
+        last_xmax = xmax
         # format for a typical letter (lower-case r):
         # #comment, with a blank line after it
         #
@@ -60,105 +184,101 @@ def parse_cxf_font_file(file, segarc):
         # L 0,6,2,6
         # A 2,5,1,0,90
         #
-        end_char = len(text)
-        if end_char and key:  # save the character to our dictionary
-            font[key] = Character(key)
-            font[key].stroke_list = stroke_list
-            font[key].xmax = xmax
-
-        new_cmd = re.match('^\[(.*)\]\s', text)
-        if new_cmd:  # new character
-            key_tmp = new_cmd.group(1)
-            if len(new_cmd.group(1)) == 1:
-                key = ord(key_tmp)
-            else:
-                if len(key_tmp) == 5:
-                    key_tmp = key_tmp[1:]
-                if len(key_tmp) == 4:
-                    try:
-                        key = int(key_tmp, 16)
-                    except:
-                        key = None
-                        stroke_list = []
-                        xmax, ymax = 0, 0
-                        continue
-                else:
-                    key = None
-                    stroke_list = []
-                    xmax, ymax = 0, 0
-                    continue
-            stroke_list = []
-            xmax, ymax = 0, 0
-
-        line_cmd = re.match('^L (.*)', text)
-        if line_cmd:
-            coords = line_cmd.group(1)
-            coords = [float(n) for n in coords.split(',')]
-            stroke_list += [Line(coords)]
+        cmd = text[:2]
+        if cmd == "L ":
+            coords = list(map(float, text[2:].split(',')))
+            stroke_list.append(Line(coords))
             xmax = max(xmax, coords[0], coords[2])
 
-        arc_cmd = re.match('^A (.*)', text)
-        if arc_cmd:
-            coords = arc_cmd.group(1)
-            coords = [float(n) for n in coords.split(',')]
+        elif cmd == "A ":
+            coords = list(map(float, text[2:].split(',')))
             xcenter, ycenter, radius, start_angle, end_angle = coords
 
-            # since font defn has arcs as ccw, we need some font foo
-            if end_angle < start_angle:
-                start_angle -= 360.0
+            try:
+                xs, ys = arcs[(start_angle, end_angle)]
+            except KeyError:
+                xs, ys = arc_points(start_angle, end_angle, segarc)
+                arcs[(start_angle, end_angle)] = (xs, ys)
 
             # approximate arc with line seg every "segarc" degrees
-            segs = int((end_angle - start_angle) / segarc)+1
-            angleincr = (end_angle - start_angle)/segs
-            xstart = cos(radians(start_angle)) * radius + xcenter
-            ystart = sin(radians(start_angle)) * radius + ycenter
-            angle = start_angle
-            for i in range(segs):
-                angle += angleincr
-                xend = cos(radians(angle)) * radius + xcenter
-                yend = sin(radians(angle)) * radius + ycenter
-                coords = [xstart, ystart, xend, yend]
-                stroke_list += [Line(coords)]
-                xmax = max(xmax, coords[0], coords[2])
-                ymax = max(ymax, coords[1], coords[3])
-                xstart = xend
-                ystart = yend
+            xs = [x * radius + xcenter for x in xs]
+            ys = [y * radius + ycenter for y in ys]
+            stroke_list.extend([Line([x1, y1, x2, y2]) for x1, y1, x2, y2
+                                in zip(xs, ys, xs[1:], ys[1:])])
+            xmax = max(xmax, max(xs))
+
+        elif text[0] == "[":
+            new_cmd = CXF_CHAR.match(text)
+            if new_cmd:  # new character
+                save_character(font, key, stroke_list, xmax)
+                key_tmp = new_cmd.group(1)
+                if len(new_cmd.group(1)) == 1:
+                    key = ord(key_tmp)
+                else:
+                    if len(key_tmp) == 5:
+                        key_tmp = key_tmp[1:]
+                    if len(key_tmp) == 4:
+                        try:
+                            key = int(key_tmp, 16)
+                        except:
+                            key = None
+                    else:
+                        key = None
+                stroke_list = []
+                xmax = 0
+                last_xmax = None
+    # As the reader always has, the last character keeps the xmax found
+    # before its last line and a header on the last line makes no character
+    if last_xmax is not None:
+        save_character(font, key, stroke_list, last_xmax)
     return font
 
 
+def save_character(font, key, stroke_list, xmax):
+    # The character is made once its strokes are all read, the bounding box
+    # kept by the Character would not see strokes added after it was found
+    if key:
+        char = Character(key, stroke_list)
+        char.xmax = xmax
+        font[key] = char
+
+
+def arc_points(start_angle, end_angle, segarc):
+    # x and y of the points around a unit arc, every "segarc" degrees at most
+    # since font defn has arcs as ccw, we need some font foo
+    if end_angle < start_angle:
+        start_angle -= 360.0
+
+    segs = int((end_angle - start_angle) / segarc)+1
+    angleincr = (end_angle - start_angle)/segs
+    angles = [start_angle]
+    angle = start_angle
+    for i in range(segs):
+        angle += angleincr
+        angles.append(angle)
+    return ([cos(radians(angle)) for angle in angles],
+            [sin(radians(angle)) for angle in angles])
+
+
 def parse_cxf_font(filename, segarc):
     try:
         with open(filename) as f:
             font = parse_cxf_font_file(f, segarc)
     except:
-        font = dict()
+        font = Font()
 
     return font
 
 
 def parse_ttf_font(filename, SegArc, supports_extended_chars):
-    option = ""
-    if supports_extended_chars:
-        option = "-e"
-
-    cmd = ["ttf2cxf_stream",
-           option,
-           "-s",
-           SegArc,
-           filename, "STDOUT"]
     try:
-        p = Popen(cmd, stdout=PIPE, stderr=PIPE)
-        stdout, stderr = p.communicate()
-        if VERSION == 3:
-            file = bytes.decode(stdout).split("\n")
-        else:
-            file = stdout.split("\n")
+        file = ttf_worker.lines(filename, SegArc, supports_extended_chars)
 
-        # build stroke lists from font file
+        # build stroke lists from font file, as the lines come in
         font = parse_cxf_font_file(file, SegArc)
     except:
         raise
-        font = dict()
+        font = Font()
 
     return font
 
@@ -172,6 +292,6 @@ def parse_font_file(filename, segarc, supports_extended_chars):
     elif TYPE == '.TTF' and TTF_is_supported():
         font = parse_ttf_font(filename, segarc, supports_extended_chars)
     else:
-        font = {}
+        font = Font()
 
     return font
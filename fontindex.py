@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# Set FENGRAVE_FONT_INDEX in the environment to keep the font indexes in
+# another folder
+INDEX_DIR = os.environ.get(
+    "FENGRAVE_FONT_INDEX",
+    os.path.join(os.path.expanduser("~"), ".fengrave_fonts"),
+)
+INDEX_VERSION = 2
+FONT_TYPES = (".CXF", ".TTF")
+
+# Indexes already loaded, by directory
+indexes = {}
+
+
+def code_point_ranges(keys):
+    # Sorted [first, last] ranges of the character codes in a font
+    ranges = []
+    for key in sorted(keys):
+        if ranges and key == ranges[-1][1] + 1:
+            ranges[-1][1] = key
+        else:
+            ranges.append([key, key])
+    return ranges
+
+
+def settings_key(segarc, ext_char):
+    # JSON object keys are strings
+    return "%s %d" % (float(segarc), bool(ext_char))
+
+
+def font_index(directory):
+    # The index of a font directory, brought up to date
+    directory = os.path.abspath(directory)
+    try:
+        index = indexes[directory]
+    except KeyError:
+        index = FontIndex(directory)
+        indexes[directory] = index
+    index.refresh()
+    return index
+
+
+###############################################################################
+# Index of the font files in a directory, kept in a JSON file between runs.  #
+# Each font file has its size and modification time and, once the font has  #
+# been read, its number of glyphs, line height and the ranges of character   #
+# codes it holds.  These depend on the arc angle and extended character      #
+# settings it was read with (a TTF font is converted with them), so they are #
+# kept for each pair of settings.  The directory is only listed again when   #
+# its modification time changes (when files are added, removed or renamed),  #
+# and the details of a font are dropped when its own size or modification    #
+# time changes.                                                              #
+###############################################################################
+class FontIndex(object):
+    def __init__(self, directory, index_dir=INDEX_DIR):
+        self.directory = directory
+        key = hashlib.sha1(directory.encode("utf-8")).hexdigest()
+        self.filename = os.path.join(index_dir, key + ".json")
+        self.mtime = None
+        self.fonts = {}
+        self.load()
+
+    def load(self):
+        try:
+            fin = open(self.filename, "r")
+            data = json.load(fin)
+            fin.close()
+        except:
+            return
+        if (
+            data.get("version") == INDEX_VERSION
+            and data.get("directory") == self.directory
+        ):
+            self.mtime = data["mtime"]
+            self.fonts = data["fonts"]
+
+    def save(self):
+        data = {
+            "version": INDEX_VERSION,
+            "directory": self.directory,
+            "mtime": self.mtime,
+            "fonts": self.fonts,
+        }
+        try:
+            folder = os.path.dirname(self.filename)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            # a temporary file of its own, other processes may be saving
+            # the same index
+            fd, temp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+            try:
+                fout = os.fdopen(fd, "w")
+                json.dump(data, fout)
+                fout.close()
+                os.replace(temp, self.filename)
+            except:
+                os.unlink(temp)
+                raise
+        except:
+            pass
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.directory).st_mtime
+        except OSError:
+            self.mtime = None
+            self.fonts = {}
+            return
+        if mtime == self.mtime:
+            return
+
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            names = []
+        fonts = {}
+        for name in names:
+            upper = name.upper()
+            for TYPE in FONT_TYPES:
+                if str.find(upper, TYPE) != -1:
+                    break
+            else:
+                continue
+            entry = self.fonts.get(name)
+            fonts[name] = self.check(name, entry)
+        self.fonts = fonts
+        self.mtime = mtime
+        self.save()
+
+    def check(self, name, entry):
+        # The entry for a font file, reset if the file has changed
+        try:
+            stat = os.stat(os.path.join(self.directory, name))
+            size = stat.st_size
+            mtime = stat.st_mtime
+        except OSError:
+            size = mtime = None
+        if entry is None or entry["size"] != size or entry["mtime"] != mtime:
+            entry = {"size": size, "mtime": mtime}
+        return entry
+
+    def names(self):
+        return sorted(self.fonts)
+
+    def entry(self, name):
+        # Size, modification time and (once known) the font details
+        entry = self.fonts.get(name)
+        if entry is None:
+            return None
+        checked = self.check(name, entry)
+        if checked is not entry:
+            self.fonts[name] = checked
+            self.save()
+        return checked
+
+    def record(self, name, font, segarc, ext_char):
+        # Keep the details of a font that has just been read with the arc
+        # angle segarc and the extended characters setting ext_char
+        entry = self.entry(name)
+        if entry is None or not font:
+            return
+        settings = settings_key(segarc, ext_char)
+        read = entry.setdefault("read", {})
+        if settings in read:
+            return
+        details = {
+            "glyphs": len(font),
+            "ranges": code_point_ranges(font.keys()),
+        }
+        try:
+            details["line_height"] = font.get_ymax() - font.get_ymin()
+        except:
+            details["line_height"] = 0
+        read[settings] = details
+        self.save()
+
+    def details(self, name, segarc, ext_char):
+        # The details recorded for a font read with these settings, or None
+        entry = self.entry(name)
+        if entry is None:
+            return None
+        return entry.get("read", {}).get(settings_key(segarc, ext_char))
+
+    def find(self, name):
+        # File name of the font called name, which may leave out the
+        # extension or differ in case
+        if name in self.fonts:
+            return name
+        upper = name.upper()
+        for candidate in self.names():
+            base, ext = os.path.splitext(candidate)
+            if upper == candidate.upper() or upper == base.upper():
+                return candidate
+        return None
@@ -1,41 +1,130 @@
 from math import degrees, acos, sin, cos, sqrt, atan2, radians, fabs
 from constants import Zero
+import instrument
 
 
-class Character:
-    def __init__(self, key):
+###############################################################################
+# Characters and their strokes use __slots__: a large DXF drawing is read as  #
+# one Line per segment, and without an instance dictionary each one takes a  #
+# fraction of the memory and is quicker to make.                             #
+###############################################################################
+class Character(object):
+    # xmax, ymax, xmin and ymin are set by the font and DXF readers
+    __slots__ = ("key", "_stroke_list", "_bbox",
+                 "xmax", "ymax", "xmin", "ymin")
+
+    def __init__(self, key, stroke_list=None):
         self.key = key
         self.stroke_list = []
+        if stroke_list is not None:
+            self.stroke_list = stroke_list
 
     def __repr__(self):
         return "%%s" % (self.stroke_list)
 
+    # The bounding box is found the first time it is needed and kept until
+    # a new stroke list is set.  Changes made to the list in place are not
+    # seen, so a reader builds the whole list before giving it to the
+    # Character.
+    def _get_stroke_list(self):
+        return self._stroke_list
+
+    def _set_stroke_list(self, stroke_list):
+        self._stroke_list = stroke_list
+        self._bbox = None
+
+    stroke_list = property(_get_stroke_list, _set_stroke_list)
+
+    def bbox(self):
+        # (xmax, ymax, ymin) of the strokes
+        if self._bbox is None:
+            strokes = self._stroke_list
+            if strokes:
+                self._bbox = (max([s.xmax for s in strokes]),
+                              max([s.ymax for s in strokes]),
+                              min([s.ymin for s in strokes]))
+            else:
+                self._bbox = (0, 0, 0)
+        return self._bbox
+
     def get_xmax(self):
-        try:
-            return max([s.xmax for s in self.stroke_list])
-        except ValueError:
-            return 0
+        return self.bbox()[0]
 
     def get_ymax(self):
-        try:
-            return max([s.ymax for s in self.stroke_list])
-        except ValueError:
-            return 0
+        return self.bbox()[1]
 
     def get_ymin(self):
-        try:
-            return min([s.ymin for s in self.stroke_list])
-        except ValueError:
-            return 0
+        return self.bbox()[2]
+
+
+###############################################################################
+# Characters of a font (or image) by key.  The largest height and width and  #
+# the lowest depth over all of the characters are found the first time they  #
+# are needed and kept until the font changes.  Like max() and min() they     #
+# raise ValueError for an empty font.                                         #
+###############################################################################
+class Font(dict):
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._metrics = None
+
+    def __setitem__(self, key, value):
+        self._metrics = None
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._metrics = None
+        dict.__delitem__(self, key)
+
+    def clear(self):
+        self._metrics = None
+        dict.clear(self)
+
+    def update(self, *args, **kwargs):
+        self._metrics = None
+        dict.update(self, *args, **kwargs)
+
+    def pop(self, *args):
+        self._metrics = None
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._metrics = None
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        self._metrics = None
+        return dict.setdefault(self, key, default)
+
+    def metrics(self):
+        # (xmax, ymax, ymin) over all of the characters
+        if self._metrics is None:
+            boxes = [char.bbox() for char in self.values()]
+            self._metrics = (max([box[0] for box in boxes]),
+                             max([box[1] for box in boxes]),
+                             min([box[2] for box in boxes]))
+        return self._metrics
 
+    def get_xmax(self):
+        return self.metrics()[0]
 
-class Line:
-    def __init__(self, coords):
+    def get_ymax(self):
+        return self.metrics()[1]
 
-        self.xstart, self.ystart, self.xend, self.yend = coords
-        self.xmax = max(self.xstart, self.xend)
-        self.ymax = max(self.ystart, self.yend)
-        self.ymin = min(self.ystart, self.yend)
+    def get_ymin(self):
+        return self.metrics()[2]
+
+
+class Line(object):
+    __slots__ = ("xstart", "ystart", "xend", "yend", "xmax", "ymax", "ymin")
+
+    def __init__(self, coords):
+        # the same results as max() and min(), without the calls
+        self.xstart, self.ystart, self.xend, self.yend = \
+            xstart, ystart, xend, yend = coords
+        self.xmax = xend if xend > xstart else xstart
+        self.ymax = yend if yend > ystart else ystart
+        self.ymin = yend if yend < ystart else ystart
 
     def __repr__(self):
         return "Line([%s, %s, %s, %s])" \
@@ -423,114 +512,161 @@ def record_v_carve_data(x1,
 ############################################################################
 # Routine finds the maximum radius that can be placed in the position      #
 # xpt,ypt without interfering with other line segments (rmin is max R LOL) #
+# The candidate segments are those returned by the partition grid query.   #
+# They are checked nearest first and the search stops once the rest are    #
+# too far away to touch a circle of radius rmin.  When counts is given the #
+# number of candidates checked and skipped are added to counts[0] and      #
+# counts[1].  When limit is given the segment in limit[0] (the one that    #
+# limited the circle at the previous point) is checked before the others   #
+# so that only the candidates that can touch that smaller circle need to   #
+# be sorted and checked, and limit[0] is set to the segment limiting this  #
+# circle.                                                                   #
 ############################################################################
 def find_max_circle(
-    xpt, ypt, rmin, char_num, seg_sin, seg_cos, corner, CHK_STRING,
-    MINX, MINY, xPartitionLength, yPartitionLength, partitionList
+    xpt, ypt, rmin, char_num, seg_sin, seg_cos, corner, CHK_STRING, lines,
+    counts=None, limit=None
 ):
-    rtmp = rmin
-    xIndex = int((xpt - MINX) / xPartitionLength)
-    yIndex = int((ypt - MINY) / yPartitionLength)
+    R_A = abs(rmin)
+    hint = None
+    if limit is not None:
+        hint = limit[0]
+        limit[0] = None
+        if hint is not None:
+            rmin = circle_limit(
+                xpt, ypt, rmin, char_num, seg_sin, seg_cos, corner,
+                CHK_STRING, hint
+            )
+            if rmin < R_A:
+                limit[0] = hint
 
+    # A segment further than 2 * rmin (the circle diameter) from the point
+    # cannot touch the circle.  Zero allows for the end point test.
+    bound = 2 * (rmin + Zero)
     coords_check = []
-    R_A = abs(rmin)
     Bcnt = -1
     ############################################################
     # Loop over active partitions for the current line segment #
     ############################################################
-    for line_B in partitionList[xIndex][yIndex]:
+    for line_B in lines:
         Bcnt = Bcnt + 1
-        X_B = line_B[len(line_B) - 3]
-        Y_B = line_B[len(line_B) - 2]
-        R_B = line_B[len(line_B) - 1]
-        GAP = sqrt((X_B - xpt) * (X_B - xpt) + (Y_B - ypt) * (Y_B - ypt))
-        if GAP < abs(R_A + R_B):
-            coords_check.append(line_B)
-
-    for linec in coords_check:
-        XYc = linec
-        xmaxt = max(XYc[0], XYc[2]) + rmin * 2
-        xmint = min(XYc[0], XYc[2]) - rmin * 2
-        ymaxt = max(XYc[1], XYc[3]) + rmin * 2
-        ymint = min(XYc[1], XYc[3]) - rmin * 2
-        if xpt >= xmint and ypt >= ymint and xpt <= xmaxt and ypt <= ymaxt:
-            logic_full = True
-        else:
-            logic_full = False
+        X_B, Y_B, R_B = line_B[-3:]
+        # R_B is half the segment length plus the starting rmin so
+        # GAP - R_B + R_A is the least distance to the segment
+        GAP2 = (X_B - xpt) * (X_B - xpt) + (Y_B - ypt) * (Y_B - ypt)
+        REACH = bound + R_B - R_A
+        if GAP2 > REACH * REACH:
             continue
+        GAP = sqrt(GAP2)
+        if GAP < abs(R_A + R_B) and line_B is not hint:
+            coords_check.append((GAP - R_B + R_A, Bcnt, line_B))
+    coords_check.sort()
+
+    checked = 0
+    for LOW, Bcnt, XYc in coords_check:
+        if LOW > 2 * (rmin + Zero):
+            break
+        checked = checked + 1
+        rtmp = circle_limit(
+            xpt, ypt, rmin, char_num, seg_sin, seg_cos, corner, CHK_STRING,
+            XYc
+        )
+        if rtmp < rmin:
+            rmin = rtmp
+            if limit is not None:
+                limit[0] = XYc
+
+    if counts is not None:
+        counts[0] = counts[0] + checked
+        counts[1] = counts[1] + len(lines) - checked
+    return rmin
 
-        if CHK_STRING == "chr":
-            logic_full = logic_full and (char_num == int(XYc[5]))
-
-        if corner == 1:
-            logic_full = (
-                logic_full
-                and ((fabs(xpt - XYc[0]) > Zero)
-                     or (fabs(ypt - XYc[1]) > Zero))
-                and ((fabs(xpt - XYc[2]) > Zero)
-                     or (fabs(ypt - XYc[3]) > Zero))
-            )
-
-        if logic_full:
-            xc1 = (XYc[0] - xpt) * seg_cos - (XYc[1] - ypt) * seg_sin
-            yc1 = (XYc[0] - xpt) * seg_sin + (XYc[1] - ypt) * seg_cos
-            xc2 = (XYc[2] - xpt) * seg_cos - (XYc[3] - ypt) * seg_sin
-            yc2 = (XYc[2] - xpt) * seg_sin + (XYc[3] - ypt) * seg_cos
-
-            if fabs(xc2 - xc1) < Zero and fabs(yc2 - yc1) > Zero:
-                rtmp = fabs(xc1)
-                if max(yc1, yc2) >= rtmp and min(yc1, yc2) <= rtmp:
-                    rmin = min(rmin, rtmp)
-
-            elif fabs(yc2 - yc1) < Zero and fabs(xc2 - xc1) > Zero:
-                if max(xc1, xc2) >= 0.0 and min(xc1, xc2) <= 0.0 \
-                        and yc1 > Zero:
-                    rtmp = yc1 / 2.0
-                    rmin = min(rmin, rtmp)
-
-            if fabs(yc2 - yc1) > Zero and fabs(xc2 - xc1) > Zero:
-                m = (yc2 - yc1) / (xc2 - xc1)
-                b = yc1 - m * xc1
-                sq = m + 1 / m
-                A = 1 + m * m - 2 * m * sq
-                B = -2 * b * sq
-                C = -b * b
-                try:
-                    sq_root = sqrt(B * B - 4 * A * C)
-                    xq1 = (-B + sq_root) / (2 * A)
-
-                    if xq1 >= min(xc1, xc2) and xq1 <= max(xc1, xc2):
-                        rtmp = xq1 * sq + b
-                        if rtmp >= 0.0:
-                            rmin = min(rmin, rtmp)
-
-                    xq2 = (-B - sq_root) / (2 * A)
-
-                    if xq2 >= min(xc1, xc2) and xq2 <= max(xc1, xc2):
-                        rtmp = xq2 * sq + b
-                        if rtmp >= 0.0:
-                            rmin = min(rmin, rtmp)
-                except:  # Divide by zero?
-                    pass
 
-            if yc1 > Zero:
-                rtmp = (xc1 * xc1 + yc1 * yc1) / (2 * yc1)
+# Largest circle radius (up to rmin) at xpt,ypt not crossing segment XYc
+def circle_limit(
+    xpt, ypt, rmin, char_num, seg_sin, seg_cos, corner, CHK_STRING, XYc
+):
+    xmaxt = max(XYc[0], XYc[2]) + rmin * 2
+    xmint = min(XYc[0], XYc[2]) - rmin * 2
+    ymaxt = max(XYc[1], XYc[3]) + rmin * 2
+    ymint = min(XYc[1], XYc[3]) - rmin * 2
+    if xpt >= xmint and ypt >= ymint and xpt <= xmaxt and ypt <= ymaxt:
+        logic_full = True
+    else:
+        return rmin
+
+    if CHK_STRING == "chr":
+        logic_full = logic_full and (char_num == int(XYc[5]))
+
+    if corner == 1:
+        logic_full = (
+            logic_full
+            and ((fabs(xpt - XYc[0]) > Zero)
+                 or (fabs(ypt - XYc[1]) > Zero))
+            and ((fabs(xpt - XYc[2]) > Zero)
+                 or (fabs(ypt - XYc[3]) > Zero))
+        )
+
+    if logic_full:
+        xc1 = (XYc[0] - xpt) * seg_cos - (XYc[1] - ypt) * seg_sin
+        yc1 = (XYc[0] - xpt) * seg_sin + (XYc[1] - ypt) * seg_cos
+        xc2 = (XYc[2] - xpt) * seg_cos - (XYc[3] - ypt) * seg_sin
+        yc2 = (XYc[2] - xpt) * seg_sin + (XYc[3] - ypt) * seg_cos
+
+        if fabs(xc2 - xc1) < Zero and fabs(yc2 - yc1) > Zero:
+            rtmp = fabs(xc1)
+            if max(yc1, yc2) >= rtmp and min(yc1, yc2) <= rtmp:
                 rmin = min(rmin, rtmp)
 
-            if yc2 > Zero:
-                rtmp = (xc2 * xc2 + yc2 * yc2) / (2 * yc2)
+        elif fabs(yc2 - yc1) < Zero and fabs(xc2 - xc1) > Zero:
+            if max(xc1, xc2) >= 0.0 and min(xc1, xc2) <= 0.0 \
+                    and yc1 > Zero:
+                rtmp = yc1 / 2.0
                 rmin = min(rmin, rtmp)
 
-            if abs(yc1) < Zero and abs(xc1) < Zero:
-                if yc2 > Zero:
-                    rmin = 0.0
-            if abs(yc2) < Zero and abs(xc2) < Zero:
-                if yc1 > Zero:
-                    rmin = 0.0
+        if fabs(yc2 - yc1) > Zero and fabs(xc2 - xc1) > Zero:
+            m = (yc2 - yc1) / (xc2 - xc1)
+            b = yc1 - m * xc1
+            sq = m + 1 / m
+            A = 1 + m * m - 2 * m * sq
+            B = -2 * b * sq
+            C = -b * b
+            try:
+                sq_root = sqrt(B * B - 4 * A * C)
+                xq1 = (-B + sq_root) / (2 * A)
+
+                if xq1 >= min(xc1, xc2) and xq1 <= max(xc1, xc2):
+                    rtmp = xq1 * sq + b
+                    if rtmp >= 0.0:
+                        rmin = min(rmin, rtmp)
+
+                xq2 = (-B - sq_root) / (2 * A)
+
+                if xq2 >= min(xc1, xc2) and xq2 <= max(xc1, xc2):
+                    rtmp = xq2 * sq + b
+                    if rtmp >= 0.0:
+                        rmin = min(rmin, rtmp)
+            except:  # Divide by zero?
+                pass
+
+        if yc1 > Zero:
+            rtmp = (xc1 * xc1 + yc1 * yc1) / (2 * yc1)
+            rmin = min(rmin, rtmp)
+
+        if yc2 > Zero:
+            rtmp = (xc2 * xc2 + yc2 * yc2) / (2 * yc2)
+            rmin = min(rmin, rtmp)
+
+        if abs(yc1) < Zero and abs(xc1) < Zero:
+            if yc2 > Zero:
+                rmin = 0.0
+        if abs(yc2) < Zero and abs(xc2) < Zero:
+            if yc1 > Zero:
+                rmin = 0.0
 
     return rmin
 
 
+@instrument.timed("sort_for_v_carve")
 def sort_for_v_carve(sort_coords, Acc, status_callback, LN_START=0):
     # Create ECOORDS
     ecoords = []
@@ -0,0 +1,142 @@
+from functools import wraps
+import atexit
+import json
+import os
+import sys
+from time import time
+
+# Set FENGRAVE_INSTRUMENT in the environment to "json" or "log" (or use the
+# --instrument command line option or the "instrument" setting) to time the
+# stages of a calculation and count the work done in them.  A report is
+# written to stderr after each batch job and when the program ends.
+MODES = ("json", "log")
+
+mode = None
+enabled = False
+# name: [calls, seconds]
+timers = {}
+# name: count
+counters = {}
+
+
+def enable(value):
+    # Report as "json" or "log" lines, anything else turns it off
+    global mode, enabled
+    value = str(value).strip().lower()
+    if value in MODES:
+        mode = value
+        enabled = True
+    else:
+        mode = None
+        enabled = False
+
+
+def timed(name):
+    # Decorator adding the calls to a function and the time spent in it to
+    # the timer called name.  When disabled the function is called directly.
+    def decorate(func):
+        @wraps(func)
+        def timed_func(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            stamp = time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                add_time(name, time() - stamp)
+
+        return timed_func
+
+    return decorate
+
+
+def add_time(name, seconds):
+    try:
+        timer = timers[name]
+    except KeyError:
+        timer = timers[name] = [0, 0.0]
+    timer[0] += 1
+    timer[1] += seconds
+
+
+def count(name, n=1):
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+
+def counted(items, name_in, count_in, name_out):
+    # Pass items on, adding count_in to counter name_in and the number of
+    # items to counter name_out
+    count(name_in, count_in)
+    n = 0
+    try:
+        for item in items:
+            n += 1
+            yield item
+    finally:
+        count(name_out, n)
+
+
+def report(label=None, fout=None):
+    # Write the timers and counters and start again from zero
+    if not enabled or (not timers and not counters):
+        return
+    if fout is None:
+        fout = sys.stderr
+    if mode == "json":
+        data = {
+            "pid": os.getpid(),
+            "timers": dict(
+                (name, {"calls": calls, "seconds": round(seconds, 6)})
+                for name, (calls, seconds) in timers.items()
+            ),
+            "counters": counters,
+        }
+        if label is not None:
+            data["label"] = label
+        fout.write(json.dumps(data, sort_keys=True) + "\n")
+    else:
+        prefix = "instrument"
+        if label is not None:
+            prefix = "instrument %s" % (label)
+        for name in sorted(timers):
+            calls, seconds = timers[name]
+            fout.write(
+                "(%s: %s %d calls %.4f s)\n" % (prefix, name, calls, seconds)
+            )
+        for name in sorted(counters):
+            fout.write("(%s: %s %d)\n" % (prefix, name, counters[name]))
+    reset()
+
+
+def reset():
+    timers.clear()
+    counters.clear()
+
+
+def collect():
+    # The timers and counters so far, for a worker process to send back with
+    # its results, and start again from zero
+    data = (dict(timers), dict(counters))
+    reset()
+    return data
+
+
+def merge(data):
+    # Add the timers and counters collected in a worker process
+    worker_timers, worker_counters = data
+    if not enabled:
+        return
+    for name, (calls, seconds) in worker_timers.items():
+        try:
+            timer = timers[name]
+        except KeyError:
+            timer = timers[name] = [0, 0.0]
+        timer[0] += calls
+        timer[1] += seconds
+    for name, n in worker_counters.items():
+        count(name, n)
+
+
+enable(os.environ.get("FENGRAVE_INSTRUMENT", ""))
+atexit.register(report)
@@ -0,0 +1,221 @@
+from constants import Zero
+from math import ceil, floor, sqrt
+import instrument
+import os
+import sys
+
+# Set FENGRAVE_GRID_STATS in the environment to write the partition grid
+# statistics, including the number of candidate segments checked by
+# find_max_circle, to stderr after each V-carve calculation.
+GRID_STATS = "FENGRAVE_GRID_STATS" in os.environ
+
+# Most cells per reach distance (the cells are never smaller than
+# reach / MAX_SPLIT)
+MAX_SPLIT = 4
+# Average number of segments per cell the cell size is tuned for
+CELL_TARGET = 8
+# Limits on the size of the grid
+MAX_CELLS = 1000000
+MAX_ENTRIES = 4000000
+
+
+###############################################################################
+# Spatial index of line segments for the V-carve calculations.               #
+# The segments are stored in every cell of a square grid that lies within    #
+# "reach" of them, so a look up of the single cell holding a point returns   #
+# every segment within reach of that point.  The cells a segment crosses are #
+# found with a DDA walk along the segment and then grown by the number of    #
+# cells needed to cover the reach.  Each cell holds a tuple of segments.     #
+# Segments are held as (x1, y1, x2, y2, line_cnt, char_cnt, X, Y, R) where   #
+# (X, Y) is the segment midpoint and R is half its length plus "radius".     #
+###############################################################################
+class SegmentGrid(object):
+    def __init__(self, coords, MINX, MINY, MAXX, MAXY, reach, radius):
+        self.MINX = MINX
+        self.MINY = MINY
+        self.reach = reach
+
+        lines = []
+        total_length = 0.0
+        for XY in coords:
+            x1, y1, x2, y2 = XY[0], XY[1], XY[2], XY[3]
+            LENGTH = sqrt((x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1))
+            total_length = total_length + LENGTH
+            lines.append(
+                tuple(XY)
+                + ((x1 + x2) / 2, (y1 + y2) / 2, LENGTH / 2 + radius)
+            )
+        self.lines = lines
+
+        xLength = max(MAXX - MINX, Zero)
+        yLength = max(MAXY - MINY, Zero)
+        self.cell = cell = self.tune(
+            len(lines), total_length, xLength, yLength
+        )
+        self.split = split = int(ceil(reach / cell - Zero))
+        self.xN = xN = int(xLength / cell) + 1
+        self.yN = yN = int(yLength / cell) + 1
+
+        cells = [[] for i in range(xN * yN)]
+        for line in lines:
+            index = set()
+            for i, j in self.crossed(line[0], line[1], line[2], line[3]):
+                for ii in range(max(i - split, 0), min(i + split + 1, xN)):
+                    for jj in range(
+                        max(j - split, 0), min(j + split + 1, yN)
+                    ):
+                        index.add(ii + jj * xN)
+            for k in index:
+                cells[k].append(line)
+        empty = ()
+        self.cells = [tuple(c) if c else empty for c in cells]
+
+        self.queries = 0
+        self.candidates = 0
+        # candidates checked and skipped by find_max_circle (only counted
+        # when GRID_STATS is set or instrument is enabled)
+        self.counts = [0, 0]
+
+    def tune(self, count, total_length, xLength, yLength):
+        # Pick the largest cell (reach / split) that brings the average
+        # number of segments per cell down to CELL_TARGET, keeping the
+        # grid within MAX_CELLS and MAX_ENTRIES.
+        area = xLength * yLength
+        smallest = sqrt(area / MAX_CELLS)
+        reach = max(self.reach, Zero)
+        cell = reach
+        for split in range(1, MAX_SPLIT + 1):
+            size = reach / split
+            if size < smallest:
+                break
+            entries = (count + 1.5 * total_length / size) * (
+                2 * split + 1
+            ) ** 2
+            if entries > MAX_ENTRIES:
+                break
+            cell = size
+            cells = (xLength / size + 1) * (yLength / size + 1)
+            if entries / cells <= CELL_TARGET:
+                break
+        return max(cell, smallest, Zero)
+
+    def crossed(self, x1, y1, x2, y2):
+        # Grid cells crossed by the segment (x1, y1)-(x2, y2), by walking
+        # from cell to cell along the segment
+        cell = self.cell
+        gx1 = (x1 - self.MINX) / cell
+        gy1 = (y1 - self.MINY) / cell
+        gx2 = (x2 - self.MINX) / cell
+        gy2 = (y2 - self.MINY) / cell
+        i = int(floor(gx1))
+        j = int(floor(gy1))
+        i_end = int(floor(gx2))
+        j_end = int(floor(gy2))
+        out = [(i, j)]
+
+        dx = gx2 - gx1
+        dy = gy2 - gy1
+        if dx > 0.0:
+            di = 1
+            tx = (i + 1 - gx1) / dx
+            tdx = 1.0 / dx
+        elif dx < 0.0:
+            di = -1
+            tx = (i - gx1) / dx
+            tdx = -1.0 / dx
+        else:
+            di = 0
+            tx = tdx = float("inf")
+        if dy > 0.0:
+            dj = 1
+            ty = (j + 1 - gy1) / dy
+            tdy = 1.0 / dy
+        elif dy < 0.0:
+            dj = -1
+            ty = (j - gy1) / dy
+            tdy = -1.0 / dy
+        else:
+            dj = 0
+            ty = tdy = float("inf")
+
+        for step in range(abs(i_end - i) + abs(j_end - j)):
+            if tx < ty:
+                i = i + di
+                tx = tx + tdx
+            else:
+                j = j + dj
+                ty = ty + tdy
+            out.append((i, j))
+        if out[-1] != (i_end, j_end):
+            out.append((i_end, j_end))
+        return out
+
+    def query(self, xpt, ypt):
+        # Segments within reach of (xpt, ypt)
+        i = min(max(int((xpt - self.MINX) / self.cell), 0), self.xN - 1)
+        j = min(max(int((ypt - self.MINY) / self.cell), 0), self.yN - 1)
+        lines = self.cells[i + j * self.xN]
+        self.queries = self.queries + 1
+        self.candidates = self.candidates + len(lines)
+        return lines
+
+    ##########################################
+    #        Statistics                      #
+    ##########################################
+    def histogram(self):
+        # Number of cells holding 0, 1, 2-3, 4-7, 8-15, ... segments
+        counts = []
+        for lines in self.cells:
+            n = len(lines)
+            bucket = 0
+            while n > 0:
+                bucket = bucket + 1
+                n = n >> 1
+            while len(counts) <= bucket:
+                counts.append(0)
+            counts[bucket] = counts[bucket] + 1
+        return counts
+
+    def stats_lines(self):
+        lines = [
+            "(Partition grid: %d x %d cells of %.4f, %d segments, "
+            "%d cells per reach)"
+            % (self.xN, self.yN, self.cell, len(self.lines), self.split)
+        ]
+        for bucket, count in enumerate(self.histogram()):
+            if count == 0:
+                continue
+            if bucket == 0:
+                label = "0"
+            elif bucket == 1:
+                label = "1"
+            else:
+                label = "%d-%d" % (1 << (bucket - 1), (1 << bucket) - 1)
+            lines.append("(  %9s segments: %d cells)" % (label, count))
+        if self.queries > 0:
+            lines.append(
+                "(%d queries, %.1f candidates per query)"
+                % (self.queries, float(self.candidates) / self.queries)
+            )
+        if sum(self.counts) > 0:
+            lines.append(
+                "(%.1f candidates checked per query, %.1f%% skipped)"
+                % (
+                    float(self.counts[0]) / self.queries,
+                    100.0 * self.counts[1] / sum(self.counts),
+                )
+            )
+        return lines
+
+    def add_counts(self):
+        # Add the queries (one per find_max_circle call) to the counters
+        instrument.count("find_max_circle", self.queries)
+        instrument.count("candidates", self.candidates)
+        instrument.count("candidates_checked", self.counts[0])
+        instrument.count("candidates_skipped", self.counts[1])
+
+    def report(self, name):
+        if GRID_STATS:
+            sys.stderr.write("(%s)\n" % (name))
+            for line in self.stats_lines():
+                sys.stderr.write(line + "\n")
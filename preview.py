@@ -0,0 +1,330 @@
+from math import floor
+
+LINE = 0
+OVAL = 1
+RECTANGLE = 2
+
+# Longest polyline (in points) built from connected line segments.  Keeping
+# polylines short keeps each one local to a few tiles.
+MAX_POLY_POINTS = 32
+# Number of tiles along the longest side of the preview extents
+TILES_PER_SIDE = 32
+# Number of zoom levels kept in the scaled coordinate cache
+ZOOM_CACHE_LEVELS = 4
+# Redraw from scratch once this many more items are on the canvas than are
+# needed for the current view
+PRUNE_FACTOR = 4
+
+# Live plotting during V-carve calculations:
+# circles sent from the calculation to the display at a time
+PPLOT_BATCH = 256
+# milliseconds between display refreshes
+PPLOT_REFRESH = 100
+# seconds spent drawing circles per refresh
+PPLOT_FRAME_TIME = 0.004
+# most circles carried over to the next refresh
+PPLOT_BACKLOG = 500
+# circles closer than this (in pixels) to the last one drawn are skipped
+# when only the envelope is plotted
+PPLOT_ENV_PIXELS = 2.0
+
+
+###############################################################################
+# Thin out a run of (x, y, r) circles, keeping only those that differ from    #
+# the last circle kept by more than tol in position or radius.                #
+###############################################################################
+def decimate(circles, tol):
+    out = []
+    xl = yl = rl = None
+    for circle in circles:
+        x, y, r = circle
+        if (
+            xl is None
+            or abs(x - xl) > tol
+            or abs(y - yl) > tol
+            or abs(r - rl) > tol
+        ):
+            out.append(circle)
+            xl, yl, rl = circle
+    return out
+
+
+###############################################################################
+# Preview layer for the canvas.                                               #
+# Geometry is held in world coordinates in a tile index.  Only the tiles      #
+# that intersect the current view are drawn, so zooming and panning large     #
+# designs does not require every canvas item to be touched or recreated.      #
+###############################################################################
+class PreviewLayer(object):
+    def __init__(self, canvas, tag="preview"):
+        self.canvas = canvas
+        self.tag = tag
+        self.reset(1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0)
+
+    def reset(self, scale, xoff, yoff, minx, miny, maxx, maxy):
+        # world to canvas transform: (x * scale + xoff, -y * scale + yoff)
+        self.scale = float(scale)
+        self.base_scale = float(scale)
+        self.xoff = float(xoff)
+        self.yoff = float(yoff)
+
+        extent = max(maxx - minx, maxy - miny)
+        if extent <= 0.0:
+            extent = 1.0 / self.scale
+        self.tile = extent / TILES_PER_SIDE
+
+        self.kind = []
+        self.coords = []
+        self.bbox = []
+        self.width = []
+        self.options = []
+        self.tiles = {}
+        self.tile_bounds = [0, 0, -1, -1]
+        self.poly = None
+
+        self.widths = {}
+        self.cache = {}
+        self.cache_order = []
+        self.delete_all()
+
+    def delete_all(self):
+        try:
+            self.canvas.delete(self.tag)
+        except:
+            pass
+        self.drawn = {}
+        self.drawn_tiles = set()
+        self.drawn_scale = self.scale
+
+    ##########################################
+    #        Adding geometry                 #
+    ##########################################
+    def line(self, x1, y1, x2, y2, width=0, **options):
+        poly = self.poly
+        if (
+            poly is not None
+            and poly[1] == width
+            and poly[2] == options
+            and len(poly[0]) < 2 * MAX_POLY_POINTS
+            and poly[0][-2] == x1
+            and poly[0][-1] == y1
+        ):
+            poly[0].append(x2)
+            poly[0].append(y2)
+            return
+        self.flush()
+        self.poly = [[x1, y1, x2, y2], width, options]
+
+    def oval(self, x1, y1, x2, y2, width=0, **options):
+        self.flush()
+        return self.add(OVAL, [x1, y1, x2, y2], width, options)
+
+    def rectangle(self, x1, y1, x2, y2, width=0, **options):
+        self.flush()
+        return self.add(RECTANGLE, [x1, y1, x2, y2], width, options)
+
+    def flush(self):
+        if self.poly is not None:
+            poly, self.poly = self.poly, None
+            self.add(LINE, poly[0], poly[1], poly[2])
+
+    def add(self, kind, coords, width, options):
+        xs = coords[0::2]
+        ys = coords[1::2]
+        pad = 0.5 * width / self.base_scale
+        bbox = (min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+
+        item = len(self.kind)
+        self.kind.append(kind)
+        self.coords.append(coords)
+        self.bbox.append(bbox)
+        self.width.append(width)
+        self.options.append(options)
+
+        i0, j0, i1, j1 = self.tile_range(bbox)
+        bounds = self.tile_bounds
+        if bounds[2] < bounds[0]:
+            bounds[:] = [i0, j0, i1, j1]
+        else:
+            bounds[:] = [
+                min(bounds[0], i0),
+                min(bounds[1], j0),
+                max(bounds[2], i1),
+                max(bounds[3], j1),
+            ]
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                try:
+                    self.tiles[(i, j)].append(item)
+                except KeyError:
+                    self.tiles[(i, j)] = [item]
+        return item
+
+    def tile_range(self, bbox):
+        tile = self.tile
+        return (
+            int(floor(bbox[0] / tile)),
+            int(floor(bbox[1] / tile)),
+            int(floor(bbox[2] / tile)),
+            int(floor(bbox[3] / tile)),
+        )
+
+    ##########################################
+    #        View                            #
+    ##########################################
+    def view_tiles(self):
+        w = int(self.canvas.cget("width"))
+        h = int(self.canvas.cget("height"))
+        tile = self.tile * self.scale
+        # one extra tile all around so that short pans do not need a redraw
+        i0 = int(floor(-self.xoff / tile)) - 1
+        i1 = int(floor((w - self.xoff) / tile)) + 1
+        j0 = int(floor((self.yoff - h) / tile)) - 1
+        j1 = int(floor(self.yoff / tile)) + 1
+        # nothing lies outside of the occupied tiles
+        bounds = self.tile_bounds
+        return (
+            max(i0, bounds[0]),
+            max(j0, bounds[1]),
+            min(i1, bounds[2]),
+            min(j1, bounds[3]),
+        )
+
+    def tiles_needed(self):
+        i0, j0, i1, j1 = self.view_tiles()
+        return max(i1 - i0 + 1, 1) * max(j1 - j0 + 1, 1)
+
+    def zoom(self, x0, y0, z_factor):
+        self.flush()
+        self.rescale(x0, y0, z_factor)
+        self.draw()
+
+    def pan(self, dx, dy):
+        self.flush()
+        self.move(dx, dy)
+        self.draw()
+
+    def fit(self, scale, xoff, yoff):
+        # Change to a new transform (the view that fits a resized canvas)
+        # keeping the geometry and the items already drawn
+        self.flush()
+        if scale != self.scale:
+            self.rescale(0.0, 0.0, scale / self.scale)
+        self.move(xoff - self.xoff, yoff - self.yoff)
+        self.draw()
+
+    def rescale(self, x0, y0, z_factor):
+        self.scale = self.scale * z_factor
+        self.xoff = x0 + (self.xoff - x0) * z_factor
+        self.yoff = y0 + (self.yoff - y0) * z_factor
+
+        if len(self.drawn_tiles) > PRUNE_FACTOR * self.tiles_needed():
+            self.delete_all()
+        elif self.drawn:
+            # Few distinct widths are in use so the existing items can be
+            # rescaled with a handful of canvas calls.
+            self.canvas.scale(self.tag, x0, y0, z_factor, z_factor)
+            zoom = self.scale / self.base_scale
+            for width, tag in self.widths.items():
+                if width != 0:
+                    self.canvas.itemconfig(tag, width=width * zoom)
+            self.drawn_scale = self.scale
+
+    def move(self, dx, dy):
+        self.xoff = self.xoff + dx
+        self.yoff = self.yoff + dy
+
+        if len(self.drawn_tiles) > PRUNE_FACTOR * self.tiles_needed():
+            self.delete_all()
+        else:
+            self.canvas.move(self.tag, dx, dy)
+
+    def draw(self):
+        self.flush()
+        if self.drawn_scale != self.scale:
+            self.delete_all()
+
+        i0, j0, i1, j1 = self.view_tiles()
+        items = set()
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                key = (i, j)
+                if key in self.drawn_tiles:
+                    continue
+                self.drawn_tiles.add(key)
+                try:
+                    items.update(self.tiles[key])
+                except KeyError:
+                    pass
+        items.difference_update(self.drawn)
+        if items:
+            # Sorting by item number keeps the original stacking order
+            self.create(sorted(items))
+        return len(items)
+
+    def show(self, item):
+        # Draw a single newly added item if it lands in the drawn area
+        if self.drawn_scale != self.scale or item in self.drawn:
+            return
+        i0, j0, i1, j1 = self.tile_range(self.bbox[item])
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                if (i, j) in self.drawn_tiles:
+                    self.create([item])
+                    return
+
+    ##########################################
+    #        Canvas items                    #
+    ##########################################
+    def scaled(self, item):
+        # Canvas coordinates relative to the view offset, cached per zoom level
+        key = self.scale
+        try:
+            level = self.cache[key]
+        except KeyError:
+            level = self.cache[key] = {}
+            self.cache_order.append(key)
+            if len(self.cache_order) > ZOOM_CACHE_LEVELS:
+                del self.cache[self.cache_order.pop(0)]
+        try:
+            return level[item]
+        except KeyError:
+            s = self.scale
+            coords = self.coords[item]
+            out = [0.0] * len(coords)
+            out[0::2] = [x * s for x in coords[0::2]]
+            out[1::2] = [-y * s for y in coords[1::2]]
+            level[item] = out
+            return out
+
+    def width_tag(self, width):
+        try:
+            return self.widths[width]
+        except KeyError:
+            tag = self.widths[width] = "%s_w%d" % (self.tag, len(self.widths))
+            return tag
+
+    def create(self, items):
+        canvas = self.canvas
+        new_tag = self.tag + "_new"
+        zoom = self.scale / self.base_scale
+        for item in items:
+            width = self.width[item]
+            tags = (self.tag, new_tag, self.width_tag(width))
+            kind = self.kind[item]
+            coords = self.scaled(item)
+            if kind == LINE:
+                cid = canvas.create_line(
+                    coords, width=width * zoom, tags=tags, **self.options[item]
+                )
+            elif kind == OVAL:
+                cid = canvas.create_oval(
+                    coords, width=width * zoom, tags=tags, **self.options[item]
+                )
+            else:
+                cid = canvas.create_rectangle(
+                    coords, width=width * zoom, tags=tags, **self.options[item]
+                )
+            self.drawn[item] = cid
+        canvas.move(new_tag, self.xoff, self.yoff)
+        canvas.dtag(new_tag, new_tag)
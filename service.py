@@ -0,0 +1,158 @@
+import json
+import os
+import socket
+import stat
+import sys
+import threading
+from time import time
+
+import batch
+
+# Request fields that are not settings overrides
+REQUEST_FIELDS = batch.JOB_FIELDS + ("id", "format")
+
+
+###############################################################################
+# Engraving service.                                                          #
+# Requests and replies are JSON objects, one per line, read from stdin and    #
+# written to stdout (address "-") or exchanged over a Unix socket.  A request #
+# looks like a batch manifest row:                                            #
+#   {"id": 7, "text": "Hello", "settings": "template.ngc",                    #
+#    "font": "fonts/normal.cxf", "format": "svg", "YSCALE": 0.5}              #
+# The reply carries the same id and either the output text in "code" or,     #
+# when the request gives an "output" file, the name of the file written.      #
+# Replies are sent as the jobs finish so they may come back out of order.     #
+# The worker processes keep fonts and settings templates between requests.    #
+# A "ready" reply with no id is sent once the service takes requests.         #
+###############################################################################
+def serve(address, app, factory, argv, processes=None):
+    stdio = address == "-"
+    if stdio:
+        # Replies go to the real stdout.  Everything else written to stdout,
+        # including by the worker processes, goes to stderr.
+        sys.stdout.flush()
+        fout = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    elif not clear_socket(address):
+        sys.stderr.write(
+            "(Not a socket, not replacing it: %s)\n" % (address)
+        )
+        sys.exit(1)
+    pool = batch.start_pool(app, factory, argv, processes)
+    try:
+        if stdio:
+            serve_stream(sys.stdin, fout, pool)
+        else:
+            serve_socket(address, pool)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
+        pool.join()
+
+
+def clear_socket(address):
+    # Remove a socket left by an earlier service.  Anything else at the
+    # address is left alone and False is returned.
+    try:
+        mode = os.lstat(address).st_mode
+    except OSError:
+        return True
+    if not stat.S_ISSOCK(mode):
+        return False
+    os.remove(address)
+    return True
+
+
+def serve_socket(address, pool):
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(address)
+        server.listen(5)
+        sys.stdout.write("(F-Engrave service listening on %s)\n" % (address))
+        sys.stdout.flush()
+        while True:
+            conn, client = server.accept()
+            thread = threading.Thread(
+                target=serve_connection, args=(conn, pool)
+            )
+            thread.daemon = True
+            thread.start()
+    finally:
+        server.close()
+        os.remove(address)
+
+
+def serve_connection(conn, pool):
+    fin = conn.makefile("r")
+    fout = conn.makefile("w")
+    try:
+        serve_stream(fin, fout, pool)
+    except (IOError, OSError):
+        pass
+    finally:
+        fin.close()
+        fout.close()
+        conn.close()
+
+
+def serve_stream(fin, fout, pool):
+    lock = threading.Lock()
+
+    def reply(response):
+        with lock:
+            fout.write(json.dumps(response) + "\n")
+            fout.flush()
+
+    reply({"id": None, "status": "ready"})
+    pending = []
+    count = 0
+    for line in iter(fin.readline, ""):
+        if line.strip() == "":
+            continue
+        try:
+            request = json.loads(line)
+            job = batch.make_job(request, count, os.getcwd(), REQUEST_FIELDS)
+            job["id"] = request.get("id")
+        except Exception as e:
+            reply({"id": None, "status": "error: %s" % (e)})
+            continue
+        count = count + 1
+        pending = [result for result in pending if not result.ready()]
+        pending.append(
+            pool.apply_async(
+                run_request,
+                (job,),
+                callback=reply,
+                error_callback=failed_request(job, reply),
+            )
+        )
+    # finish the jobs of this stream before it is closed
+    for result in pending:
+        result.wait()
+
+
+def failed_request(job, reply):
+    def error(e):
+        reply({"id": job.get("id"), "status": "error: %s" % (e)})
+
+    return error
+
+
+def run_request(job):
+    app = batch.worker_app
+    result = {"id": job.get("id"), "pid": os.getpid()}
+    stamp = time()
+    try:
+        if "output" in job:
+            app.Batch_Job(job, result)
+            result["output"] = job["output"]
+        else:
+            result["code"] = "".join(
+                line + "\n" for line in app.Batch_Code(job, result)
+            )
+        result["status"] = "ok"
+    except Exception as e:
+        result["status"] = "error: %s" % (e)
+    result["seconds"] = time() - stamp
+    return result
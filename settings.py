@@ -0,0 +1,286 @@
+from collections import namedtuple
+import os
+import sys
+
+# Set FENGRAVE_TK_READS in the environment to count the Tk variable reads
+# made inside the calculation loops.  The counts are written to stderr.
+COUNT_TK_READS = "FENGRAVE_TK_READS" in os.environ
+
+
+def number(value):
+    # Entry values that are not numbers are kept as they are so that the
+    # code using them reports the error as it always has.
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def as_read(value):
+    return value
+
+
+###############################################################################
+# Settings used by the calculation routines and how each is converted when   #
+# the snapshot is taken.  Anything read "as_read" keeps the type of its Tk    #
+# variable (bool for BooleanVar, str for StringVar).                          #
+###############################################################################
+FIELDS = (
+    ("batch", as_read),
+    ("cut_type", as_read),
+    ("input_type", as_read),
+    ("fontdex", as_read),
+    ("units", as_read),
+    ("no_comments", as_read),
+    ("var_dis", as_read),
+    ("arc_fit", as_read),
+    ("accuracy", number),
+    ("gpre", as_read),
+    ("gpost", as_read),
+    ("FEED", as_read),
+    ("PLUNGE", as_read),
+    ("ZSAFE", number),
+    ("ZCUT", number),
+    ("xorigin", number),
+    ("yorigin", number),
+    ("bit_shape", as_read),
+    ("v_bit_dia", as_read),
+    ("v_bit_angle", as_read),
+    ("v_step_len", number),
+    ("v_adaptive", as_read),
+    ("v_max_cut", number),
+    ("v_rough_stk", number),
+    ("v_drv_crner", number),
+    ("v_stp_crner", number),
+    ("v_check_all", as_read),
+    ("v_pplot", as_read),
+    ("inlay", as_read),
+    ("allowance", number),
+    ("clean_dia", number),
+    ("clean_step", number),
+    ("clean_v", number),
+    ("clean_P", as_read),
+    ("clean_X", as_read),
+    ("clean_Y", as_read),
+    ("v_clean_P", as_read),
+    ("v_clean_X", as_read),
+    ("v_clean_Y", as_read),
+)
+
+Settings = namedtuple("Settings", [name for name, convert in FIELDS])
+
+
+def snapshot(app):
+    # Read every setting once and return them as a read-only Settings tuple
+    return Settings(
+        *[convert(getattr(app, name).get()) for name, convert in FIELDS]
+    )
+
+
+##########################################
+#        Saved settings                  #
+##########################################
+SAVED_IDENT = "fengrave_set"
+# Characters of a g-code file searched for the settings before giving up
+SEARCH_LIMIT = 64 * 1024
+
+
+def saved_word(text, words):
+    return words[1]
+
+
+def saved_quoted(text, words):
+    return text.split("\042")[1]
+
+
+def saved_words(text, words):
+    # Every word after the key (except a closing bracket), each followed by
+    # a space
+    value = ""
+    for word in words:
+        if word != ")" and word != words[0]:
+            value = value + word + " "
+    return value
+
+
+def saved_codes(text, words):
+    codes = []
+    for word in words:
+        try:
+            codes.append(int(word))
+        except:
+            pass
+    return codes
+
+
+def saved_plotbox(text, words):
+    if words[1] == "box":
+        return 1
+    elif words[1] == "no_box":
+        return 0
+    return words[1]
+
+
+def saved_numbers(text, words):
+    return [float(n) for n in words[1].split(",")]
+
+
+###############################################################################
+# Settings saved in the "fengrave_set" lines of a g-code file: the key, the  #
+# name it is loaded into and how its value is read.  A key that is not found  #
+# is matched to the first key in this order that is part of it, as older      #
+# versions did.                                                               #
+###############################################################################
+SAVED = (
+    ("TCODE", "text_codes", saved_codes),
+    # BOOL
+    ("show_axis", "show_axis", saved_word),
+    ("show_box", "show_box", saved_word),
+    ("show_thick", "show_thick", saved_word),
+    ("flip", "flip", saved_word),
+    ("mirror", "mirror", saved_word),
+    ("outer", "outer", saved_word),
+    ("upper", "upper", saved_word),
+    ("v_flop", "v_flop", saved_word),
+    ("plot_env", "v_pplot_env", saved_word),
+    ("v_pplot", "v_pplot", saved_word),
+    ("inlay", "inlay", saved_word),
+    ("bmp_long", "bmp_longcurve", saved_word),
+    ("ext_char", "ext_char", saved_word),
+    ("useIMGsize", "useIMGsize", saved_word),
+    ("no_comments", "no_comments", saved_word),
+    ("show_v_path", "show_v_path", saved_word),
+    ("show_v_area", "show_v_area", saved_word),
+    ("plotbox", "plotbox", saved_plotbox),
+    # STRING
+    ("fontdir", "fontdir", saved_quoted),
+    ("gpre", "gpre", saved_words),
+    ("gpost", "gpost", saved_words),
+    ("arc_fit", "arc_fit", saved_word),
+    ("YSCALE", "YSCALE", saved_word),
+    ("XSCALE", "XSCALE", saved_word),
+    ("LSPACE", "LSPACE", saved_word),
+    ("CSPACE", "CSPACE", saved_word),
+    ("WSPACE", "WSPACE", saved_word),
+    ("TANGLE", "TANGLE", saved_word),
+    ("TRADIUS", "TRADIUS", saved_word),
+    ("ZSAFE", "ZSAFE", saved_word),
+    ("ZCUT", "ZCUT", saved_word),
+    ("STHICK", "STHICK", saved_word),
+    ("xorigin", "xorigin", saved_word),
+    ("yorigin", "yorigin", saved_word),
+    ("segarc", "segarc", saved_word),
+    ("accuracy", "accuracy", saved_word),
+    ("origin", "origin", saved_word),
+    ("justify", "justify", saved_word),
+    ("units", "units", saved_word),
+    ("FEED", "FEED", saved_word),
+    ("PLUNGE", "PLUNGE", saved_word),
+    ("fontfile", "fontfile", saved_quoted),
+    ("H_CALC", "H_CALC", saved_word),
+    ("boxgap", "boxgap", saved_word),
+    ("boxsize", "boxsize", saved_word),
+    ("cut_type", "cut_type", saved_word),
+    ("bit_shape", "bit_shape", saved_word),
+    ("v_bit_angle", "v_bit_angle", saved_word),
+    ("v_bit_dia", "v_bit_dia", saved_word),
+    ("v_drv_crner", "v_drv_crner", saved_word),
+    ("v_stp_crner", "v_stp_crner", saved_word),
+    ("v_step_len", "v_step_len", saved_word),
+    ("v_adaptive", "v_adaptive", saved_word),
+    ("allowance", "allowance", saved_word),
+    ("v_max_cut", "v_max_cut", saved_word),
+    ("v_rough_stk", "v_rough_stk", saved_word),
+    ("var_dis", "var_dis", saved_word),
+    ("v_depth_lim", "v_depth_lim", saved_word),
+    ("v_check_all", "v_check_all", saved_word),
+    ("bmp_turnp", "bmp_turnpol", saved_word),
+    ("bmp_turds", "bmp_turdsize", saved_word),
+    ("bmp_alpha", "bmp_alphamax", saved_word),
+    ("bmp_optto", "bmp_opttolerance", saved_word),
+    ("imagefile", "IMAGE_FILE", saved_quoted),
+    ("input_type", "input_type", saved_word),
+    ("clean_dia", "clean_dia", saved_word),
+    ("clean_step", "clean_step", saved_word),
+    ("clean_v", "clean_v", saved_word),
+    ("clean_paths", "clean_paths", saved_numbers),
+    ("NGC_DIR", "NGC_DIR", saved_quoted),
+    # not saved, turns on instrument.py ("json" or "log")
+    ("instrument", "instrument", saved_word),
+)
+
+SAVED_KEYS = dict((key, (key, name, read)) for key, name, read in SAVED)
+
+
+def saved_setting(key):
+    # The table entry used for a key
+    try:
+        return SAVED_KEYS[key]
+    except KeyError:
+        pass
+    for entry in SAVED:
+        if entry[0] in key:
+            SAVED_KEYS[key] = entry
+            return entry
+    SAVED_KEYS[key] = None
+    return None
+
+
+def saved_values(lines, limit=SEARCH_LIMIT):
+    # (name, value) of each "fengrave_set" line.  The settings are written
+    # at the top of a g-code file, so reading stops at the first g-code line
+    # after them, or after limit characters if none have been found.
+    found = False
+    size = 0
+    for line in lines:
+        start = line.find(SAVED_IDENT)
+        if start == -1:
+            if found:
+                text = line.lstrip()
+                if text != "" and text[0] != "(":
+                    return
+            elif limit is not None:
+                size += len(line)
+                if size > limit:
+                    return
+            continue
+
+        found = True
+        text = line[start + len(SAVED_IDENT):].lstrip()
+        words = text.split()
+        entry = saved_setting(words[0])
+        if entry is None:
+            continue
+        key, name, read = entry
+        if key != words[0]:
+            text = line[line.find(key):]
+            words = text.split()
+        yield name, read(text, words)
+
+
+##########################################
+#        Tk read counter                 #
+##########################################
+tk_reads = [0]
+
+
+def count_tk_reads(*classes):
+    # Wrap get() of the given Tk variable classes so every read is counted
+    for cls in classes:
+
+        def get(self, cls_get=cls.get):
+            tk_reads[0] += 1
+            return cls_get(self)
+
+        cls.get = get
+
+
+def tk_read_mark():
+    return tk_reads[0]
+
+
+def report_tk_reads(name, mark):
+    if COUNT_TK_READS:
+        sys.stderr.write(
+            "(%s: %d Tk variable reads)\n" % (name, tk_reads[0] - mark)
+        )
@@ -1,33 +1,89 @@
+from math import floor, log10
+
+# Number of decimal places written for the coordinates (in pixels)
+PRECISION = 3
+
+
+###############################################################################
+# SVG writer.  Each connected run of line segments is written as a single    #
+# path using relative coordinates, all sharing one CSS class for the style.  #
+# When a file handle is given the lines are written to it as they are made,  #
+# otherwise they are kept in the list.                                        #
+###############################################################################
 class SVG(list):
-    def __init__(self, units, width, height, view_width, view_height, dpi):
+    def __init__(self, units, width, height, view_width, view_height, dpi,
+                 thickness, fout=None, precision=PRECISION):
         list.__init__(self)
-
-        self.append('<?xml version="1.0" standalone="no"?>')
-        self.append('<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN"  ')
-        self.append('  "http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd">  ')
-        self.append('<svg width="%f%s" height="%f%s" viewBox="0 0 %f %f"  '
-                    % (width, units, height, units, view_width, view_height))
-        self.append('     xmlns="http://www.w3.org/2000/svg" version="1.1">')
-        self.append('  <title> F-engrave Output </title>')
-        self.append('  <desc>SVG File Created By F-Engrave</desc>')
+        self.fout = fout
         self.dpi = dpi
+        self.precision = precision
+        self.scale = 10 ** precision
+
+        self.write('<?xml version="1.0" standalone="no"?>')
+        self.write('<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN"  ')
+        self.write('  "http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd">  ')
+        self.write('<svg width="%f%s" height="%f%s" viewBox="0 0 %f %f"  '
+                   % (width, units, height, units, view_width, view_height))
+        self.write('     xmlns="http://www.w3.org/2000/svg" version="1.1">')
+        self.write('  <title> F-engrave Output </title>')
+        self.write('  <desc>SVG File Created By F-Engrave</desc>')
+        self.write('  <style>.fe{fill:none;stroke:blue;stroke-width:%s;'
+                   'stroke-linecap:round;stroke-linejoin:round}</style>'
+                   % (self.width(thickness * dpi)))
+
+    def write(self, line):
+        if self.fout is None:
+            self.append(line)
+        else:
+            self.fout.write(line + "\n")
+
+    def width(self, w):
+        # The stroke width keeps six significant digits rather than the
+        # precision of the coordinates, so a thin line is not written as 0
+        digits = self.precision
+        if w > 0:
+            digits = max(digits, 5 - int(floor(log10(w))))
+        return ("%.*f" % (digits, w)).rstrip("0").rstrip(".")
+
+    def number(self, n):
+        # n is in units of 10**-precision pixels
+        if self.precision <= 0:
+            return "%d" % (n)
+        text = "%d" % (abs(n))
+        if len(text) <= self.precision:
+            text = "0" * (self.precision - len(text) + 1) + text
+        text = (text[:-self.precision] + "."
+                + text[-self.precision:]).rstrip("0").rstrip(".")
+        if n < 0:
+            return "-" + text
+        return text
+
+    def polyline(self, points, closed=False):
+        # The deltas are taken between rounded points, so rounding errors do
+        # not add up along the path
+        dpi = self.dpi
+        scale = self.scale
+        number = self.number
+        xa = int(round(points[0][0] * dpi * scale))
+        ya = int(round(points[0][1] * dpi * scale))
+        d = ["M%s %s" % (number(xa), number(ya))]
+        if len(points) > 1:
+            d.append("l")
+        for x, y in points[1:]:
+            xb = int(round(x * dpi * scale))
+            yb = int(round(y * dpi * scale))
+            d.append("%s %s" % (number(xb - xa), number(yb - ya)))
+            xa = xb
+            ya = yb
+        if closed:
+            d.append("z")
+        self.write('  <path class="fe" d="%s"/>' % (" ".join(d)))
 
-    def line(self, x1, y1, x2, y2, thickness):
-        self.append('  <path d="M %f %f L %f %f"'
-                    % (x1 * self.dpi,
-                       y1 * self.dpi,
-                       x2 * self.dpi,
-                       y2 * self.dpi))
-        self.append('        fill="none" stroke="blue" stroke-width="%f" stroke-linecap="round" stroke-linejoin="round"/>'
-                    % (thickness * self.dpi))
-
-    def circle(self, center_x, center_y, radius, thickness):
-        self.append('  <circle cx="%f" cy="%f" r="%f"'
-                    % (center_x * self.dpi,
-                       center_y * self.dpi,
-                       radius * self.dpi))
-        self.append('        fill="none" stroke="blue" stroke-width="%f"/>'
-                    % (thickness * self.dpi))
+    def circle(self, center_x, center_y, radius):
+        self.write('  <circle class="fe" cx="%f" cy="%f" r="%f"/>'
+                   % (center_x * self.dpi,
+                      center_y * self.dpi,
+                      radius * self.dpi))
 
     def close(self):
-        self.append('</svg>')
+        self.write('</svg>')
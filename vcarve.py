@@ -0,0 +1,713 @@
+from constants import Zero
+from graphics import Get_Angle, find_max_circle, record_v_carve_data
+import gzip
+import hashlib
+import instrument
+import json
+from math import sqrt, radians, cos, sin, fabs, floor
+import multiprocessing
+import os
+from partition import GRID_STATS, SegmentGrid
+import tempfile
+from time import time
+
+# Seconds between checkpoints of a V-carve calculation
+CHECKPOINT_SECONDS = 60
+CHECKPOINT_VERSION = 1
+# Loop state saved in a checkpoint
+CHECKPOINT_STATE = (
+    "line",
+    "v_index",
+    "CUR_LENGTH",
+    "loop_cnt",
+    "xa",
+    "ya",
+    "xb",
+    "yb",
+    "x0",
+    "y0",
+    "seg_sin0",
+    "seg_cos0",
+    "char_num0",
+    "theta",
+    "xpta",
+    "ypta",
+    "phi2a",
+    "routa",
+)
+
+
+###############################################################################
+# V-carve calculation engine.                                                 #
+# All of the settings are passed in as plain values so the calculation does  #
+# not touch any Tk variables and can run outside of the Tk main thread.       #
+# Progress, live plot data and cancellation are handled through the optional #
+# status, plot and stop arguments of run().                                   #
+# When a checkpoint file name is given the progress is saved to it every      #
+# CHECKPOINT_SECONDS and when the calculation is stopped.  A later run with  #
+# the same paths and settings carries on from the checkpoint.                 #
+###############################################################################
+class VCarve(object):
+    def __init__(
+        self,
+        coords,
+        MINX,
+        MINY,
+        MAXX,
+        MAXY,
+        rmax,
+        rbit,
+        dline,
+        dangle,
+        v_drv_crner,
+        v_stp_crner,
+        CHK_STRING,
+        not_b_carve,
+        BIT_ANGLE,
+        v_flop,
+        clean_flag=0,
+        clean_segment=None,
+        tolerance=0.0,
+        checkpoint=None,
+    ):
+        self.coords = coords
+        self.MINX = MINX
+        self.MINY = MINY
+        self.MAXX = MAXX
+        self.MAXY = MAXY
+        self.rmax = rmax
+        self.rbit = rbit
+        self.dline = dline
+        self.dangle = dangle
+        self.v_drv_crner = float(v_drv_crner)
+        self.v_stp_crner = float(v_stp_crner)
+        self.CHK_STRING = CHK_STRING
+        self.not_b_carve = not_b_carve
+        self.BIT_ANGLE = BIT_ANGLE
+        self.v_flop = v_flop
+        self.clean_flag = clean_flag
+        if clean_segment is None:
+            clean_segment = []
+        self.clean_segment = clean_segment
+        self.tolerance = tolerance
+        self.checkpoint = checkpoint
+
+        self.vcoords = []
+        self.clean_coords = []
+        self.grid = None
+        self.counts = None
+        # segment that limited the last circle found, checked first for
+        # the next one
+        self.limit = [None]
+        self.total_length = 0.0
+        self.complete = False
+        # circle evaluations made and skipped along the straight segments
+        self.evaluations = 0
+        self.saved = 0
+        # percent complete when the calculation was resumed from a
+        # checkpoint, None when it was not
+        self.resumed = None
+
+    #########################
+    # Setup Grid Partitions #
+    #########################
+    @instrument.timed("partition")
+    def partition(self):
+        self.grid = SegmentGrid(
+            self.coords,
+            self.MINX,
+            self.MINY,
+            self.MAXX,
+            self.MAXY,
+            2 * self.rmax + self.dline,
+            self.rmax,
+        )
+        if GRID_STATS or instrument.enabled:
+            self.counts = self.grid.counts
+
+    def find_max_circle(self, xpt, ypt, char_num, seg_sin, seg_cos, corner):
+        return find_max_circle(
+            xpt,
+            ypt,
+            self.rmax,
+            char_num,
+            seg_sin,
+            seg_cos,
+            corner,
+            self.CHK_STRING,
+            self.grid.query(xpt, ypt),
+            self.counts,
+            self.limit,
+        )
+
+    ##########################################################################
+    # Radii of the circles at steps first to last along a straight segment. #
+    # With a tolerance the circles are only found at the ends and at the    #
+    # midpoints of the runs where the radius is not within tolerance of a   #
+    # straight line between the ends of the run.  The remaining radii are   #
+    # linearly interpolated.                                                 #
+    ##########################################################################
+    def segment_radii(
+        self, x1, y1, dxpt, dypt, first, last, char_num, seg_sin, seg_cos
+    ):
+        radii = {}
+        if self.tolerance <= 0.0 or last - first < 2:
+            for cnt in range(first, last + 1):
+                radii[cnt] = self.find_max_circle(
+                    x1 + dxpt * cnt,
+                    y1 + dypt * cnt,
+                    char_num,
+                    seg_sin,
+                    seg_cos,
+                    0,
+                )
+            self.evaluations = self.evaluations + last - first + 1
+            return radii
+
+        tol = self.tolerance
+        for cnt in (first, last):
+            radii[cnt] = self.find_max_circle(
+                x1 + dxpt * cnt, y1 + dypt * cnt, char_num, seg_sin, seg_cos, 0
+            )
+        evaluations = 2
+        runs = [(first, last)]
+        while runs:
+            a, b = runs.pop()
+            if b - a < 2:
+                continue
+            ra = radii[a]
+            rb = radii[b]
+            m = (a + b) // 2
+            rm = self.find_max_circle(
+                x1 + dxpt * m, y1 + dypt * m, char_num, seg_sin, seg_cos, 0
+            )
+            evaluations = evaluations + 1
+            radii[m] = rm
+            if fabs(rm - (ra + (rb - ra) * (m - a) / (b - a))) > tol:
+                runs.append((m, b))
+                runs.append((a, m))
+                continue
+            for cnt in range(a + 1, b):
+                if cnt != m:
+                    radii[cnt] = ra + (rb - ra) * (cnt - a) / (b - a)
+        self.evaluations = self.evaluations + evaluations
+        self.saved = self.saved + last - first + 1 - evaluations
+        return radii
+
+    def record(self, x1, y1, phi, rout, loop_cnt, CUR_CNT):
+        if self.clean_flag != 1:
+            coords_destination = self.vcoords
+        else:
+            coords_destination = self.clean_coords
+        xv, yv, rv, clean_seg = record_v_carve_data(
+            x1,
+            y1,
+            phi,
+            rout,
+            loop_cnt,
+            self.clean_flag,
+            self.rbit,
+            coords_destination,
+        )
+        self.clean_segment[CUR_CNT] = bool(
+            self.clean_segment[CUR_CNT]
+        ) or bool(clean_seg)
+        return xv, yv, rv
+
+    ##########################################
+    #        Checkpoints                     #
+    ##########################################
+    def checkpoint_key(self):
+        # Hash of everything the calculation depends on
+        inputs = (
+            CHECKPOINT_VERSION,
+            [list(XY) for XY in self.coords],
+            self.rmax,
+            self.rbit,
+            self.dline,
+            self.dangle,
+            self.v_drv_crner,
+            self.v_stp_crner,
+            self.CHK_STRING,
+            bool(self.not_b_carve),
+            self.BIT_ANGLE,
+            bool(self.v_flop),
+            self.clean_flag,
+            self.tolerance,
+        )
+        if self.clean_flag == 1:
+            inputs = inputs + ([int(bool(c)) for c in self.clean_segment],)
+        return hashlib.sha1(repr(inputs).encode("utf-8")).hexdigest()
+
+    def save_checkpoint(self, key, state, clean_segment):
+        data = {
+            "key": key,
+            "state": state,
+            "vcoords": self.vcoords,
+            "clean_coords": self.clean_coords,
+            "clean_segment": clean_segment,
+        }
+        # Write to a new file and move it over the old one so a crash while
+        # writing leaves the last checkpoint in place.  Two runs sharing a
+        # checkpoint name each write their own temporary file.
+        try:
+            folder = os.path.dirname(os.path.abspath(self.checkpoint))
+            fd, temp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+            os.close(fd)
+            try:
+                fout = gzip.open(temp, "wt")
+                try:
+                    json.dump(data, fout, separators=(",", ":"))
+                finally:
+                    fout.close()
+                os.replace(temp, self.checkpoint)
+            except:
+                os.unlink(temp)
+                raise
+        except:
+            pass
+
+    def load_checkpoint(self, key):
+        try:
+            fin = gzip.open(self.checkpoint, "rt")
+            try:
+                data = json.load(fin)
+            finally:
+                fin.close()
+        except:
+            return None
+        if data.get("key") != key:
+            return None
+        return data
+
+    def remove_checkpoint(self):
+        try:
+            os.remove(self.checkpoint)
+        except:
+            pass
+
+    ##########################################################################
+    # status(percent, minutes_remaining, minutes_total) is called about     #
+    # three times a second, plot(x, y, r) is called for each new circle     #
+    # (not during clean up calculations) and the calculation is abandoned   #
+    # as soon as stop.is_set() returns True.                                 #
+    ##########################################################################
+    def run(self, status=None, plot=None, stop=None):
+        timestamp = 0
+        coords = self.coords
+        clean_flag = self.clean_flag
+        clean_segment = self.clean_segment
+        dline = self.dline
+        dangle = self.dangle
+        v_drv_crner = self.v_drv_crner
+        v_stp_crner = self.v_stp_crner
+        not_b_carve = self.not_b_carve
+        BIT_ANGLE = self.BIT_ANGLE
+        if clean_flag == 1:
+            plot = None
+
+        if self.grid is None:
+            self.partition()
+
+        # set variable for the second point of a loop, used to close it
+        xpta = ypta = phi2a = routa = None
+        # set variable for first point in loop
+        xa = 9999
+        ya = 9999
+        xb = 9999
+        yb = 9999
+        # set variable for the point previously calculated in a loop
+        x0 = 9999
+        y0 = 9999
+        seg_sin0 = 2
+        seg_cos0 = 2
+        char_num0 = -1
+        theta = 9999.0
+        loop_cnt = 0
+        if not self.v_flop:
+            v_inc = 1
+            v_index = -1
+            i_x1 = 0
+            i_y1 = 1
+            i_x2 = 2
+            i_y2 = 3
+        else:
+            v_inc = -1
+            v_index = len(coords)
+            i_x1 = 2
+            i_y1 = 3
+            i_x2 = 0
+            i_y2 = 1
+
+        # Loop through again just to determine the total length of segments
+        # For the percent complete calculation
+        v_ind = v_index
+
+        CUR_CNT = -1
+        TOT_LENGTH = 0.0
+
+        for line in range(len(coords)):
+            CUR_CNT = CUR_CNT + 1
+            v_ind = v_ind + v_inc
+            x1 = coords[v_ind][i_x1]
+            y1 = coords[v_ind][i_y1]
+            x2 = coords[v_ind][i_x2]
+            y2 = coords[v_ind][i_y2]
+            LENGTH = sqrt((x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1))
+            if clean_flag == 1:
+                if clean_segment[CUR_CNT] != 0:
+                    TOT_LENGTH = TOT_LENGTH + LENGTH
+            else:
+                TOT_LENGTH = TOT_LENGTH + LENGTH
+        self.total_length = TOT_LENGTH
+
+        CUR_LENGTH = 0.0
+        MAX_CNT = len(coords)
+        CUR_CNT = -1
+        FIRST_LINE = 0
+
+        key = None
+        if self.checkpoint is not None and TOT_LENGTH > 0.0:
+            key = self.checkpoint_key()
+            data = self.load_checkpoint(key)
+            if data is not None:
+                state = data["state"]
+                FIRST_LINE = state["line"]
+                CUR_CNT = FIRST_LINE - 1
+                v_index = state["v_index"]
+                CUR_LENGTH = state["CUR_LENGTH"]
+                loop_cnt = state["loop_cnt"]
+                xa, ya = state["xa"], state["ya"]
+                xb, yb = state["xb"], state["yb"]
+                x0, y0 = state["x0"], state["y0"]
+                seg_sin0 = state["seg_sin0"]
+                seg_cos0 = state["seg_cos0"]
+                char_num0 = state["char_num0"]
+                theta = state["theta"]
+                xpta, ypta = state["xpta"], state["ypta"]
+                phi2a, routa = state["phi2a"], state["routa"]
+                self.vcoords = data["vcoords"]
+                self.clean_coords = data["clean_coords"]
+                if clean_flag == 0:
+                    clean_segment[:] = data["clean_segment"]
+                self.resumed = float(CUR_LENGTH) / TOT_LENGTH * 100.0
+        START_LENGTH = CUR_LENGTH
+        START_TIME = time()
+        CHECK_TIME = START_TIME
+
+        if TOT_LENGTH > 0.0:
+            calc_flag = 1
+            for line in range(FIRST_LINE, len(coords)):
+                CUR_CNT = CUR_CNT + 1
+
+                if clean_flag == 0:
+                    clean_segment.append(0)
+                else:
+                    calc_flag = clean_segment[CUR_CNT]
+
+                if status is not None:
+                    stamp = int(3 * time())  # update every 1/3 of a second
+                    if stamp != timestamp:
+                        timestamp = stamp  # interlock
+
+                        CUR_PCT = float(CUR_LENGTH) / TOT_LENGTH * 100.0
+                        # percent done since the calculation was started
+                        # (or resumed)
+                        RUN_PCT = (
+                            float(CUR_LENGTH - START_LENGTH)
+                            / TOT_LENGTH
+                            * 100.0
+                        )
+                        if RUN_PCT > 0.0:
+                            MIN_REMAIN = (
+                                (time() - START_TIME)
+                                / 60
+                                * (100 - CUR_PCT)
+                                / RUN_PCT
+                            )
+                            MIN_TOTAL = (time() - START_TIME) / 60 + MIN_REMAIN
+                        else:
+                            MIN_REMAIN = -1
+                            MIN_TOTAL = -1
+                        status(CUR_PCT, MIN_REMAIN, MIN_TOTAL)
+
+                stopped = stop is not None and stop.is_set()
+                if key is not None and (
+                    stopped or time() - CHECK_TIME > CHECKPOINT_SECONDS
+                ):
+                    # The state before this line, clean_segment has already
+                    # been extended for it
+                    values = locals()
+                    state = dict(
+                        [(name, values[name]) for name in CHECKPOINT_STATE]
+                    )
+                    self.save_checkpoint(key, state, clean_segment[:CUR_CNT])
+                    CHECK_TIME = time()
+
+                if stopped:
+                    if clean_flag != 1:
+                        self.vcoords = []
+                    else:
+                        self.clean_coords = []
+                    break
+
+                v_index = v_index + v_inc
+                New_Loop = 0
+                x1 = coords[v_index][i_x1]
+                y1 = coords[v_index][i_y1]
+                x2 = coords[v_index][i_x2]
+                y2 = coords[v_index][i_y2]
+                char_num = int(coords[v_index][5])
+                dx = x2 - x1
+                dy = y2 - y1
+                Lseg = sqrt(dx * dx + dy * dy)
+
+                if Lseg < Zero:  # was Acc
+                    continue
+
+                # calculate the sin and cos of the coord transformation
+                # needed for the distance calculations
+                seg_sin = dy / Lseg
+                seg_cos = -dx / Lseg
+                phi = Get_Angle(seg_sin, seg_cos)
+
+                if calc_flag != 0:
+                    CUR_LENGTH = CUR_LENGTH + Lseg
+                else:
+                    # commented out in V1.62 brought back in V1.72
+                    theta = phi
+                    x0 = x2
+                    y0 = y2
+                    seg_sin0 = seg_sin
+                    seg_cos0 = seg_cos
+                    char_num0 = char_num
+                    continue
+
+                if (
+                    (fabs(x1 - x0) > Zero)
+                    or (fabs(y1 - y0) > Zero)
+                    or (char_num != char_num0)
+                ):
+                    New_Loop = 1
+                    loop_cnt = loop_cnt + 1
+                    xa = float(x1)
+                    ya = float(y1)
+                    xb = float(x2)
+                    yb = float(y2)
+                    theta = 9999.0
+                    seg_sin0 = 2
+                    seg_cos0 = 2
+
+                if seg_cos0 > 1.0:
+                    delta = 180
+                else:
+                    xtmp1 = (x2 - x1) * seg_cos0 - (y2 - y1) * seg_sin0
+                    ytmp1 = (x2 - x1) * seg_sin0 + (y2 - y1) * seg_cos0
+                    Ltmp = sqrt(xtmp1 * xtmp1 + ytmp1 * ytmp1)
+                    d_seg_sin = ytmp1 / Ltmp
+                    d_seg_cos = xtmp1 / Ltmp
+                    delta = Get_Angle(d_seg_sin, d_seg_cos)
+                if (
+                    delta < v_drv_crner
+                    and BIT_ANGLE != 0
+                    and not_b_carve
+                    and clean_flag != 1
+                ):
+                    # drive to corner
+                    self.vcoords.append([x1, y1, 0.0, loop_cnt])
+
+                if delta > v_stp_crner:
+                    # add sub-steps around corner
+                    ###########################
+                    phisteps = max(floor((delta - 180) / dangle), 2)
+                    step_phi = (delta - 180) / phisteps
+                    pcnt = 0
+                    while pcnt < phisteps - 1:
+                        pcnt = pcnt + 1
+                        sub_phi = radians(-pcnt * step_phi + theta)
+                        sub_seg_cos = cos(sub_phi)
+                        sub_seg_sin = sin(sub_phi)
+
+                        rout = self.find_max_circle(
+                            x1, y1, char_num, sub_seg_sin, sub_seg_cos, 1
+                        )
+                        xv, yv, rv = self.record(
+                            x1, y1, sub_phi, rout, loop_cnt, CUR_CNT
+                        )
+                        if plot is not None:
+                            plot(xv, yv, rv)
+                #############################
+                ### end for linec in self.coords
+                theta = phi
+                x0 = x2
+                y0 = y2
+                seg_sin0 = seg_sin
+                seg_cos0 = seg_cos
+                char_num0 = char_num
+
+                # Calculate the number of steps then the dx and dy for each
+                # step.
+                # Don't calculate at the joints.
+                nsteps = max(floor(Lseg / dline), 2)
+                dxpt = dx / nsteps
+                dypt = dy / nsteps
+
+                # This makes sure the first cut start at the beginning of
+                # the first segment
+                cnt = 0
+                if New_Loop == 1 and BIT_ANGLE != 0 and not_b_carve:
+                    cnt = -1
+
+                seg_sin = dy / Lseg
+                seg_cos = -dx / Lseg
+                phi2 = radians(Get_Angle(seg_sin, seg_cos))
+                radii = self.segment_radii(
+                    x1,
+                    y1,
+                    dxpt,
+                    dypt,
+                    cnt + 1,
+                    nsteps - 1,
+                    char_num,
+                    seg_sin,
+                    seg_cos,
+                )
+                while cnt < nsteps - 1:
+                    cnt = cnt + 1
+                    # determine location of next step along outline
+                    # (xpt, ypt)
+                    xpt = x1 + dxpt * cnt
+                    ypt = y1 + dypt * cnt
+
+                    rout = radii[cnt]
+                    # Make the first cut drive down at an angle instead of
+                    # straight down plunge
+                    if cnt == 0 and not_b_carve:
+                        rout = 0.0
+                    xv, yv, rv = self.record(
+                        xpt, ypt, phi2, rout, loop_cnt, CUR_CNT
+                    )
+                    if plot is not None:
+                        plot(xv, yv, rv)
+
+                    if New_Loop == 1 and cnt == 1:
+                        xpta = xpt
+                        ypta = ypt
+                        phi2a = phi2
+                        routa = rout
+
+                #################################################
+                # Check to see if we need to close an open loop #
+                #################################################
+                if abs(x2 - xa) < Zero and abs(y2 - ya) < Zero:
+                    xtmp1 = (xb - xa) * seg_cos0 - (yb - ya) * seg_sin0
+                    ytmp1 = (xb - xa) * seg_sin0 + (yb - ya) * seg_cos0
+                    Ltmp = sqrt(xtmp1 * xtmp1 + ytmp1 * ytmp1)
+                    d_seg_sin = ytmp1 / Ltmp
+                    d_seg_cos = xtmp1 / Ltmp
+                    delta = Get_Angle(d_seg_sin, d_seg_cos)
+                    if delta < v_drv_crner and clean_flag != 1:
+                        # Drive to corner
+                        self.vcoords.append([xa, ya, 0.0, loop_cnt])
+
+                    elif delta > v_stp_crner:
+                        # Add sub-steps around corner
+                        phisteps = max(floor((delta - 180) / dangle), 2)
+                        step_phi = (delta - 180) / phisteps
+                        pcnt = 0
+
+                        while pcnt < phisteps - 1:
+                            pcnt = pcnt + 1
+                            sub_phi = radians(-pcnt * step_phi + theta)
+                            sub_seg_cos = cos(sub_phi)
+                            sub_seg_sin = sin(sub_phi)
+
+                            rout = self.find_max_circle(
+                                xa, ya, char_num, sub_seg_sin, sub_seg_cos, 1
+                            )
+                            xv, yv, rv = self.record(
+                                xa, ya, sub_phi, rout, loop_cnt, CUR_CNT
+                            )
+                            if plot is not None:
+                                plot(xv, yv, rv)
+
+                        self.record(xpta, ypta, phi2a, routa, loop_cnt, CUR_CNT)
+                    else:
+                        # Add closing segment
+                        self.record(xpta, ypta, phi2a, routa, loop_cnt, CUR_CNT)
+
+            # end for line in self coords
+
+        self.complete = CUR_CNT == MAX_CNT - 1
+        if self.complete and key is not None:
+            self.remove_checkpoint()
+        return self.complete
+
+
+def run_engine(engine):
+    engine.partition()
+    engine.run()
+    return (
+        engine.vcoords,
+        engine.clean_coords,
+        engine.clean_segment,
+        engine.total_length,
+        engine.complete,
+        engine.evaluations,
+        engine.saved,
+    )
+
+
+def run_counted_engine(job):
+    # run_engine with the grid counts added to the instrument counters.  In a
+    # worker process the instrument mode is the one passed in, and the
+    # timers and counters are sent back with the results.
+    engine, mode = job
+    if mode is not False:
+        instrument.enable(mode)
+    result = run_engine(engine)
+    if engine.grid is not None:
+        engine.grid.add_counts()
+    if mode is False:
+        return result, None
+    return result, instrument.collect()
+
+
+###############################################################################
+# Run several independent engines, each in its own process.  The results are #
+# copied back into the engines that were passed in, and the timers and       #
+# counters of the worker processes are added to those of this one.           #
+###############################################################################
+def run_engines(engines, processes=None):
+    if processes is None:
+        processes = len(engines)
+    processes = min(processes, len(engines))
+    if processes < 2:
+        runs = [run_counted_engine((engine, False)) for engine in engines]
+    else:
+        context = multiprocessing.get_context("spawn")
+        pool = context.Pool(processes)
+        try:
+            runs = pool.map(
+                run_counted_engine,
+                [(engine, instrument.mode) for engine in engines],
+                1,
+            )
+        finally:
+            pool.close()
+            pool.join()
+    results = []
+    for result, data in runs:
+        if data is not None:
+            instrument.merge(data)
+        results.append(result)
+    for engine, result in zip(engines, results):
+        (
+            engine.vcoords,
+            engine.clean_coords,
+            engine.clean_segment,
+            engine.total_length,
+            engine.complete,
+            engine.evaluations,
+            engine.saved,
+        ) = result